@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_broadcast.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+浮层广播压测：大量本地 SSE / WebSocket 客户端订阅，统计送达速率、端到端延迟和编码次数
+用法: python benchmarks/bench_broadcast.py [客户端数] [每秒事件数] [秒数] [直播间数]
+"""
+
+import base64
+import json
+import os
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast_server import BroadcastServer
+
+WS_SHARE = 0.2  # WebSocket 客户端比例，其余为 SSE
+SLOW_CLIENTS = 5  # 订阅所有直播间但不读取的客户端，验证积压断开
+
+
+def connect(address, room, ws, read=True):
+    conn = socket.create_connection(address)
+    if not read:
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    if ws:
+        key = base64.b64encode(os.urandom(16)).decode()
+        request = (f"GET /ws?room={room} HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+                   f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    else:
+        request = f"GET /events?room={room} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n"
+    conn.sendall(request.encode())
+    conn.setblocking(False)
+    return conn
+
+
+class Readers:
+    """
+    在一个线程里读取所有客户端，按 "type" 出现次数统计送达事件数；
+    每个直播间的第一个 SSE 客户端额外解析内容，记录端到端延迟
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.delivered = 0
+        self.latencies = []
+        self.closed = 0
+        self.stopped = False
+
+    def add(self, conn, sample=False):
+        self.selector.register(conn, selectors.EVENT_READ, [sample, bytearray()])
+
+    def run(self):
+        while not self.stopped:
+            for key, _ in self.selector.select(0.1):
+                sample, buffer = key.data
+                try:
+                    data = key.fileobj.recv(262144)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    self.selector.unregister(key.fileobj)
+                    self.closed += 1
+                    continue
+                self.delivered += data.count(b'"type"')
+                if sample:
+                    self.sample(buffer, data)
+
+    def sample(self, buffer, data):
+        buffer += data
+        now = time.time()
+        while True:
+            end = buffer.find(b"\n\n")
+            if end < 0:
+                return
+            line = bytes(buffer[:end])
+            del buffer[:end + 2]
+            if line.startswith(b"data: "):
+                for event in json.loads(line[6:]):
+                    self.latencies.append(now - event["ts"])
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    room_count = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    rooms = [str(7392091211001140287 + r) for r in range(room_count)]
+
+    server = BroadcastServer(port=0, max_buffer=256 * 1024)
+    readers = Readers()
+    subscribers = dict.fromkeys(rooms, 0)
+    for i in range(clients):
+        room = rooms[i % room_count]
+        readers.add(connect(server.address, room, ws=random.random() < WS_SHARE), sample=i < room_count)
+        subscribers[room] += 1
+    slow = [connect(server.address, ",".join(rooms), ws=False, read=False) for _ in range(SLOW_CLIENTS)]
+    thread = threading.Thread(target=readers.run, daemon=True)
+    thread.start()
+    while server.client_count < clients + SLOW_CLIENTS:
+        time.sleep(0.05)
+    print(f"{clients} 个客户端（约 {WS_SHARE:.0%} WebSocket）+ {SLOW_CLIENTS} 个不读取的慢客户端，"
+          f"{room_count} 个直播间，目标 {rate} 条/秒，持续 {seconds:.0f} 秒，CPU 核数 {os.cpu_count()}")
+
+    published = 0
+    expected = 0
+    started = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            break
+        due = int(elapsed * rate)
+        while published < due:
+            room = rooms[published % room_count]
+            server.publish(room, {
+                "type": "WebcastChatMessage", "room_id": room, "msg_id": published, "ts": time.time(),
+                "user_id": random.randrange(10 ** 12), "user_name": f"用户{published % 997}",
+                "fans_club": 3, "pay_grade": 12, "content": "主播好厉害" * random.randint(1, 4),
+            })
+            expected += subscribers[room]
+            published += 1
+        time.sleep(0.001)
+    # 等待最后一批送达
+    deadline = time.time() + 5
+    while readers.delivered < expected and time.time() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    readers.stopped = True
+    thread.join()
+    stats = server.stats()
+    server.close()
+    for conn in slow:
+        conn.close()
+
+    latencies = sorted(readers.latencies)
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f"发布 {published} 条，送达 {readers.delivered}/{expected} 条，{readers.delivered / elapsed:.0f} 条/秒")
+    print(f"编码 {stats['batches']} 批（平均每批 {published / max(stats['batches'], 1):.1f} 条），"
+          f"逐客户端编码需要 {expected} 次")
+    print(f"端到端延迟 p50 {p50:.1f}ms  p99 {p99:.1f}ms")
+    print(f"慢客户端断开 {stats['slow_disconnects']}/{SLOW_CLIENTS}，正常客户端被断开 {readers.closed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_checkpoint.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+检查点恢复耗时：模拟不同长度的直播（每秒一次 WAL 记录），在未正常关闭时"崩溃"，统计重启恢复耗时；
+对比定期快照与只写 WAL（从不快照）两种方式
+用法: python benchmarks/bench_checkpoint.py [每秒消息数] [直播秒数...]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import Checkpointer
+from protobuf.douyin import ChatMessage, GiftMessage, GiftStruct, User
+
+
+def make_messages(count, users=50000):
+    messages = []
+    for i in range(count):
+        user = User(id=random.randrange(users) + 1, nick_name=f"用户{i % users}")
+        if i % 5 == 0:
+            message = GiftMessage(user=user, combo_count=random.randint(1, 10),
+                                  gift=GiftStruct(id=1, name="小心心", diamond_count=random.choice((1, 10, 99))))
+            messages.append(("WebcastGiftMessage", message))
+        else:
+            messages.append(("WebcastChatMessage", ChatMessage(user=user, content="666")))
+    return messages
+
+
+def simulate(folder, rate, seconds, snapshot_every):
+    """
+    :param snapshot_every: 每隔多少秒（模拟时间）写一次快照，0 为从不写快照
+    :return: (写入总耗时, 恢复耗时 ms, 恢复结果是否一致)
+    """
+    # 后台线程不触发，按模拟时间手动 flush / 快照
+    checkpointer = Checkpointer(folder, "bench", flush_interval=3600, snapshot_interval=10 ** 9,
+                                max_wal_bytes=1 << 40, top_users=1000)
+    checkpointer.recover()
+    checkpointer.start()
+    batch = make_messages(rate)
+    started = time.perf_counter()
+    for second in range(1, seconds + 1):
+        for method, message in batch:
+            checkpointer.observe(method, message)
+        checkpointer.flush()
+        # 快照时间与崩溃时间错开，崩溃时 WAL 中有 snapshot_every - 1 秒的增量（最坏情况）
+        if snapshot_every and second % snapshot_every == 1:
+            checkpointer.snapshot()
+    written = time.perf_counter() - started
+    expected = checkpointer.aggregates.total_diamonds
+    # 模拟崩溃：不调用 close()，最后一次快照之后的增量只在 WAL 中
+
+    restarted = Checkpointer(folder, "bench", top_users=1000)
+    aggregates = restarted.recover()
+    return written, restarted.recovery, aggregates.total_diamonds == expected
+
+
+def main():
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    durations = [int(v) for v in sys.argv[2:]] or [60, 300, 1200]
+    print(f"每秒 {rate} 条消息（20% 礼物），每秒一条 WAL 记录")
+    for seconds in durations:
+        for snapshot_every in (60, 0):
+            with tempfile.TemporaryDirectory() as folder:
+                written, recovery, ok = simulate(folder, rate, seconds, snapshot_every)
+            mode = f"每 {snapshot_every} 秒快照" if snapshot_every else "只写 WAL"
+            print(f"直播 {seconds:5d} 秒，{mode:10s}: 恢复 {recovery['ms']:7.1f} ms，"
+                  f"重放 {recovery['replayed']:5d} 条 / {recovery['wal_bytes'] / 1024:8.0f} KB，"
+                  f"记录耗时 {written / seconds * 1000:.1f} ms/秒，结果{'一致' if ok else '不一致'}")
+
+
+if __name__ == "__main__":
+    main()
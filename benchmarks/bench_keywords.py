@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_keywords.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+关键词匹配耗时：关键词数量增加时，逐个关键词 `in` 判断与 Aho-Corasick 自动机每条弹幕的耗时对比
+用法: python benchmarks/bench_keywords.py [弹幕条数] [关键词数...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_engine import Automaton, Normalizer
+
+# 常用汉字，关键词和弹幕从中随机取字，让关键词之间有大量公共前缀
+CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理"
+EMOJI = ["[比心]", "666", "哈哈哈", "[赞]", "主播好", "来了来了", "🔥🔥"]
+
+
+def make_keywords(count):
+    keywords = set()
+    while len(keywords) < count:
+        keywords.add("".join(random.choices(CHARS, k=random.randint(2, 5))))
+    return [(keyword, "banned") for keyword in keywords]
+
+
+def make_messages(count):
+    return ["".join(random.choices(CHARS, k=random.randint(4, 20))) + random.choice(EMOJI) for _ in range(count)]
+
+
+def naive(keywords, normalizer, messages):
+    """
+    逐个关键词判断，同样先做归一化，两种方式的结果一致
+    """
+    patterns = [(normalizer.normalize(keyword), keyword) for keyword, _ in keywords]
+    matched = 0
+    for content in messages:
+        text = normalizer.normalize(content)
+        if [keyword for pattern, keyword in patterns if pattern in text]:
+            matched += 1
+    return matched
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    sizes = [int(v) for v in sys.argv[2:]] or [100, 1000, 10000, 50000]
+    random.seed(1)
+    messages = make_messages(count)
+    normalizer = Normalizer()
+    print(f"{count} 条弹幕，平均 {sum(map(len, messages)) / count:.1f} 字")
+    for size in sizes:
+        keywords = make_keywords(size)
+        automaton, compile_seconds = timed(Automaton, keywords, normalizer)
+        matched, seconds = timed(lambda: sum(1 for content in messages if automaton.search(content)))
+        # 逐个判断太慢，只取一部分弹幕并按比例换算
+        sample = messages[:max(100, count * 100 // size)]
+        naive_matched, naive_seconds = timed(naive, keywords, normalizer, sample)
+        assert naive_matched == sum(1 for content in sample if automaton.search(content))
+        print(f"{size:6d} 个关键词: 自动机 {seconds / count * 1e6:7.1f} us/条（{count / seconds:8.0f} 条/秒，"
+              f"编译 {compile_seconds * 1000:6.0f} ms，{len(automaton.goto)} 个状态），"
+              f"逐个判断 {naive_seconds / len(sample) * 1e6:9.1f} us/条，命中率 {matched / count:.1%}")
+
+
+if __name__ == "__main__":
+    main()
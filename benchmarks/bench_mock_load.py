@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_mock_load.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+使用本地 mock_server 对 DouyinLiveWebFetcher 做端到端压测，统计持续处理速率
+用法: python benchmarks/bench_mock_load.py [秒数] [每秒消息数]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from liveMan import DouyinLiveWebFetcher
+from mock_server import MockConfig, MockDouyinServer
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    server = MockDouyinServer(("127.0.0.1", 0), MockConfig(rate=rate, batch=50))
+    server.start()
+
+    fetcher = DouyinLiveWebFetcher(server.config.live_id)
+    fetcher.host = server.base_url
+    fetcher.live_url = server.base_url
+    fetcher.wss_url = server.wss_url
+    fetcher.get_room_status = lambda: None
+
+    handled = [0]
+
+    def count(message):
+        handled[0] += 1
+
+    fetcher.on("*", count)
+
+    sink = io.StringIO()
+    thread = threading.Thread(target=fetcher.start, daemon=True)
+    with contextlib.redirect_stdout(sink):
+        thread.start()
+        time.sleep(duration)
+        fetcher.stop()
+        thread.join(5)
+
+    stats = server.stats.snapshot()
+    print(f"推送: {stats['messages']} 条 ({stats['messages'] / duration:.0f} 条/秒), ack {stats['acks']}/{stats['frames']} 帧")
+    print(f"处理: {handled[0]} 条 ({handled[0] / duration:.0f} 条/秒)")
+    print(f"mock 统计: {stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_ndjson.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+控制台模板输出 与 NDJSON 输出 的吞吐对比（只比较输出环节，消息预先解析好）
+用法: python benchmarks/bench_ndjson.py [消息数] [输出文件，默认 /dev/null]
+"""
+
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ndjson_output
+from event_schema import normalize
+from liveMan import DouyinLiveWebFetcher
+from mock_server import MockConfig, MessagePool
+from ndjson_output import NDJSONWriter
+from protobuf.douyin import PushFrame, Response
+
+ROOM_ID = 7392091211001140287
+
+
+def capture_messages(fetcher, n):
+    """
+    走一遍正常的解析流程，记录每次 _display 的参数
+    """
+    pool = MessagePool(MockConfig(room_id=str(ROOM_ID), pool_size=500))
+    captured = []
+    fetcher._display = lambda msg_type, message: captured.append((msg_type, message))
+    with contextlib.redirect_stdout(io.StringIO()):
+        while len(captured) < n:
+            response = Response(messages_list=pool.take(50), now=int(time.time() * 1000))
+            frame = PushFrame(payload=gzip.compress(bytes(response)))
+            fetcher._dispatchResponse(Response().parse(gzip.decompress(PushFrame().parse(bytes(frame)).payload)))
+    del fetcher._display
+    return captured[:n]
+
+
+def run(label, messages, display, target, finish=None):
+    stdout = sys.stdout
+    sys.stdout = open(target, "w", encoding="utf-8")
+    try:
+        started = time.perf_counter()
+        for msg_type, message in messages:
+            display(msg_type, message)
+        if finish is not None:
+            finish()
+        sys.stdout.flush()
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    print(f"{label:<28} {elapsed:.3f}s  {len(messages) / elapsed:>9.0f} 条/秒")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    target = sys.argv[2] if len(sys.argv) > 2 else os.devnull
+
+    fetcher = DouyinLiveWebFetcher(str(ROOM_ID), room_id=ROOM_ID)
+    messages = capture_messages(fetcher, n)
+    print(f"{len(messages)} 条消息，输出到 {target}，orjson {'已安装' if ndjson_output.orjson else '未安装'}")
+
+    fetcher.output = None
+    run("控制台模板 print", messages, fetcher._display, target)
+
+    def print_json(msg_type, message):
+        print(json.dumps(normalize(msg_type, message, ROOM_ID), ensure_ascii=False, default=str))
+    run("逐条 print(json.dumps)", messages, print_json, target)
+
+    writers = [("NDJSON 批量写出 (orjson)", ndjson_output.orjson)] if ndjson_output.orjson else []
+    writers.append(("NDJSON 批量写出 (json)", None))
+    for label, module in writers:
+        saved, ndjson_output.orjson = ndjson_output.orjson, module
+        writer = NDJSONWriter(target)
+        ndjson_output.orjson = saved
+        fetcher.output = writer
+        run(label, messages, fetcher._display, target, finish=writer.flush)
+        writer.close()
+    fetcher.output = None
+
+
+if __name__ == "__main__":
+    main()
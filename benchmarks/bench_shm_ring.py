@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_shm_ring.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+单进程解码 与 共享内存环形缓冲区 + 多个解码进程 的吞吐对比
+用法: python benchmarks/bench_shm_ring.py [帧数] [直播间数] [解码进程数...]
+"""
+
+import contextlib
+import gzip
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockConfig, MessagePool
+from protobuf.douyin import PushFrame, Response
+
+BATCH = 20
+
+
+def quiet(fetcher):
+    """
+    解码进程中屏蔽控制台输出，只测解析与分发
+    """
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+
+
+def make_frames(n, rooms):
+    pools = [MessagePool(MockConfig(room_id=str(7392091211001140287 + r), pool_size=100)) for r in range(rooms)]
+    frames = []
+    for i in range(n):
+        room = random.randrange(rooms)
+        response = Response(messages_list=pools[room].take(BATCH), now=int(time.time() * 1000), need_ack=False)
+        frame = PushFrame(log_id=i, payload_encoding="gzip", payload_type="msg",
+                          payload=gzip.compress(bytes(response), compresslevel=1))
+        frames.append((7392091211001140287 + room, bytes(frame)))
+    return frames
+
+
+def bench_single(frames):
+    from liveMan import DouyinLiveWebFetcher
+
+    fetchers = {}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for room_id, data in frames:
+            fetcher = fetchers.get(room_id)
+            if fetcher is None:
+                fetcher = fetchers[room_id] = DouyinLiveWebFetcher(str(room_id), room_id=room_id)
+            package = PushFrame().parse(data)
+            fetcher._dispatchResponse(Response().parse(gzip.decompress(package.payload)))
+    return time.perf_counter() - started
+
+
+def bench_pool(frames, workers):
+    from shm_ring import DecoderPool
+
+    pool = DecoderPool(workers=workers, ring_bytes=8 * 1024 * 1024, setup=quiet)
+    pool.start()
+    # 等待解码进程启动完成（spawn 需要重新导入模块）
+    time.sleep(3)
+    started = time.perf_counter()
+    for room_id, data in frames:
+        pool.submit(room_id, data)
+    submitted = time.perf_counter() - started
+    full = sum(s["full"] for s in pool.stats())
+    pool.close()
+    return time.perf_counter() - started, submitted, full
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rooms = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    worker_counts = [int(arg) for arg in sys.argv[3:]] or [1, 2, 4]
+
+    frames = make_frames(n, rooms)
+    messages = n * BATCH
+    print(f"{n} 帧 x {BATCH} 条消息，{rooms} 个直播间，CPU 核数 {os.cpu_count()}")
+
+    elapsed = bench_single(frames)
+    print(f"单进程:       {elapsed:.2f}s  {messages / elapsed:>9.0f} 条/秒")
+    for workers in worker_counts:
+        elapsed, submitted, full = bench_pool(frames, workers)
+        print(f"{workers} 个解码进程: {elapsed:.2f}s  {messages / elapsed:>9.0f} 条/秒"
+              f"  (写入耗时 {submitted:.2f}s, 缓冲区写满 {full} 次)")
+
+
+if __name__ == "__main__":
+    main()
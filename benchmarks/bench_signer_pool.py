@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_signer_pool.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+签名身份池对比：本地 mock_server 拒绝其中一个 UA（模拟失效身份）并随机拒绝一部分请求（模拟签名成功率不足），
+统计 get_room_status 首次尝试成功率与重试后成功率
+用法: python benchmarks/bench_signer_pool.py [请求次数] [随机失败比例]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockConfig, MockDouyinServer
+from signer_pool import USER_AGENTS
+
+# 拒绝默认身份（第一个 UA），只有一个身份时每次都会失败
+REJECTED_UA = USER_AGENTS[0].rsplit(" ", 1)[-1]
+
+
+def make_config(server, folder, size, attempts):
+    with open("message_handlers.yml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg["endpoints"] = {"host": server.base_url, "live_url": server.base_url, "wss_url": server.wss_url}
+    cfg["logging"]["folder"] = os.path.join(folder, "logs")
+    cfg["signer_pool"].update(size=size, attempts=attempts)
+    path = os.path.join(folder, f"config_{size}_{attempts}.yml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, allow_unicode=True)
+    return path
+
+
+def run(server, folder, size, attempts, n):
+    from liveMan import DouyinLiveWebFetcher
+
+    fetcher = DouyinLiveWebFetcher("642367622110", config_path=make_config(server, folder, size, attempts),
+                                   room_id="7392091211001140287")
+    ok = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(n):
+            if fetcher.get_room_status() is not None:
+                ok += 1
+    return ok, fetcher.signer_pool.stats()["retries"]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    server = MockDouyinServer(("127.0.0.1", 0), MockConfig(reject_user_agents=[REJECTED_UA],
+                                                          sign_failure_rate=failure_rate))
+    server.start()
+    print(f"{n} 次 get_room_status，拒绝 UA 含 {REJECTED_UA} 的请求，另随机拒绝 {failure_rate:.0%}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size, attempts in ((1, 1), (4, 1), (4, 3)):
+            ok, retries = run(server, folder, size, attempts, n)
+            print(f"身份数 {size}，最多尝试 {attempts} 次: 成功 {ok}/{n} ({ok / n:.0%})，换身份重试 {retries} 次")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
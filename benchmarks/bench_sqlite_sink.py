@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_sqlite_sink.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+SQLite 批量写入 与 CSV 逐行追加 的吞吐对比
+用法: python benchmarks/bench_sqlite_sink.py [事件数]
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_sink import SQLiteSink
+
+# 大型直播间的典型消息比例
+MIX = [("member_log", 0.55), ("chat_log", 0.25), ("like_log", 0.12), ("gift_log", 0.06), ("viewer_log", 0.02)]
+
+
+def make_record(log_name, i):
+    user_id = random.randint(10 ** 9, 10 ** 12)
+    base = {"room_id": 7392091211001140287, "ts": time.time(), "user_id": user_id, "user_name": f"用户{user_id}"}
+    if log_name == "chat_log":
+        base.update(fans_club=random.randint(0, 20), pay_grade=random.randint(0, 50), content="主播好呀" * random.randint(1, 5))
+    elif log_name == "gift_log":
+        base.update(gift_name="小心心", gift_count=random.randint(1, 10), gift_value=random.randint(1, 500),
+                    fans_club=3, pay_grade=12)
+    elif log_name == "member_log":
+        base.update(gender=random.choice(["男", "女", "未知"]))
+    elif log_name == "like_log":
+        base.update(count=random.randint(1, 15), total=i)
+    else:
+        base = {"room_id": base["room_id"], "ts": base["ts"], "current": 22164, "total": 436000}
+    return base
+
+
+def make_events(n):
+    names = [name for name, _ in MIX]
+    weights = [w for _, w in MIX]
+    return [(name, make_record(name, i)) for i, name in enumerate(random.choices(names, weights, k=n))]
+
+
+def bench_csv(events, folder):
+    start = time.perf_counter()
+    for log_name, record in events:
+        path = os.path.join(folder, f"{log_name}.csv")
+        exists = os.path.isfile(path)
+        with open(path, mode="a", newline="", encoding="utf-8-sig") as file:
+            writer = csv.writer(file)
+            if not exists:
+                writer.writerow(list(record))
+            writer.writerow(list(record.values()))
+    return time.perf_counter() - start
+
+
+def bench_sqlite(events, folder, batch_size):
+    sink = SQLiteSink(os.path.join(folder, f"bench_{batch_size}.db"), batch_size=batch_size, flush_interval=0.2)
+    start = time.perf_counter()
+    for log_name, record in events:
+        sink.write(log_name, record)
+    enqueue = time.perf_counter() - start
+    sink.close()
+    return enqueue, time.perf_counter() - start, sink.batches
+
+
+def bench_paced(events, folder, rate):
+    """
+    按固定速率写入，检查写入线程能否跟上且无积压
+    """
+    sink = SQLiteSink(os.path.join(folder, "paced.db"))
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    for i, (log_name, record) in enumerate(events):
+        target = start + i * interval
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sink.write(log_name, record)
+    produced = time.perf_counter() - start
+    backlog = sink._queue.qsize()
+    sink.close()
+    return produced, backlog
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    events = make_events(n)
+    with tempfile.TemporaryDirectory() as folder:
+        elapsed = bench_csv(events, folder)
+        print(f"csv 逐行追加      : {n / elapsed:>10.0f} 条/秒")
+        for batch_size in (1, 100, 500, 2000):
+            enqueue, elapsed, batches = bench_sqlite(events, folder, batch_size)
+            print(f"sqlite batch={batch_size:<5}: {n / elapsed:>10.0f} 条/秒 (入队 {n / enqueue:.0f} 条/秒, {batches} 个事务)")
+        rate = 3000
+        paced = events[:rate * 3]
+        produced, backlog = bench_paced(paced, folder, rate)
+        print(f"sqlite 持续 {rate} 条/秒 x {produced:.1f} 秒: 结束时积压 {backlog} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    bench_templates.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+预编译输出模板 与 原先逐条拼接 f-string 的单条格式化耗时对比
+用法: python benchmarks/bench_templates.py [次数]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protobuf.douyin import ChatMessage, EmojiChatMessage, FansClub, FansClubData, PayGrade, User
+from templates import compile_template, default_template
+
+CFG = {"show_user_id": True, "show_fans_club": True, "show_pay_grade": True}
+
+
+def legacy_chat(message, handler_config):
+    """原 _parseChatMsg 中的显示拼接逻辑"""
+    user_name = message.user.nick_name
+    user_id = message.user.id
+    content = message.content
+
+    cfg = handler_config.get("WebcastChatMessage", {})
+    show_user_id = cfg.get("show_user_id", True)
+    show_fans_club = cfg.get("show_fans_club", True)
+    show_pay_grade = cfg.get("show_pay_grade", True)
+
+    fans_club = None
+    pay_grade = None
+    if message.user:
+        if show_fans_club and hasattr(message.user, 'fans_club') and message.user.fans_club and hasattr(message.user.fans_club, 'data') and message.user.fans_club.data:
+            fans_club = message.user.fans_club.data.level
+        if show_pay_grade and hasattr(message.user, 'pay_grade') and message.user.pay_grade:
+            pay_grade = message.user.pay_grade.level
+
+    display_parts = []
+    if show_fans_club:
+        display_parts.append(f"[{fans_club}]")
+    if show_pay_grade:
+        display_parts.append(f"[{pay_grade}]")
+    if show_user_id and user_id != 111111:
+        display_parts.append(f"[{user_id}]{user_name}")
+    else:
+        display_parts.append(user_name)
+    return f"【聊天msg】{' '.join(display_parts)}: {content}"
+
+
+def legacy_emoji(message):
+    """原 _parseEmojiChatMsg 的输出，会把嵌套的 user/common 整个格式化"""
+    return f"【聊天表情包id】 {message.emoji_id},user：{message.user},common:{message.common},default_content:{message.default_content}"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    user = User(id=58977458943, nick_name="烹世酌生", pay_grade=PayGrade(level=12),
+                fans_club=FansClub(data=FansClubData(level=7)))
+    chat = ChatMessage().parse(bytes(ChatMessage(user=user, content="厕所里有6倍")))
+    emoji = EmojiChatMessage().parse(bytes(EmojiChatMessage(user=user, emoji_id=42, default_content="[微笑]")))
+
+    handler_config = {"WebcastChatMessage": CFG}
+    render_chat = compile_template(default_template("WebcastChatMessage", CFG))
+    render_emoji = compile_template(default_template("WebcastEmojiChatMessage", {}))
+    assert render_chat(chat) == legacy_chat(chat, handler_config), (render_chat(chat), legacy_chat(chat, handler_config))
+
+    cases = [
+        ("聊天 原拼接", lambda: legacy_chat(chat, handler_config), n),
+        ("聊天 预编译模板", lambda: render_chat(chat), n),
+        ("表情 原格式化", lambda: legacy_emoji(emoji), max(1, n // 100)),
+        ("表情 预编译模板", lambda: render_emoji(emoji), n),
+    ]
+    for name, func, count in cases:
+        elapsed = min(timeit.repeat(func, number=count, repeat=3))
+        print(f"{name:<12}: {elapsed / count * 1e6:8.2f} 微秒/条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    soak_test.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+长时间运行测试：在几分钟内向 DouyinLiveWebFetcher 灌入相当于数小时直播的消息（用户 id 不断变化），
+同时由本地 mock_server 定时断开连接触发重连，按固定间隔记录 RSS、tracemalloc 与线程数。
+预热结束后 RSS、tracemalloc 或线程数的增长超过预算时以退出码 1 结束，并打印增长最多的分配位置。
+用法: python benchmarks/soak_test.py --minutes 5 --users 1000000
+"""
+
+import argparse
+import contextlib
+import gzip
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from liveMan import DouyinLiveWebFetcher
+from mock_server import DEFAULT_MIX, MockConfig, MockDouyinServer, build_message, parse_mix
+from protobuf.douyin import PushFrame, Response
+
+# mock_server 中的用户 id 为 10**10 + i，varint 编码固定 5 字节；替换为同样 5 字节的 id 不改变任何长度字段
+USER_ID_BASE = 10 ** 10
+USER_ID_TAG = 0x08  # User.id 字段
+
+
+def varint5(value):
+    return bytes([(value >> 7 * n) & 0x7F | (0x80 if n < 4 else 0) for n in range(5)])
+
+
+def user_id_positions(data):
+    """
+    :return: data 中所有 User.id（mock_server 生成的用户）的位置
+    """
+    positions = []
+    pos = data.find(USER_ID_TAG)
+    while pos != -1 and pos + 6 <= len(data):
+        chunk = data[pos + 1:pos + 6]
+        if all(b & 0x80 for b in chunk[:4]) and not chunk[4] & 0x80:
+            value = sum((b & 0x7F) << 7 * n for n, b in enumerate(chunk))
+            if USER_ID_BASE <= value < USER_ID_BASE + 5000:
+                positions.append(pos + 1)
+        pos = data.find(USER_ID_TAG, pos + 1)
+    return positions
+
+
+class FrameFactory:
+    """
+    预先生成若干批消息作为模板，每次只替换其中的用户 id、补上当前时间后压缩，造数据不成为瓶颈
+    """
+
+    def __init__(self, room_id, users, templates=8, batch=20, mix=DEFAULT_MIX):
+        mix = parse_mix(mix)
+        kinds = list(mix)
+        weights = [mix[k] for k in kinds]
+        self.users = users
+        self.batch = batch
+        self.templates = []
+        for t in range(templates):
+            chosen = random.choices(kinds, weights, k=batch)
+            messages = [build_message(kind, int(room_id), t * batch + i) for i, kind in enumerate(chosen)]
+            data = bytes(Response(messages_list=messages))
+            self.templates.append((data, user_id_positions(data)))
+        self.frames = 0
+        self._next_user = 0
+
+    def next_frame(self):
+        data, positions = self.templates[self.frames % len(self.templates)]
+        buf = bytearray(data)
+        for pos in positions:
+            buf[pos:pos + 5] = varint5(USER_ID_BASE + self._next_user)
+            self._next_user = (self._next_user + 7919) % self.users  # 跳跃遍历全部用户
+        header = bytes(Response(now=int(time.time() * 1000), internal_ext="internal_src:dim"))
+        self.frames += 1
+        return bytes(PushFrame(payload_type="msg", log_id=self.frames, payload=gzip.compress(header + buf, 1)))
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_config(server, folder):
+    with open("message_handlers.yml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg["endpoints"] = {"host": server.base_url, "live_url": server.base_url, "wss_url": server.wss_url}
+    cfg["retry_delay_seconds"] = 1
+    cfg["profiler"]["signal"] = ""
+    logging_cfg = cfg["logging"]
+    logging_cfg["folder"] = os.path.join(folder, "logs")
+    logging_cfg["dictionary_encoding"] = True
+    logging_cfg["rotation"].update(max_size_mb=8, retention_mb=32)
+    logging_cfg["viewer_store"].update(enabled=True, downsample_interval_seconds=5)
+    cfg["checkpoint"].update(enabled=True, snapshot_interval_seconds=10)
+    cfg["WebcastChatMessage"]["log_to_csv"] = True
+    cfg["WebcastLikeMessage"]["aggregate_window_seconds"] = 1
+    path = os.path.join(folder, "config.yml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, allow_unicode=True)
+    return path
+
+
+def structure_sizes(fetcher):
+    """
+    各个有上限的结构当前的大小
+    """
+    sizes = {
+        "user_names": len(fetcher.user_names),
+        "gift_catalog": len(fetcher.gift_catalog),
+        "state_snapshots": sum(s["changed"] for s in fetcher.state.stats().values()),
+    }
+    if fetcher.like_coalescer is not None:
+        sizes["like_users"] = fetcher.like_coalescer.stats()["tracked_users"]
+    if fetcher.checkpoint is not None:
+        sizes["checkpoint_users"] = len(fetcher.checkpoint.aggregates.users)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长时间运行与内存上限测试")
+    parser.add_argument("--minutes", type=float, default=5, help="实际运行时长（分钟）")
+    parser.add_argument("--users", type=int, default=1000000, help="不同用户 id 的数量")
+    parser.add_argument("--typical-rate", type=float, default=50, help="换算模拟时长用的真实直播间每秒消息数")
+    parser.add_argument("--reconnect-every", type=float, default=20, help="mock 服务每隔多少秒断开连接")
+    parser.add_argument("--sample-seconds", type=float, default=15, help="采样间隔（秒）")
+    parser.add_argument("--warmup", type=float, default=0.25, help="预热时长占比，之后的增长计入预算")
+    parser.add_argument("--rss-budget-mb", type=float, default=64, help="预热后 RSS 最多增长（MB）")
+    parser.add_argument("--traced-budget-mb", type=float, default=32, help="预热后 tracemalloc 最多增长（MB）")
+    parser.add_argument("--thread-budget", type=int, default=3, help="预热后线程数最多增加")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="不开启 tracemalloc（速度约快一倍）")
+    args = parser.parse_args()
+
+    if not args.no_tracemalloc:
+        tracemalloc.start(1)
+    server = MockDouyinServer(("127.0.0.1", 0), MockConfig(rate=1, mix="seq=1", disconnect_every=args.reconnect_every))
+    server.start()
+    factory = FrameFactory(server.config.room_id, args.users)
+
+    out = sys.stdout
+    stopped = threading.Event()
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w", encoding="utf-8") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        fetcher = DouyinLiveWebFetcher(server.config.live_id, config_path=make_config(server, folder),
+                                       room_id=server.config.room_id)
+
+        def lifecycle():
+            # 与 LivenessScheduler 一样，连接结束后重新 start()
+            while not stopped.is_set():
+                fetcher.start()
+                stopped.wait(0.2)
+
+        runner = threading.Thread(target=lifecycle, name="soak-lifecycle", daemon=True)
+        runner.start()
+        print(f"{'秒':>6} {'消息数':>10} {'模拟小时':>8} {'RSS MB':>8} {'traced MB':>9} {'线程':>4} {'重连':>4}",
+              file=out)
+        started = time.monotonic()
+        duration = args.minutes * 60
+        next_sample = 0.0
+        samples = []
+        baseline = None
+        baseline_snapshot = None
+        messages = 0
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= next_sample or elapsed >= duration:
+                traced = tracemalloc.get_traced_memory()[0] / 1024 / 1024 if tracemalloc.is_tracing() else 0.0
+                sample = (elapsed, messages, rss_mb(), traced, threading.active_count(), server.stats.connections)
+                samples.append(sample)
+                hours = messages / args.typical_rate / 3600
+                print(f"{elapsed:6.0f} {messages:10d} {hours:8.1f} {sample[2]:8.1f} {traced:9.1f} {sample[4]:4d} "
+                      f"{max(0, sample[5] - 1):4d}", file=out)
+                if baseline is None and elapsed >= duration * args.warmup:
+                    baseline = sample
+                    if tracemalloc.is_tracing():
+                        baseline_snapshot = tracemalloc.take_snapshot()
+                next_sample += args.sample_seconds
+                if elapsed >= duration:
+                    break
+            for _ in range(50):
+                fetcher._wsOnMessage(None, factory.next_frame())
+            messages += 50 * factory.batch
+
+        sizes = structure_sizes(fetcher)
+        top = []
+        if baseline_snapshot is not None:
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                       tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+            snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+            top = snapshot.compare_to(baseline_snapshot.filter_traces(filters), "lineno")[:10]
+        stopped.set()
+        fetcher.stop()
+        runner.join(timeout=30)
+    server.shutdown()
+
+    final = samples[-1]
+    rss_growth = final[2] - baseline[2]
+    traced_growth = final[3] - baseline[3]
+    thread_growth = final[4] - baseline[4]
+    hours = (final[1] - baseline[1]) / args.typical_rate / 3600
+    print(f"\n预热后模拟 {hours:.1f} 小时（{final[1] - baseline[1]} 条消息，重连 {final[5] - baseline[5]} 次）："
+          f"RSS {rss_growth:+.1f} MB，tracemalloc {traced_growth:+.1f} MB，线程 {thread_growth:+d}")
+    print(f"结构大小: {sizes}")
+    if top:
+        print("增长最多的分配位置:")
+        for stat in top:
+            print(f"  {stat}")
+    failures = []
+    if rss_growth > args.rss_budget_mb:
+        failures.append(f"RSS 增长 {rss_growth:.1f} MB 超过 {args.rss_budget_mb} MB")
+    if tracemalloc.is_tracing() and traced_growth > args.traced_budget_mb:
+        failures.append(f"tracemalloc 增长 {traced_growth:.1f} MB 超过 {args.traced_budget_mb} MB")
+    if thread_growth > args.thread_budget:
+        failures.append(f"线程数增加 {thread_growth} 超过 {args.thread_budget}")
+    if failures:
+        print("【失败】" + "；".join(failures))
+        sys.exit(1)
+    print("【通过】")
+
+
+if __name__ == "__main__":
+    main()
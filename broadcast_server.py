@@ -0,0 +1,342 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    broadcast_server.py
+# @Project:     douyinLiveWebFetcher
+
+import base64
+import hashlib
+import selectors
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+from console import status_file
+from fanout import get_encoder
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+ALL_ROOMS = "*"
+MAX_REQUEST = 8192
+
+SSE_HEADERS = (b"HTTP/1.1 200 OK\r\n"
+               b"Content-Type: text/event-stream; charset=utf-8\r\n"
+               b"Cache-Control: no-cache\r\n"
+               b"Connection: keep-alive\r\n"
+               b"Access-Control-Allow-Origin: *\r\n\r\n"
+               b": connected\n\n")
+
+
+def ws_frame(payload, opcode=0x1):
+    """
+    服务端发往浏览器的 websocket 帧（不加掩码）
+    """
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _http_response(status, body, content_type="text/plain; charset=utf-8"):
+    return (f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n").encode() + body
+
+
+class _Client:
+
+    def __init__(self, conn, address):
+        self.conn = conn
+        self.address = address
+        self.request = bytearray()
+        self.kind = None  # sse / ws，握手完成前为 None
+        self.rooms = ()
+        self.chunks = deque()
+        self.offset = 0
+        self.buffered = 0
+        self.close_after_send = False
+
+
+class BroadcastServer:
+    """
+    本地事件广播服务，供直播间浮层、管理后台等浏览器客户端订阅：
+        GET /events?room=房间号        Server-Sent Events
+        GET /ws?room=房间号            WebSocket（文本帧）
+        GET /stats                     运行统计
+    room 可以用逗号分隔多个，省略时接收所有直播间。
+
+    事件按直播间累积 batch_interval 秒后编码为一个 JSON 数组，每批只编码一次，
+    同一份字节写给该直播间的所有客户端；客户端积压超过 max_buffer 字节时断开，不无限缓存。
+    """
+
+    def __init__(self, host="127.0.0.1", port=8780, batch_interval=0.02, max_buffer=1024 * 1024,
+                 keepalive_interval=15, codec="json"):
+        self.encode = get_encoder(codec)
+        self.batch_interval = batch_interval
+        self.max_buffer = max_buffer
+        self.keepalive_interval = keepalive_interval
+        self.published = 0
+        self.batches = 0
+        self.encoded_bytes = 0
+        self.slow_disconnects = 0
+
+        self._pending = {}  # room -> [event]
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._rooms = {}  # room -> {fileno: _Client}
+        self._closed = False
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(1024)
+        self._server.setblocking(False)
+        self.address = self._server.getsockname()
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ, "accept")
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, "wakeup")
+        self._thread = threading.Thread(target=self._run, name="broadcast-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def client_count(self):
+        return sum(1 for c in list(self._clients.values()) if c.kind is not None)
+
+    def publish(self, room_id, event):
+        """
+        放入该直播间的待发送批次，不阻塞调用方
+        """
+        room = str(room_id)
+        with self._lock:
+            pending = self._pending.get(room)
+            if pending is None:
+                pending = self._pending[room] = []
+            pending.append(event)
+
+    def stats(self):
+        return {
+            "clients": self.client_count,
+            "published": self.published,
+            "batches": self.batches,
+            "encoded_bytes": self.encoded_bytes,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+    def close(self):
+        self._closed = True
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
+        self._thread.join()
+
+    def _run(self):
+        next_flush = time.monotonic() + self.batch_interval
+        next_keepalive = time.monotonic() + self.keepalive_interval
+        while not self._closed:
+            timeout = max(0.0, next_flush - time.monotonic())
+            for key, mask in self._selector.select(timeout):
+                if key.data == "accept":
+                    self._accept()
+                elif key.data == "wakeup":
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(client)
+                    if mask & selectors.EVENT_WRITE and client.conn.fileno() in self._clients:
+                        self._send(client)
+            now = time.monotonic()
+            if now >= next_flush:
+                self._flush()
+                next_flush = now + self.batch_interval
+            if now >= next_keepalive:
+                self._keepalive()
+                next_keepalive = now + self.keepalive_interval
+        self._flush()
+        for client in list(self._clients.values()):
+            self._drop(client, slow=False)
+        self._selector.close()
+        self._server.close()
+
+    def _accept(self):
+        for _ in range(64):
+            try:
+                conn, address = self._server.accept()
+            except BlockingIOError:
+                return
+            conn.setblocking(False)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(conn, address)
+            self._clients[conn.fileno()] = client
+            self._selector.register(conn, selectors.EVENT_READ, client)
+
+    def _read(self, client):
+        try:
+            data = client.conn.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client, slow=False)
+            return
+        if client.kind == "ws":
+            # 浏览器只会发送关闭帧（或 ping），其余内容忽略
+            if data[0] & 0x0F == 0x8:
+                self._drop(client, slow=False)
+            return
+        if client.kind is not None:
+            return
+        client.request += data
+        if b"\r\n\r\n" in client.request:
+            self._handshake(client)
+        elif len(client.request) > MAX_REQUEST:
+            self._drop(client, slow=False)
+
+    def _handshake(self, client):
+        head = bytes(client.request).split(b"\r\n\r\n", 1)[0].decode("latin-1")
+        lines = head.split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            self._drop(client, slow=False)
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+        rooms = tuple(r for r in ",".join(query.get("room", [])).split(",") if r) or (ALL_ROOMS,)
+
+        if url.path == "/stats":
+            body = self.encode(self.stats())
+            self._queue(client, _http_response("200 OK", body, "application/json"))
+            client.close_after_send = True
+        elif url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+            key = headers.get("sec-websocket-key", "").encode()
+            accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+            self._queue(client, b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                                b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            self._subscribe(client, "ws", rooms)
+        elif url.path == "/events":
+            self._queue(client, SSE_HEADERS)
+            self._subscribe(client, "sse", rooms)
+        else:
+            self._queue(client, _http_response("404 Not Found", b"not found"))
+            client.close_after_send = True
+        client.request = None
+        self._send(client)
+
+    def _subscribe(self, client, kind, rooms):
+        client.kind = kind
+        client.rooms = rooms
+        for room in rooms:
+            self._rooms.setdefault(room, {})[client.conn.fileno()] = client
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for room, events in pending.items():
+            targets = list(self._rooms.get(room, {}).values()) + list(self._rooms.get(ALL_ROOMS, {}).values())
+            self.published += len(events)
+            if not targets:
+                continue
+            # 每个直播间每批只编码一次
+            payload = self.encode(events)
+            self.batches += 1
+            self.encoded_bytes += len(payload)
+            frames = {}
+            for client in targets:
+                frame = frames.get(client.kind)
+                if frame is None:
+                    frame = frames[client.kind] = (b"data: " + payload + b"\n\n") if client.kind == "sse" \
+                        else ws_frame(payload)
+                if client.buffered + len(frame) > self.max_buffer:
+                    self._drop(client)
+                    continue
+                self._queue(client, frame)
+                self._send(client)
+
+    def _keepalive(self):
+        # SSE 注释行 / websocket ping，及时发现已断开的客户端
+        sse, ping = b": ping\n\n", ws_frame(b"", 0x9)
+        for client in list(self._clients.values()):
+            if client.kind is not None and not client.chunks:
+                self._queue(client, sse if client.kind == "sse" else ping)
+                self._send(client)
+
+    def _queue(self, client, data):
+        client.chunks.append(data)
+        client.buffered += len(data)
+
+    def _send(self, client):
+        while client.chunks:
+            data = client.chunks[0]
+            try:
+                sent = client.conn.send(memoryview(data)[client.offset:])
+            except BlockingIOError:
+                break
+            except OSError:
+                self._drop(client, slow=False)
+                return
+            client.offset += sent
+            client.buffered -= sent
+            if client.offset < len(data):
+                break
+            client.chunks.popleft()
+            client.offset = 0
+        if not client.chunks and client.close_after_send:
+            self._drop(client, slow=False)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.chunks else 0)
+        try:
+            self._selector.modify(client.conn, events, client)
+        except (KeyError, ValueError):
+            pass
+
+    def _drop(self, client, slow=True):
+        fileno = client.conn.fileno()
+        if self._clients.pop(fileno, None) is None:
+            return
+        for room in client.rooms:
+            subscribers = self._rooms.get(room)
+            if subscribers is not None:
+                subscribers.pop(fileno, None)
+                if not subscribers:
+                    del self._rooms[room]
+        if slow:
+            self.slow_disconnects += 1
+            print(f"【广播】客户端 {client.address[0]}:{client.address[1]} 积压超过 {self.max_buffer} 字节，已断开", file=status_file())
+        try:
+            self._selector.unregister(client.conn)
+        except (KeyError, ValueError):
+            pass
+        client.conn.close()
+
+
+def create_broadcast_server(cfg):
+    """
+    根据 message_handlers.yml 中的 broadcast 配置创建广播服务
+    """
+    return BroadcastServer(
+        host=cfg.get("host", "127.0.0.1"),
+        port=cfg.get("port", 8780),
+        batch_interval=cfg.get("batch_interval_ms", 20) / 1000,
+        max_buffer=cfg.get("max_buffer_kb", 1024) * 1024,
+        keepalive_interval=cfg.get("keepalive_seconds", 15),
+    )
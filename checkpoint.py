@@ -0,0 +1,431 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    checkpoint.py
+# @Project:     douyinLiveWebFetcher
+
+import base64
+import hashlib
+import json
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+
+from console import status_file
+from state_tracker import STATE_TYPES
+
+WAL_HEADER = struct.Struct("<II")  # 记录长度、crc32
+SNAPSHOT_VERSION = 1
+
+
+class HyperLogLog:
+    """
+    去重用户数估计：2^p 个寄存器（p=12 时 4KB，标准误差约 1.6%），寄存器只增不减，合并取最大值
+    """
+
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def position(self, value):
+        """
+        :return: (寄存器序号, 该值对应的秩)
+        """
+        h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little")
+        bits = 64 - self.p
+        rest = h & ((1 << bits) - 1)
+        return h >> bits, bits - rest.bit_length() + 1
+
+    def count(self):
+        m = self.m
+        registers = self.registers
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class RoomAggregates:
+    """
+    单个直播间的累计状态：钻石与礼物数、点赞数、各类消息数、贡献用户、去重用户数、最后的 cursor 与状态类消息
+    快照和 WAL 记录使用同一个 apply 合并，实时更新与崩溃恢复走同一条路径
+    """
+
+    def __init__(self, top_users=1000, hll_precision=12):
+        self.top_users = top_users
+        self.seq = 0  # 已合并的最后一条 WAL 记录序号
+        self.total_diamonds = 0
+        self.gifts = 0
+        self.likes = 0
+        self.events = Counter()
+        self.users = {}  # user_id -> [昵称, 钻石数]
+        self.unique_users = HyperLogLog(hll_precision)
+        self.cursor = ""
+        self.server_now = 0
+        self.states = {}  # 状态类消息类型 -> 序列化后的最新消息
+
+    def apply(self, record):
+        self.seq = max(self.seq, record.get("seq", 0))
+        self.total_diamonds += record.get("d", 0)
+        self.gifts += record.get("g", 0)
+        self.likes += record.get("l", 0)
+        self.events.update(record.get("e", {}))
+        users = self.users
+        for user_id, (name, diamonds) in record.get("u", {}).items():
+            entry = users.get(user_id)
+            if entry is None:
+                users[user_id] = [name, diamonds]
+            else:
+                entry[0] = name or entry[0]
+                entry[1] += diamonds
+        if len(users) > 2 * self.top_users:
+            # 只保留贡献最多的 top_users 个用户，被淘汰用户之后的贡献从 0 开始累计
+            self.users = dict(sorted(users.items(), key=lambda item: item[1][1], reverse=True)[:self.top_users])
+        registers = self.unique_users.registers
+        for index, rank in record.get("r", {}).items():
+            index = int(index)
+            if rank > registers[index]:
+                registers[index] = rank
+        if record.get("c"):
+            self.cursor = record["c"]
+        self.server_now = max(self.server_now, record.get("n", 0))
+        for method, data in record.get("s", {}).items():
+            self.states[method] = base64.b64decode(data)
+
+    def top(self, n=10):
+        """
+        :return: 贡献钻石最多的 n 个用户 [(user_id, 昵称, 钻石数)]
+        """
+        ranked = sorted(self.users.items(), key=lambda item: item[1][1], reverse=True)[:n]
+        return [(user_id, name, diamonds) for user_id, (name, diamonds) in ranked]
+
+    def state_messages(self):
+        """
+        :return: {消息类型: 解析后的消息}，用于恢复 StateTracker
+        """
+        return {method: STATE_TYPES[method].message_class().parse(data)
+                for method, data in self.states.items() if method in STATE_TYPES}
+
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "total_diamonds": self.total_diamonds,
+            "gifts": self.gifts,
+            "likes": self.likes,
+            "events": dict(self.events),
+            "users": self.users,
+            "hll_precision": self.unique_users.p,
+            "unique_users": base64.b64encode(bytes(self.unique_users.registers)).decode(),
+            "cursor": self.cursor,
+            "server_now": self.server_now,
+            "states": {method: base64.b64encode(data).decode() for method, data in self.states.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data, top_users=1000):
+        aggregates = cls(top_users, data.get("hll_precision", 12))
+        aggregates.seq = data.get("seq", 0)
+        aggregates.total_diamonds = data.get("total_diamonds", 0)
+        aggregates.gifts = data.get("gifts", 0)
+        aggregates.likes = data.get("likes", 0)
+        aggregates.events.update(data.get("events", {}))
+        aggregates.users = {user_id: list(entry) for user_id, entry in data.get("users", {}).items()}
+        aggregates.unique_users.registers[:] = base64.b64decode(data["unique_users"])
+        aggregates.cursor = data.get("cursor", "")
+        aggregates.server_now = data.get("server_now", 0)
+        aggregates.states = {method: base64.b64decode(v) for method, v in data.get("states", {}).items()}
+        return aggregates
+
+    def summary(self):
+        return {
+            "total_diamonds": self.total_diamonds,
+            "gifts": self.gifts,
+            "likes": self.likes,
+            "unique_users": self.unique_users.count(),
+            "events": dict(self.events.most_common()),
+            "top_users": self.top(10),
+            "cursor": self.cursor,
+        }
+
+
+class _Delta:
+    """
+    两次写 WAL 之间的增量
+    """
+
+    __slots__ = ("diamonds", "gifts", "likes", "events", "users", "registers", "cursor", "server_now", "states")
+
+    def __init__(self):
+        self.diamonds = 0
+        self.gifts = 0
+        self.likes = 0
+        self.events = Counter()
+        self.users = {}
+        self.registers = {}
+        self.cursor = ""
+        self.server_now = 0
+        self.states = {}
+
+    def __bool__(self):
+        return bool(self.events or self.cursor or self.server_now or self.registers)
+
+    def record(self, seq):
+        record = {"seq": seq, "e": dict(self.events)}
+        if self.diamonds:
+            record["d"] = self.diamonds
+        if self.gifts:
+            record["g"] = self.gifts
+        if self.likes:
+            record["l"] = self.likes
+        if self.users:
+            record["u"] = self.users
+        if self.registers:
+            record["r"] = self.registers
+        if self.cursor:
+            record["c"] = self.cursor
+        if self.server_now:
+            record["n"] = self.server_now
+        if self.states:
+            record["s"] = {method: base64.b64encode(bytes(message)).decode()
+                           for method, message in self.states.items()}
+        return record
+
+
+def _present(value):
+    return value is not None and getattr(value, "_serialized_on_wire", True)
+
+
+class Checkpointer:
+    """
+    直播间累计状态的崩溃恢复：
+        - 处理线程只把增量记入内存，后台线程每 flush_interval 秒把增量作为一条记录追加到 WAL
+          （长度 + crc32 + JSON，崩溃时写了一半的记录在恢复时被截掉）
+        - 每 snapshot_interval 秒或 WAL 超过 max_wal_bytes 时写入完整快照（临时文件 + rename），随后清空 WAL
+        - 启动时读取快照并重放其后的 WAL 记录，恢复耗时只取决于快照大小和 WAL 上限，与直播时长无关
+    崩溃最多丢失最近 flush_interval 秒的增量。
+    """
+
+    def __init__(self, folder, room_id, snapshot_interval=60, flush_interval=1.0, max_wal_bytes=16 * 1024 * 1024,
+                 fsync=False, top_users=1000):
+        os.makedirs(folder, exist_ok=True)
+        self.room_id = str(room_id)
+        self.snapshot_path = os.path.join(folder, f"{self.room_id}.snap")
+        self.wal_path = os.path.join(folder, f"{self.room_id}.wal")
+        self.snapshot_interval = snapshot_interval
+        self.flush_interval = flush_interval
+        self.max_wal_bytes = max_wal_bytes
+        self.fsync = fsync
+        self.top_users = top_users
+        self.aggregates = RoomAggregates(top_users)
+        self.recovery = None
+        self.wal_records = 0
+        self.snapshots = 0
+        self._delta = _Delta()
+        self._seq = 0
+        self._wal = None
+        self._wal_bytes = 0
+        self._snapshot_at = time.monotonic()
+        self._lock = threading.Lock()  # 保护 _delta
+        self._io_lock = threading.Lock()  # 保护 WAL 与快照文件
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def recover(self):
+        """
+        读取快照并重放 WAL，截掉末尾不完整的记录
+        :return: RoomAggregates
+        """
+        started = time.perf_counter()
+        aggregates = None
+        if os.path.isfile(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == SNAPSHOT_VERSION:
+                    aggregates = RoomAggregates.from_dict(data["aggregates"], self.top_users)
+            except Exception as e:
+                print(f"【检查点】快照读取失败，仅重放 WAL: {e}", file=status_file())
+        if aggregates is None:
+            aggregates = RoomAggregates(self.top_users)
+        snapshot_seq = aggregates.seq
+
+        replayed = 0
+        valid_bytes = 0
+        if os.path.isfile(self.wal_path):
+            with open(self.wal_path, "rb") as f:
+                data = f.read()
+            pos = 0
+            while pos + WAL_HEADER.size <= len(data):
+                length, crc = WAL_HEADER.unpack_from(data, pos)
+                body = data[pos + WAL_HEADER.size:pos + WAL_HEADER.size + length]
+                if len(body) < length or zlib.crc32(body) != crc:
+                    break
+                record = json.loads(body)
+                if record.get("seq", 0) > snapshot_seq:
+                    aggregates.apply(record)
+                    replayed += 1
+                pos += WAL_HEADER.size + length
+            valid_bytes = pos
+            if valid_bytes < len(data):
+                print(f"【检查点】WAL 末尾 {len(data) - valid_bytes} 字节不完整，已截断", file=status_file())
+                with open(self.wal_path, "r+b") as f:
+                    f.truncate(valid_bytes)
+
+        self.aggregates = aggregates
+        self._seq = aggregates.seq
+        self._wal_bytes = valid_bytes
+        self.recovery = {
+            "snapshot_seq": snapshot_seq,
+            "replayed": replayed,
+            "wal_bytes": valid_bytes,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return aggregates
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._wal = open(self.wal_path, "ab")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f"checkpoint-{self.room_id}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        写出剩余增量并保存快照
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._wal is not None:
+            self.snapshot()
+            self._wal.close()
+            self._wal = None
+
+    def observe(self, method, message):
+        """
+        记录一条处理完成的消息，在处理线程中调用
+        """
+        user = getattr(message, "user", None)
+        with self._lock:
+            delta = self._delta
+            delta.events[method] += 1
+            if _present(user) and user.id:
+                index, rank = self.aggregates.unique_users.position(user.id)
+                if rank > self.aggregates.unique_users.registers[index] and rank > delta.registers.get(index, 0):
+                    delta.registers[index] = rank
+            if method == "WebcastGiftMessage":
+                value = message.gift.diamond_count * message.combo_count
+                delta.diamonds += value
+                delta.gifts += 1
+                if _present(user) and user.id:
+                    entry = delta.users.get(str(user.id))
+                    if entry is None:
+                        delta.users[str(user.id)] = [user.nick_name, value]
+                    else:
+                        entry[1] += value
+            elif method == "WebcastLikeMessage":
+                delta.likes += getattr(message, "count", 0) or 0
+            elif method in STATE_TYPES:
+                delta.states[method] = message
+
+    def observe_response(self, response):
+        if response.cursor or response.now:
+            with self._lock:
+                self._delta.cursor = response.cursor or self._delta.cursor
+                self._delta.server_now = max(self._delta.server_now, response.now)
+
+    def flush(self):
+        """
+        把当前增量作为一条记录追加到 WAL
+        """
+        with self._lock:
+            delta = self._delta
+            if not delta:
+                return
+            self._delta = _Delta()
+        with self._io_lock:
+            self._seq += 1
+            record = delta.record(self._seq)
+            self.aggregates.apply(record)
+            if self._wal is None:
+                return
+            body = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._wal.write(WAL_HEADER.pack(len(body), zlib.crc32(body)))
+            self._wal.write(body)
+            self._wal.flush()
+            if self.fsync:
+                os.fsync(self._wal.fileno())
+            self._wal_bytes += WAL_HEADER.size + len(body)
+            self.wal_records += 1
+
+    def snapshot(self):
+        """
+        写入完整快照并清空 WAL；快照记录已包含的 WAL 序号，清空前崩溃时重放会跳过这些记录
+        """
+        self.flush()
+        with self._io_lock:
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "room_id": self.room_id,
+                "saved_at": time.time(),
+                "aggregates": self.aggregates.to_dict(),
+            }
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            if self._wal is not None:
+                self._wal.truncate(0)
+                self._wal.seek(0)
+            self._wal_bytes = 0
+            self._snapshot_at = time.monotonic()
+            self.snapshots += 1
+
+    def stats(self):
+        with self._io_lock:
+            aggregates = self.aggregates.summary()
+        return {
+            "seq": self._seq,
+            "wal_bytes": self._wal_bytes,
+            "wal_records": self.wal_records,
+            "snapshots": self.snapshots,
+            "recovery": self.recovery,
+            "aggregates": aggregates,
+        }
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                if (time.monotonic() - self._snapshot_at >= self.snapshot_interval
+                        or self._wal_bytes >= self.max_wal_bytes):
+                    self.snapshot()
+            except Exception as e:
+                print(f"【检查点】写入失败: {e}", file=status_file())
+
+
+def create_checkpointer(cfg, folder, room_id):
+    """
+    根据 message_handlers.yml 中的 checkpoint 配置创建
+    """
+    return Checkpointer(
+        os.path.join(folder, cfg.get("folder", "checkpoints")),
+        room_id,
+        snapshot_interval=cfg.get("snapshot_interval_seconds", 60),
+        flush_interval=cfg.get("wal_flush_interval_ms", 1000) / 1000,
+        max_wal_bytes=cfg.get("max_wal_mb", 16) * 1024 * 1024,
+        fsync=cfg.get("fsync", False),
+        top_users=cfg.get("top_users", 1000),
+    )
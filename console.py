@@ -0,0 +1,35 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    console.py
+# @Project:     douyinLiveWebFetcher
+
+import sys
+import threading
+
+# 占用标准输出的数据输出（例如 NDJSON）个数
+_stdout_owners = 0
+_lock = threading.Lock()
+
+
+def reserve_stdout():
+    """
+    标准输出开始只写数据，之后的提示信息改写到标准错误
+    """
+    global _stdout_owners
+    with _lock:
+        _stdout_owners += 1
+
+
+def release_stdout():
+    global _stdout_owners
+    with _lock:
+        _stdout_owners -= 1
+
+
+def status_file():
+    """
+    提示信息的输出位置：标准输出被占用时为标准错误，否则为 None（print 默认的标准输出）。
+    不修改 sys.stdout，调用方自己的输出不受影响
+    """
+    return sys.stderr if _stdout_owners else None
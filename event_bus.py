@@ -0,0 +1,278 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    event_bus.py
+# @Project:     douyinLiveWebFetcher
+
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+EXECUTORS = ("inline", "thread", "async")
+POLICIES = ("drop", "block")
+
+
+class Subscription:
+    """
+    单个订阅者：回调函数 + 执行方式 + 有界队列 + 统计计数
+    """
+
+    def __init__(self, bus, event_type, callback, executor, queue_size, policy):
+        if executor not in EXECUTORS:
+            raise ValueError(f"未知的执行方式: {executor}")
+        if policy not in POLICIES:
+            raise ValueError(f"未知的队列策略: {policy}")
+        self.bus = bus
+        self.event_type = event_type
+        self.callback = callback
+        self.executor = executor
+        self.policy = policy
+        self.queue_size = queue_size
+        self.is_coroutine = inspect.iscoroutinefunction(callback)
+        self.active = True
+
+        self._pending = deque()  # 每条积压事件占用 _slots 中的一个名额，消费或丢弃时归还
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+        # 统计，发布线程与消费线程都会更新，修改时持有 _stats_lock
+        self._stats_lock = threading.Lock()
+        self.delivered = 0
+        self.errors = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error = None
+
+    @property
+    def name(self):
+        return getattr(self.callback, "__qualname__", repr(self.callback))
+
+    def offer(self, event):
+        """
+        放入一条事件，返回是否成功入队
+        """
+        if not self.active:
+            return False
+        if self.executor == "inline":
+            self._invoke(event)
+            return True
+        if self.policy == "block":
+            while not self._slots.acquire(timeout=0.5):
+                if not self.active:
+                    return False
+        elif not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            if not self.active:
+                # 拿到名额时已取消订阅
+                self._slots.release()
+                return False
+            self._pending.append(event)
+            if self._scheduled:
+                return True
+            self._scheduled = True
+        self.bus._schedule(self)
+        return True
+
+    def cancel(self):
+        """
+        停止投递：尚未消费的积压事件计入 dropped 并归还名额，阻塞中的发布方随之返回
+        """
+        with self._lock:
+            self.active = False
+            discarded = len(self._pending)
+            self._pending.clear()
+        for _ in range(discarded):
+            self._slots.release()
+        if discarded:
+            with self._stats_lock:
+                self.dropped += discarded
+
+    def _drain(self):
+        """
+        线程池中按顺序消费该订阅者的积压事件
+        """
+        while True:
+            with self._lock:
+                if not self._pending or not self.active:
+                    self._scheduled = False
+                    return
+                event = self._pending.popleft()
+            try:
+                self._invoke(event)
+            finally:
+                self._slots.release()
+
+    async def _drain_async(self):
+        while True:
+            with self._lock:
+                if not self._pending or not self.active:
+                    self._scheduled = False
+                    return
+                event = self._pending.popleft()
+            start = time.perf_counter()
+            try:
+                result = self.callback(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self._record(start, e)
+            else:
+                self._record(start)
+            finally:
+                self._slots.release()
+
+    def _invoke(self, event):
+        start = time.perf_counter()
+        try:
+            if self.is_coroutine:
+                asyncio.run(self.callback(event))
+            else:
+                self.callback(event)
+        except Exception as e:
+            self._record(start, e)
+        else:
+            self._record(start)
+
+    def _record(self, start, error=None):
+        latency = time.perf_counter() - start
+        with self._stats_lock:
+            self.delivered += 1
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+            if error is not None:
+                self.errors += 1
+                self.last_error = repr(error)
+
+    def stats(self):
+        with self._stats_lock:
+            delivered, total_latency = self.delivered, self.total_latency
+        return {
+            "event_type": self.event_type,
+            "callback": self.name,
+            "executor": self.executor,
+            "policy": self.policy,
+            "queued": len(self._pending),
+            "delivered": delivered,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "avg_latency_ms": (total_latency / delivered * 1000) if delivered else 0.0,
+            "max_latency_ms": self.max_latency * 1000,
+            "last_error": self.last_error,
+        }
+
+
+class EventBus:
+    """
+    事件订阅分发：按消息类型（如 WebcastChatMessage）注册回调，"*" 订阅全部类型。
+    每个订阅者拥有独立的有界队列，慢消费者只会丢弃/阻塞自己的事件，不会拖慢其他订阅者。
+    """
+
+    def __init__(self, executor="inline", max_workers=4, queue_size=1000, policy="drop"):
+        self.default_executor = executor
+        self.default_queue_size = queue_size
+        self.default_policy = policy
+        self.max_workers = max_workers
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._loop = None
+        self._loop_thread = None
+
+    def subscribe(self, event_type, callback, executor=None, queue_size=None, policy=None):
+        """
+        注册回调
+        :param event_type: 消息类型，例如 WebcastGiftMessage；"*" 表示全部
+        :param callback: 回调函数，参数为解析后的消息，可以是 async 函数
+        :param executor: inline / thread / async，默认 async 函数使用 async，其余使用全局默认值
+        :param queue_size: 订阅者队列长度
+        :param policy: 队列满时的策略，drop 丢弃 / block 阻塞
+        :return: Subscription
+        """
+        if executor is None:
+            executor = "async" if inspect.iscoroutinefunction(callback) else self.default_executor
+        sub = Subscription(
+            self,
+            event_type,
+            callback,
+            executor,
+            queue_size or self.default_queue_size,
+            policy or self.default_policy,
+        )
+        with self._lock:
+            subs = list(self._subscriptions.get(event_type, ()))
+            subs.append(sub)
+            self._subscriptions[event_type] = subs
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.cancel()
+        with self._lock:
+            subs = [s for s in self._subscriptions.get(sub.event_type, ()) if s is not sub]
+            if subs:
+                self._subscriptions[sub.event_type] = subs
+            else:
+                self._subscriptions.pop(sub.event_type, None)
+
+    def has_subscribers(self, event_type):
+        return bool(self._subscriptions.get(event_type) or self._subscriptions.get("*"))
+
+    def publish(self, event_type, event):
+        """
+        发布事件，返回成功投递的订阅者数量
+        """
+        delivered = 0
+        for sub in self._subscriptions.get(event_type, ()):
+            delivered += sub.offer(event)
+        for sub in self._subscriptions.get("*", ()):
+            delivered += sub.offer(event)
+        return delivered
+
+    def stats(self):
+        with self._lock:
+            subs = [s for group in self._subscriptions.values() for s in group]
+        return [s.stats() for s in subs]
+
+    def close(self):
+        with self._lock:
+            subs = [s for group in self._subscriptions.values() for s in group]
+            self._subscriptions = {}
+        for sub in subs:
+            sub.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def _schedule(self, sub):
+        if sub.executor == "thread":
+            self._get_pool().submit(sub._drain)
+        else:
+            asyncio.run_coroutine_threadsafe(sub._drain_async(), self._get_loop())
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="event-bus")
+        return self._pool
+
+    def _get_loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._loop_thread = threading.Thread(target=loop.run_forever, name="event-bus-loop", daemon=True)
+                    self._loop_thread.start()
+                    self._loop = loop
+        return self._loop
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    event_schema.py
+# @Project:     douyinLiveWebFetcher
+
+import time
+
+import betterproto
+
+
+def _present(value):
+    """
+    betterproto 消息的真值判断会逐个字段与默认值比较，开销很大，这里只检查字段是否出现在数据中
+    """
+    return value is not None and getattr(value, "_serialized_on_wire", True)
+
+
+def _user_fields(user):
+    if not _present(user):
+        return {"user_id": None, "user_name": None, "fans_club": None, "pay_grade": None}
+    # 点赞合并后的 LikeSummary.user 只有 id / nick_name
+    fans_club = getattr(user, "fans_club", None)
+    pay_grade = getattr(user, "pay_grade", None)
+    fans_club = fans_club.data.level if _present(fans_club) and _present(fans_club.data) else None
+    pay_grade = pay_grade.level if _present(pay_grade) else None
+    return {"user_id": user.id, "user_name": user.nick_name, "fans_club": fans_club, "pay_grade": pay_grade}
+
+
+def _chat(m):
+    # 开启 near_duplicate 时为近似重复弹幕的分组 id
+    return dict(_user_fields(m.user), content=m.content, cluster_id=getattr(m, "cluster_id", None))
+
+
+def _gift(m):
+    return dict(_user_fields(m.user), gift_id=m.gift_id, gift_name=m.gift.name, count=m.combo_count,
+                diamond_count=m.gift.diamond_count, value=m.gift.diamond_count * m.combo_count)
+
+
+def _like(m):
+    return dict(_user_fields(m.user), count=m.count, total=m.total)
+
+
+def _member(m):
+    gender = m.user.gender if _present(m.user) else None
+    return dict(_user_fields(m.user), gender={0: "女", 1: "男"}.get(gender, "未知"), member_count=m.member_count)
+
+
+def _social(m):
+    return dict(_user_fields(m.user), follow_count=m.follow_count)
+
+
+def _room_user_seq(m):
+    return {"current": m.total, "total_pv": m.total_pv_for_anchor}
+
+
+def _room_stats(m):
+    return {"display_long": m.display_long, "display_value": m.display_value, "total": m.total}
+
+
+def _rank(m):
+    return {"ranks": [{"user_id": r.user.id, "user_name": r.user.nick_name, "score": r.score_str}
+                      for r in m.ranks_list]}
+
+
+def _fansclub(m):
+    return dict(_user_fields(m.user), fansclub_type=m.type, content=m.content)
+
+
+def _emoji_chat(m):
+    return dict(_user_fields(m.user), emoji_id=m.emoji_id, content=m.default_content)
+
+
+def _keyword_match(m):
+    return dict(_user_fields(m.user), content=m.content,
+                hits=[{"keyword": h.keyword, "category": h.category, "start": h.start, "end": h.end} for h in m.hits])
+
+
+def _room(m):
+    return {"content": m.content}
+
+
+def _control(m):
+    return {"status": m.status}
+
+
+def _stream_adaptation(m):
+    return {"adaptation_type": m.adaptation_type}
+
+
+# 消息类型 -> 字段提取函数，每种类型的字段固定，下游可按 type 解析
+SCHEMAS = {
+    "WebcastChatMessage": _chat,
+    "WebcastGiftMessage": _gift,
+    "WebcastLikeMessage": _like,
+    "WebcastMemberMessage": _member,
+    "WebcastSocialMessage": _social,
+    "WebcastRoomUserSeqMessage": _room_user_seq,
+    "WebcastRoomStatsMessage": _room_stats,
+    "WebcastRoomRankMessage": _rank,
+    "WebcastFansclubMessage": _fansclub,
+    "WebcastEmojiChatMessage": _emoji_chat,
+    "WebcastRoomMessage": _room,
+    "WebcastControlMessage": _control,
+    "WebcastRoomStreamAdaptationMessage": _stream_adaptation,
+    "KeywordMatch": _keyword_match,
+}
+
+
+def normalize(method, message, room_id=None):
+    """
+    将解析后的消息转换为字段固定的 dict
+    :param method: 消息类型，例如 WebcastChatMessage
+    :param message: 解析后的 betterproto 消息
+    :param room_id: 直播间 id，消息本身不带 common 时使用
+    :return: {"type", "room_id", "msg_id", "create_time", "ts", ...类型字段}
+    """
+    common = getattr(message, "common", None)
+    if not _present(common):
+        common = getattr(message, "common_info", None)
+    if not _present(common):
+        common = None
+    event = {
+        "type": method,
+        "room_id": (common.room_id if common is not None else None) or room_id,
+        "msg_id": common.msg_id if common is not None else None,
+        "create_time": common.create_time if common is not None else None,
+        "ts": time.time(),
+    }
+    extract = SCHEMAS.get(method)
+    if extract is not None:
+        event.update(extract(message))
+    else:
+        event["data"] = message.to_dict(casing=betterproto.Casing.SNAKE)
+    return event
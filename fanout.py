@@ -0,0 +1,335 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    fanout.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
+from console import status_file
+
+HEADER = struct.Struct(">I")
+
+
+def get_encoder(codec):
+    """
+    :param codec: json 或 msgpack
+    :return: dict -> bytes
+    """
+    if codec == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("codec 为 msgpack 时需要安装 msgpack")
+        return msgpack.packb
+    if codec == "json":
+        if orjson is not None:
+            return orjson.dumps
+        return lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    raise ValueError(f"未知的编码: {codec}")
+
+
+def get_decoder(codec):
+    if codec == "msgpack":
+        return msgpack.unpackb
+    if orjson is not None:
+        return orjson.loads
+    return json.loads
+
+
+def iter_frames(sock, codec="json"):
+    """
+    订阅端读取：按 4 字节大端长度前缀拆帧并解码
+    """
+    decode = get_decoder(codec)
+    buffer = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        offset = 0
+        while len(buffer) - offset >= HEADER.size:
+            (size,) = HEADER.unpack_from(buffer, offset)
+            end = offset + HEADER.size + size
+            if len(buffer) < end:
+                break
+            yield decode(bytes(buffer[offset + HEADER.size:end]))
+            offset = end
+        del buffer[:offset]
+
+
+def subscribe(path, codec="json"):
+    """
+    连接 Unix socket 发布端，逐条返回事件
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    try:
+        yield from iter_frames(sock, codec)
+    finally:
+        sock.close()
+
+
+class _Subscriber:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.chunks = deque()
+        self.offset = 0
+        self.queued_frames = 0
+        self.sent_frames = 0
+
+
+class UnixSocketPublisher:
+    """
+    Unix socket 扇出发布：每条事件只编码一次，按批次写给所有订阅者。
+    每个订阅者积压超过 hwm 帧时断开，避免慢订阅者拖慢其他订阅者或无限占用内存。
+    """
+
+    def __init__(self, path, codec="json", hwm=10000, batch_interval=0.005, batch_size=256):
+        self.path = path
+        self.encode = get_encoder(codec)
+        self.hwm = hwm
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self.published = 0
+        self.dropped_subscribers = 0
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._subscribers = {}
+        self._closed = False
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(128)
+        self._server.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ, "accept")
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, "wakeup")
+        self._thread = threading.Thread(target=self._run, name="fanout-publisher", daemon=True)
+        self._thread.start()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        """
+        编码并放入待发送批次，不阻塞调用方
+        """
+        frame = self.encode(event)
+        with self._lock:
+            self._pending.append(HEADER.pack(len(frame)) + frame)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup()
+
+    def close(self):
+        self._closed = True
+        self._wakeup()
+        self._thread.join()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        next_flush = time.monotonic() + self.batch_interval
+        while not self._closed:
+            timeout = max(0.0, next_flush - time.monotonic())
+            for key, mask in self._selector.select(timeout):
+                if key.data == "accept":
+                    self._accept()
+                elif key.data == "wakeup":
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    if mask & selectors.EVENT_READ:
+                        self._read(key.data)
+                    if mask & selectors.EVENT_WRITE:
+                        self._send(key.data)
+            if time.monotonic() >= next_flush or len(self._pending) >= self.batch_size:
+                self._flush()
+                next_flush = time.monotonic() + self.batch_interval
+        self._flush()
+        for sub in list(self._subscribers.values()):
+            self._drop(sub, slow=False)
+        self._selector.close()
+        self._server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept(self):
+        try:
+            conn, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        sub = _Subscriber(conn)
+        self._subscribers[conn.fileno()] = sub
+        self._selector.register(conn, selectors.EVENT_READ, sub)
+
+    def _flush(self):
+        with self._lock:
+            frames, self._pending = self._pending, []
+        if not frames:
+            return
+        self.published += len(frames)
+        batch = b"".join(frames)
+        for sub in list(self._subscribers.values()):
+            if sub.queued_frames + len(frames) > self.hwm:
+                self._drop(sub)
+                continue
+            sub.chunks.append((batch, len(frames)))
+            sub.queued_frames += len(frames)
+            self._send(sub)
+
+    def _send(self, sub):
+        while sub.chunks:
+            batch, count = sub.chunks[0]
+            try:
+                sent = sub.conn.send(memoryview(batch)[sub.offset:])
+            except BlockingIOError:
+                break
+            except OSError:
+                self._drop(sub)
+                return
+            sub.offset += sent
+            if sub.offset < len(batch):
+                break
+            sub.chunks.popleft()
+            sub.offset = 0
+            sub.queued_frames -= count
+            sub.sent_frames += count
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if sub.chunks else 0)
+        try:
+            self._selector.modify(sub.conn, events, sub)
+        except (KeyError, ValueError):
+            pass
+
+    def _read(self, sub):
+        """
+        订阅端只读不写：读到 EOF 说明连接已关闭；订阅端误写的数据读出后丢弃，
+        否则数据一直留在接收缓冲区，select 会反复返回可读导致空转
+        """
+        while True:
+            try:
+                data = sub.conn.recv(4096)
+            except BlockingIOError:
+                return
+            except OSError:
+                self._drop(sub, slow=False)
+                return
+            if not data:
+                self._drop(sub, slow=False)
+                return
+
+    def _drop(self, sub, slow=True):
+        if self._subscribers.pop(sub.conn.fileno(), None) is None:
+            return
+        if slow:
+            self.dropped_subscribers += 1
+            print(f"【扇出】订阅者积压超过 {self.hwm} 帧，已断开", file=status_file())
+        try:
+            self._selector.unregister(sub.conn)
+        except (KeyError, ValueError):
+            pass
+        sub.conn.close()
+
+
+class ZmqPublisher:
+    """
+    ZeroMQ PUB 扇出发布，慢订阅者由 SNDHWM 丢弃；每批事件作为一个多帧消息发送
+    """
+
+    def __init__(self, endpoint, codec="json", hwm=10000, batch_interval=0.005, batch_size=256):
+        if zmq is None:
+            raise RuntimeError("transport 为 zmq 时需要安装 pyzmq")
+        self.encode = get_encoder(codec)
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self.published = 0
+        self._context = zmq.Context.instance()
+        self._socket = self._context.socket(zmq.PUB)
+        self._socket.setsockopt(zmq.SNDHWM, hwm)
+        self._socket.bind(endpoint)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fanout-zmq", daemon=True)
+        self._thread.start()
+
+    def publish(self, event):
+        frame = self.encode(event)
+        with self._lock:
+            self._pending.append(frame)
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        self._socket.close(linger=0)
+
+    def _run(self):
+        # zmq socket 不是线程安全的，只在本线程中发送
+        while not self._closed.wait(self.batch_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        with self._lock:
+            frames, self._pending = self._pending, []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            try:
+                self._socket.send_multipart(chunk, flags=zmq.NOBLOCK)
+            except zmq.Again:
+                continue
+            self.published += len(chunk)
+
+
+def create_publisher(cfg):
+    """
+    根据 message_handlers.yml 中的 fanout 配置创建发布端
+    """
+    kwargs = {
+        "codec": cfg.get("codec", "json"),
+        "hwm": cfg.get("hwm", 10000),
+        "batch_interval": cfg.get("batch_interval_ms", 5) / 1000,
+        "batch_size": cfg.get("batch_size", 256),
+    }
+    if cfg.get("transport", "unix") == "zmq":
+        return ZmqPublisher(cfg.get("endpoint", "ipc:///tmp/douyin_live.ipc"), **kwargs)
+    return UnixSocketPublisher(cfg.get("path", "/tmp/douyin_live.sock"), **kwargs)
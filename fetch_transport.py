@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    fetch_transport.py
+# @Project:     douyinLiveWebFetcher
+
+import gzip
+import threading
+import time
+import urllib.parse
+
+
+from console import status_file
+from protobuf.douyin import Response
+
+
+class FetchPoller:
+    """
+    HTTP 轮询方式获取直播间消息（/webcast/im/fetch/），不需要常驻 websocket 连接，适合低流量直播间。
+    每次请求带上上一次返回的 cursor 和 internal_ext，按服务端返回的 fetch_interval 决定下次请求时间。
+    """
+
+    def __init__(self, fetcher, min_interval=0.5, max_interval=10.0, default_interval=1.0):
+        self.fetcher = fetcher
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.cursor = ""
+        self.internal_ext = ""
+        self.last_fetch_type = None
+        self.requests = 0
+        self.messages = 0
+        # 复用各签名身份的 session（连接池在 Identity 中挂载），keep-alive 连接在多次轮询之间复用
+        self._stopped = threading.Event()
+
+    @property
+    def url(self):
+        return urllib.parse.urljoin(self.fetcher.live_url, "webcast/im/fetch/")
+
+    def build_params(self):
+        params = {
+            "resp_content_type": "protobuf",
+            "did_rule": "3",
+            "device_id": "",
+            "app_name": "douyin_web",
+            "endpoint": "live_pc",
+            "support_wrds": "1",
+            "user_unique_id": self.fetcher.identity.device_id,
+            "identity": "audience",
+            "need_persist_msg_count": "15",
+            "insert_task_id": "",
+            "live_reason": "",
+            "room_id": self.fetcher.room_id,
+            "version_code": "180800",
+            "last_rtt": "0",
+            "live_id": "1",
+            "aid": "6383",
+            "fetch_rule": "1",
+            "cursor": self.cursor,
+            "internal_ext": self.internal_ext,
+            "device_platform": "web",
+            "cookie_enabled": "true",
+            "browser_language": "zh-CN",
+            "browser_platform": "Win32",
+            "browser_name": "Mozilla",
+            "browser_online": "true",
+            "tz_name": "Asia/Shanghai",
+        }
+        params["a_bogus"] = self.fetcher.get_a_bogus(params)
+        return params
+
+    def fetch_once(self):
+        """
+        请求一次 fetch 接口
+        :return: Response
+        """
+        headers = {
+            "User-Agent": self.fetcher.user_agent,
+            "Referer": urllib.parse.urljoin(self.fetcher.live_url, self.fetcher.live_id),
+            "Cookie": f"ttwid={self.fetcher.ttwid}",
+        }
+        started = time.perf_counter()
+        resp = self.fetcher.session.get(self.url, params=self.build_params(), headers=headers, timeout=10)
+        resp.raise_for_status()
+        content = resp.content
+        if content[:2] == b"\x1f\x8b":
+            content = gzip.decompress(content)
+        response = Response().parse(content)
+        self.fetcher.signer_pool.record(self.fetcher.identity, "fetch", True, time.perf_counter() - started)
+        self.requests += 1
+        self.messages += len(response.messages_list)
+        if response.cursor:
+            self.cursor = response.cursor
+        if response.internal_ext:
+            self.internal_ext = response.internal_ext
+        self.last_fetch_type = response.fetch_type
+        return response
+
+    def next_interval(self, response):
+        """
+        服务端建议的轮询间隔（毫秒），限制在 [min_interval, max_interval] 秒内
+        """
+        if not response or not response.fetch_interval:
+            return self.default_interval
+        return min(self.max_interval, max(self.min_interval, response.fetch_interval / 1000))
+
+    def run(self):
+        """
+        阻塞轮询，直到 stop() 或连续失败次数达到 max_retries
+        """
+        failures = 0
+        self._stopped.clear()
+        print("【√】开始轮询直播间消息.", file=status_file())
+        while not self._stopped.is_set():
+            try:
+                response = self.fetch_once()
+            except Exception as e:
+                failures += 1
+                print(f"【轮询失败】{e}", file=status_file())
+                # 换一个签名身份重试
+                identity = self.fetcher.identity
+                self.fetcher.signer_pool.record(identity, "fetch", False, 0.0, e)
+                self.fetcher.identity = self.fetcher.signer_pool.pick(exclude=(identity,))
+                if not self.fetcher.retry_on_failure or failures >= self.fetcher.max_retries:
+                    print("【终止】已达到最大重试次数或关闭重试功能。", file=status_file())
+                    break
+                self._stopped.wait(self.fetcher.retry_delay_seconds)
+                continue
+            failures = 0
+            self.fetcher._dispatchResponse(response)
+            self._stopped.wait(self.next_interval(response))
+        print("【轮询结束】", file=status_file())
+
+    def stop(self):
+        self._stopped.set()
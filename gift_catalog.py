@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    gift_catalog.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from console import status_file
+from protobuf.douyin import GiftMessage, GiftStruct
+
+# 每个礼物最多保留的名称 / 钻石数变化记录
+HISTORY_LIMIT = 20
+
+
+class _CachedGiftMessage(GiftMessage):
+    """
+    只在 GiftCatalog.parse_message 中使用：gift 字段 (GiftStruct) 交给礼物目录，原始字节与缓存相同时直接复用，
+    其余字段与 GiftMessage 完全相同，解析完成后实例的类型改回 GiftMessage
+    """
+
+    def _postprocess_single(self, wire_type, meta, field_name, value):
+        catalog = self.__dict__.get("_catalog")
+        if field_name != "gift" or catalog is None or not self.gift_id:
+            return super()._postprocess_single(wire_type, meta, field_name, value)
+        struct, self.__dict__["_gift_changed"] = catalog.resolve(self.gift_id, value)
+        return struct
+
+
+class GiftEntry:
+    __slots__ = ("gift_id", "name", "diamond_count", "struct", "raw", "first_seen", "last_seen", "history")
+
+    def __init__(self, gift_id, name="", diamond_count=0, first_seen=None, last_seen=None, history=None):
+        self.gift_id = gift_id
+        self.name = name
+        self.diamond_count = diamond_count
+        self.struct = None
+        self.raw = None
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.history = history or []  # [(时间, 名称, 钻石数)]，名称或价格变化时追加
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "diamond_count": self.diamond_count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "history": self.history,
+        }
+
+
+class GiftCatalog:
+    """
+    礼物目录：gift_id -> 名称 / 钻石数，由收到的礼物消息填充，保存在 path（json）中，重启后继续使用。
+    同一 gift_id 的 GiftStruct 原始字节不变时直接复用第一次解析的结果。
+    最多保留 max_gifts 个礼物，超出时淘汰最久未出现的礼物。
+    有变化时只标记，由后台线程每 save_interval 秒保存一次，close() 时再保存一次，不在消息处理线程中写文件。
+    """
+
+    def __init__(self, path=None, max_gifts=10000, save_interval=5):
+        self.path = path
+        self.max_gifts = max_gifts
+        self.save_interval = save_interval
+        self.decoded = 0
+        self.hits = 0
+        self.saves = 0
+        self._gifts = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if path and os.path.isfile(path):
+            try:
+                self.load(path)
+            except Exception as e:
+                print(f"【礼物目录加载失败】{e}", file=status_file())
+        if path and save_interval:
+            self._thread = threading.Thread(target=self._run, name="gift-catalog", daemon=True)
+            self._thread.start()
+
+    def parse_message(self, payload):
+        """
+        解析礼物消息，gift 字段按 gift_id 缓存
+        :return: (GiftMessage, 名称或钻石数是否有变化)
+        """
+        message = _CachedGiftMessage()
+        message.__dict__["_catalog"] = self
+        message.parse(payload)
+        del message.__dict__["_catalog"]
+        changed = message.__dict__.pop("_gift_changed", False)
+        if not message.gift_id and message.gift.id:
+            changed = self.observe(message.gift.id, message.gift)
+        # 字段与 GiftMessage 完全相同，订阅者拿到的就是 GiftMessage
+        message.__class__ = GiftMessage
+        return message, changed
+
+    def resolve(self, gift_id, raw):
+        """
+        :param raw: GiftMessage 中 gift 字段的原始字节
+        :return: (GiftStruct, 名称或钻石数是否有变化)
+        """
+        with self._lock:
+            entry = self._gifts.get(gift_id)
+            if entry is not None and entry.raw == raw:
+                self.hits += 1
+                entry.last_seen = time.time()
+                return entry.struct, False
+            if not raw:
+                return (entry.struct if entry is not None and entry.struct is not None else GiftStruct()), False
+        struct = GiftStruct().parse(raw)
+        self.decoded += 1
+        changed = self.observe(gift_id or struct.id, struct, raw)
+        return struct, changed
+
+    def observe(self, gift_id, struct, raw=None):
+        """
+        记录一次礼物信息
+        :return: 名称或钻石数是否有变化（首次出现也算变化）
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._gifts.get(gift_id)
+            if entry is None:
+                if len(self._gifts) >= self.max_gifts:
+                    oldest = min(self._gifts.values(), key=lambda e: e.last_seen or 0)
+                    del self._gifts[oldest.gift_id]
+                entry = self._gifts[gift_id] = GiftEntry(gift_id, first_seen=now)
+            entry.struct = struct
+            entry.raw = raw
+            entry.last_seen = now
+            changed = not entry.history or entry.name != struct.name or entry.diamond_count != struct.diamond_count
+            if changed:
+                entry.name = struct.name
+                entry.diamond_count = struct.diamond_count
+                entry.history.append((now, struct.name, struct.diamond_count))
+                del entry.history[:-HISTORY_LIMIT]
+                self._dirty = True
+        return changed
+
+    def get(self, gift_id):
+        return self._gifts.get(gift_id)
+
+    def name(self, gift_id, default=""):
+        entry = self._gifts.get(gift_id)
+        return entry.name if entry is not None else default
+
+    def __len__(self):
+        return len(self._gifts)
+
+    def save(self, path=None):
+        """
+        写入临时文件后替换，多个线程、进程同时保存时各自使用不同的临时文件
+        """
+        path = path or self.path
+        if not path:
+            return
+        with self._save_lock:
+            with self._lock:
+                data = {str(gift_id): entry.to_dict() for gift_id, entry in self._gifts.items()}
+                self._dirty = False
+            try:
+                fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                           dir=os.path.dirname(os.path.abspath(path)))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except Exception:
+                self._dirty = True
+                raise
+            self.saves += 1
+
+    def close(self):
+        """
+        停止后台保存线程，有未保存的变化时保存一次
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._dirty:
+            self.save()
+
+    def _run(self):
+        while not self._stopped.wait(self.save_interval):
+            if not self._dirty:
+                continue
+            try:
+                self.save()
+            except Exception as e:
+                print(f"【礼物目录保存失败】{e}", file=status_file())
+
+    def load(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            for gift_id, item in data.items():
+                self._gifts[int(gift_id)] = GiftEntry(
+                    int(gift_id),
+                    name=item.get("name", ""),
+                    diamond_count=item.get("diamond_count", 0),
+                    first_seen=item.get("first_seen"),
+                    last_seen=item.get("last_seen"),
+                    history=[tuple(h) for h in item.get("history", [])],
+                )
+
+    def stats(self):
+        return {"gifts": len(self._gifts), "decoded": self.decoded, "hits": self.hits, "saves": self.saves}
+
+
+class NameDictionary:
+    """
+    id -> 名称的字典编码：日志行只写 id，名称首次出现或变化时单独记录一次。
+    只保留最近 max_size 个 id，被淘汰的 id 再次出现时重新记录，不影响正确性。
+    """
+
+    def __init__(self, max_size=200000):
+        self.max_size = max_size
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+
+    def changed(self, key, name):
+        """
+        :return: 该 id 的名称是否需要（重新）记录
+        """
+        with self._lock:
+            previous = self._names.get(key)
+            if previous is not None:
+                self._names.move_to_end(key)
+                if previous == name:
+                    return False
+            self._names[key] = name
+            if len(self._names) > self.max_size:
+                self._names.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self._names)
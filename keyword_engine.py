@@ -0,0 +1,294 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    keyword_engine.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import threading
+import time
+import unicodedata
+from collections import deque, namedtuple
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+from console import status_file
+
+# 命中的关键词，start / end 为在原始弹幕内容中的位置（content[start:end]）
+KeywordHit = namedtuple("KeywordHit", "keyword category start end")
+
+
+class KeywordMatch:
+    """
+    一条弹幕的关键词命中，作为 "KeywordMatch" 事件发布，可用 room.on("KeywordMatch", func) 订阅
+    """
+    __slots__ = ("room_id", "user", "content", "hits", "ts")
+
+    def __init__(self, room_id, user, content, hits):
+        self.room_id = room_id
+        self.user = user
+        self.content = content
+        self.hits = hits
+        self.ts = time.time()
+
+    @property
+    def categories(self):
+        return sorted({hit.category for hit in self.hits})
+
+
+class Normalizer:
+    """
+    逐字符归一化：全角转半角并统一大小写（NFKC），可选去掉空格和标点、汉字转拼音（同音字）。
+    每个字符归一化为若干个匹配单位：普通字符每个字一个单位，汉字转拼音时整个音节是一个单位，
+    关键词只能在音节边界上开始和结束（"爱" ai 不会命中 "白" bai）。
+    关键词和弹幕使用同一套规则，每个字符的结果只计算一次
+    """
+
+    def __init__(self, fullwidth=True, ignore_symbols=True, pinyin=False):
+        if pinyin and lazy_pinyin is None:
+            print("【关键词】未安装 pypinyin，不启用拼音匹配", file=status_file())
+            pinyin = False
+        self.fullwidth = fullwidth
+        self.ignore_symbols = ignore_symbols
+        self.pinyin = pinyin
+        self._cache = {}
+
+    def fold(self, ch):
+        """
+        :return: 单个字符归一化后的匹配单位 tuple，可能为空（被忽略）或多个（"㎏" -> ("k", "g")），
+                 汉字转拼音时为一个音节 ("bai",)
+        """
+        tokens = self._cache.get(ch)
+        if tokens is not None:
+            return tokens
+        folded = unicodedata.normalize("NFKC", ch).lower() if self.fullwidth else ch
+        if self.ignore_symbols:
+            folded = "".join(c for c in folded if unicodedata.category(c)[0] not in "PZSC")
+        if self.pinyin and folded and "一" <= folded[0] <= "鿿":
+            # 多音字只取第一个读音
+            tokens = tuple(lazy_pinyin(folded))
+        else:
+            tokens = tuple(folded)
+        self._cache[ch] = tokens
+        return tokens
+
+    def tokens(self, text):
+        return [token for ch in text for token in self.fold(ch)]
+
+    def normalize(self, text):
+        return "".join(self.tokens(text))
+
+
+class Automaton:
+    """
+    Aho-Corasick 自动机：匹配耗时只与弹幕长度和命中数有关，与关键词数量无关
+    """
+
+    def __init__(self, keywords, normalizer):
+        """
+        :param keywords: [(关键词, 类别)]
+        """
+        self.normalizer = normalizer
+        goto = [{}]
+        outputs = [()]
+        count = 0
+        for keyword, category in keywords:
+            pattern = normalizer.tokens(keyword)
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    outputs.append(())
+                state = nxt
+            outputs[state] += ((keyword, category, len(pattern)),)
+            count += 1
+
+        # 按层次遍历求失败指针，并把失败链上的输出合并到每个状态，匹配时不需要再沿失败链找输出
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                outputs[nxt] += outputs[fail[nxt]]
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+        self.keywords = count
+
+    def search(self, text):
+        """
+        :return: [KeywordHit]，按结束位置排序，重叠的关键词都会返回
+        """
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        fold = self.normalizer.fold
+        origin = []  # 归一化后每个匹配单位对应的原始位置
+        hits = []
+        state = 0
+        for i, raw in enumerate(text):
+            for ch in fold(raw):
+                origin.append(i)
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+                if outputs[state]:
+                    end = len(origin)
+                    for keyword, category, length in outputs[state]:
+                        hits.append(KeywordHit(keyword, category, origin[end - length], i + 1))
+        return hits
+
+
+def load_keyword_file(path, category):
+    """
+    每行一个关键词，# 开头为注释
+    """
+    keywords = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                keywords.append((line, category))
+    return keywords
+
+
+class KeywordEngine:
+    """
+    弹幕关键词匹配。关键词文件修改后由后台线程重新编译自动机，编译完成后整体替换，
+    匹配线程只读取当前的自动机，替换过程中不加锁、不会看到编译了一半的结果
+    """
+
+    def __init__(self, lists, fullwidth=True, ignore_symbols=True, pinyin=False, reload_interval=5):
+        """
+        :param lists: {类别: 关键词文件路径}，例如 {"banned": "keywords/banned.txt"}
+        :param reload_interval: 检查关键词文件修改时间的间隔（秒），0 为不自动重新加载
+        """
+        self.lists = dict(lists)
+        self.normalizer = Normalizer(fullwidth, ignore_symbols, pinyin)
+        self.reload_interval = reload_interval
+        self._mtimes = {}
+        self._automaton = None
+        self._reload_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # 统计
+        self.messages = 0
+        self.matched = 0
+        self.reloads = 0
+        self.compile_ms = 0.0
+        self.last_error = None
+        self.reload()
+
+    def match(self, text):
+        """
+        :return: [KeywordHit]，没有命中时为空列表
+        """
+        self.messages += 1
+        hits = self._automaton.search(text) if text else []
+        if hits:
+            self.matched += 1
+        return hits
+
+    def reload(self):
+        """
+        重新读取全部关键词文件并编译，返回是否替换了自动机；读取失败时保留当前的自动机
+        """
+        with self._reload_lock:
+            mtimes = {}
+            keywords = []
+            try:
+                for category, path in self.lists.items():
+                    mtimes[path] = os.path.getmtime(path) if os.path.exists(path) else None
+                    if mtimes[path] is None:
+                        if path not in self._mtimes:
+                            print(f"【关键词】关键词文件不存在: {path}", file=status_file())
+                        continue
+                    keywords.extend(load_keyword_file(path, category))
+                started = time.perf_counter()
+                automaton = Automaton(keywords, self.normalizer)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"【关键词】加载失败，继续使用之前的关键词: {e}", file=status_file())
+                if self._automaton is None:
+                    self._automaton = Automaton([], self.normalizer)
+                return False
+            self.compile_ms = round((time.perf_counter() - started) * 1000, 1)
+            replaced = self._automaton is not None
+            self._automaton = automaton
+            self._mtimes = mtimes
+            if replaced:
+                self.reloads += 1
+                print(f"【关键词】已重新加载 {automaton.keywords} 个关键词，编译耗时 {self.compile_ms} ms", file=status_file())
+            return True
+
+    def changed(self):
+        """
+        关键词文件是否有增删改
+        """
+        for path in self.lists.values():
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if mtime != self._mtimes.get(path):
+                return True
+        return False
+
+    def start(self):
+        """
+        启动后台线程，每 reload_interval 秒检查一次关键词文件
+        """
+        if self._thread is not None or not self.reload_interval:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="keyword-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        automaton = self._automaton
+        return {
+            "keywords": automaton.keywords,
+            "states": len(automaton.goto),
+            "compile_ms": self.compile_ms,
+            "reloads": self.reloads,
+            "messages": self.messages,
+            "matched": self.matched,
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        while not self._stopped.wait(self.reload_interval):
+            try:
+                if self.changed():
+                    self.reload()
+            except OSError as e:
+                self.last_error = str(e)
+
+
+def create_keyword_engine(cfg):
+    """
+    根据配置中的 keywords 部分创建关键词匹配
+    """
+    return KeywordEngine(
+        cfg.get("lists", {}),
+        fullwidth=cfg.get("fullwidth", True),
+        ignore_symbols=cfg.get("ignore_symbols", True),
+        pinyin=cfg.get("pinyin", False),
+        reload_interval=cfg.get("reload_interval_seconds", 5),
+    )
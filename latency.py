@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    latency.py
+# @Project:     douyinLiveWebFetcher
+
+import threading
+import time
+from collections import deque
+
+# 对数-线性分桶：每个 2 的幂区间分成 32 个子桶，相对误差约 3%，桶数固定
+SUB_BITS = 6
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+MAX_SHIFT = 40  # 约 2^46 微秒，远超任何合理延迟
+BUCKETS = SUB_COUNT + MAX_SHIFT * HALF_COUNT
+
+STAGES = ("server", "network", "processing", "total")
+
+
+def _index(value):
+    if value < SUB_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BITS
+    if shift > MAX_SHIFT:
+        return BUCKETS - 1
+    return SUB_COUNT + (shift - 1) * HALF_COUNT + (value >> shift) - HALF_COUNT
+
+
+def _value(index):
+    """
+    桶的代表值（区间中点）
+    """
+    if index < SUB_COUNT:
+        return index
+    shift = (index - SUB_COUNT) // HALF_COUNT + 1
+    mantissa = (index - SUB_COUNT) % HALF_COUNT + HALF_COUNT
+    return (mantissa << shift) + (1 << (shift - 1))
+
+
+class LatencyHistogram:
+    """
+    HDR 风格的流式直方图，记录微秒值，内存固定为 BUCKETS 个计数
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_us):
+        value = int(value_us)
+        if value < 0:
+            value = 0
+        self.counts[_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        target = max(1, int(self.count * q / 100 + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= target:
+                    return min(_value(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        """
+        :return: 毫秒为单位的 count / p50 / p99 / max / mean
+        """
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "p50": round(self.percentile(50) / 1000, 1),
+            "p99": round(self.percentile(99) / 1000, 1),
+            "max": round(self.max / 1000, 1),
+            "mean": round(self.total / self.count / 1000, 1),
+        }
+
+
+class LatencyTracker:
+    """
+    按消息类型统计各阶段延迟：
+        server      Response.now - Common.create_time  抖音服务端从生成到推送
+        network     本地接收 - Response.now - 时钟基线   网络与接收排队（基线为窗口内最小差值，抵消时钟偏差）
+        processing  处理完成 - 本地接收                  本地解析与处理（含同一帧内排在前面的消息）
+        total       以上之和
+    """
+
+    def __init__(self, baseline_seconds=300):
+        self.baseline_seconds = baseline_seconds
+        self.histograms = {}  # 消息类型 -> {阶段: LatencyHistogram}
+        self._offsets = deque()  # (本地时间, 本地接收 - Response.now)，单调递增
+        self._network_us = 0
+        self._push_ms = 0
+        self._lock = threading.Lock()
+
+    def observe_response(self, server_now_ms, received):
+        """
+        每个 Response 调用一次，received 为本地接收时间（time.time()）
+        """
+        self._push_ms = server_now_ms
+        if not server_now_ms:
+            self._network_us = 0
+            return
+        offset = received * 1000 - server_now_ms
+        offsets = self._offsets
+        while offsets and offsets[-1][1] >= offset:
+            offsets.pop()
+        offsets.append((received, offset))
+        while received - offsets[0][0] > self.baseline_seconds:
+            offsets.popleft()
+        self._network_us = (offset - offsets[0][1]) * 1000
+
+    def observe_message(self, method, message, received, done=None):
+        done = time.time() if done is None else done
+        processing = (done - received) * 1e6
+        create_ms = message.common.create_time if hasattr(message, "common") else 0
+        with self._lock:
+            stages = self.histograms.get(method)
+            if stages is None:
+                stages = self.histograms[method] = {stage: LatencyHistogram() for stage in STAGES}
+            stages["processing"].record(processing)
+            if self._push_ms:
+                stages["network"].record(self._network_us)
+                if create_ms and create_ms <= self._push_ms:
+                    server = (self._push_ms - create_ms) * 1000
+                    stages["server"].record(server)
+                    stages["total"].record(server + self._network_us + processing)
+
+    def stats(self):
+        """
+        :return: {消息类型: {阶段: {count, p50, p99, max, mean}}}，另有 "*" 为全部类型合计
+        """
+        with self._lock:
+            result = {}
+            merged = {stage: LatencyHistogram() for stage in STAGES}
+            for method, stages in self.histograms.items():
+                result[method] = {stage: h.summary() for stage, h in stages.items()}
+                for stage, h in stages.items():
+                    merged[stage].merge(h)
+            result["*"] = {stage: h.summary() for stage, h in merged.items()}
+            return result
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def format(self):
+        """
+        :return: 每个消息类型一行的 p50/p99/max（毫秒）
+        """
+        lines = []
+        for method, stages in self.stats().items():
+            parts = []
+            for stage in STAGES:
+                s = stages[stage]
+                if s["count"]:
+                    parts.append(f"{stage} {s['p50']}/{s['p99']}/{s['max']}")
+            if parts:
+                lines.append(f"{method}: " + ", ".join(parts))
+        return "\n".join(lines)
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    like_coalescer.py
+# @Project:     douyinLiveWebFetcher
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from console import status_file
+
+LikeUser = namedtuple("LikeUser", "id nick_name")
+
+
+class LikeSummary:
+    """
+    一个窗口内某个用户的点赞汇总，属性与 LikeMessage 对齐（user / count / total），可以直接套用点赞的输出模板
+    """
+    __slots__ = ("room_id", "user", "count", "messages", "total", "first_ts", "last_ts")
+
+    def __init__(self, room_id, user_id, user_name, ts):
+        self.room_id = room_id
+        self.user = LikeUser(user_id, user_name)
+        self.count = 0
+        self.messages = 0
+        self.total = 0
+        self.first_ts = ts
+        self.last_ts = ts
+
+
+class RoomLikeTotals:
+    """
+    直播间维度的点赞汇总，用 LikeMessage.total（服务端累计点赞数）校正本地计数
+    """
+    __slots__ = ("room_id", "window_count", "observed", "server_total", "last_server_total", "unobserved")
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.window_count = 0  # 本窗口内收到的点赞数
+        self.observed = 0  # 累计收到的点赞数
+        self.server_total = 0  # 服务端最新累计点赞数
+        self.last_server_total = 0  # 上一个窗口结束时的服务端累计点赞数
+        self.unobserved = 0  # 本窗口服务端增长但本地没有收到的点赞数（被服务端合并或本地降载丢弃）
+
+
+class LikeCoalescer:
+    """
+    点赞合并：按用户在 window_seconds 内累加点赞数，每个用户每个窗口只输出一条汇总。
+    用户表超过 max_users 时按最久未更新淘汰，被淘汰的用户立即输出，不会丢失计数。
+    """
+
+    def __init__(self, on_user, on_room=None, window_seconds=10, max_users=10000):
+        """
+        :param on_user: 回调(LikeSummary)，每个用户每个窗口一次
+        :param on_room: 回调(RoomLikeTotals)，每个直播间每个窗口一次
+        """
+        self.on_user = on_user
+        self.on_room = on_room
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        self.messages_in = 0
+        self.summaries_out = 0
+        self.evicted = 0
+        self._users = OrderedDict()  # (room_id, user_id) -> LikeSummary
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, room_id, user_id, user_name, count, total):
+        now = time.time()
+        evicted = None
+        with self._lock:
+            self.messages_in += 1
+            key = (room_id, user_id)
+            summary = self._users.get(key)
+            if summary is None:
+                summary = self._users[key] = LikeSummary(room_id, user_id, user_name, now)
+                if len(self._users) > self.max_users:
+                    _, evicted = self._users.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._users.move_to_end(key)
+            summary.count += count
+            summary.messages += 1
+            summary.last_ts = now
+            if total > summary.total:
+                summary.total = total
+
+            room = self._rooms.get(room_id)
+            if room is None:
+                room = self._rooms[room_id] = RoomLikeTotals(room_id)
+                room.last_server_total = max(0, total - count)
+            room.window_count += count
+            room.observed += count
+            if total > room.server_total:
+                room.server_total = total
+        if evicted is not None:
+            self._emit_user(evicted)
+
+    def flush(self):
+        """
+        输出当前窗口内的所有汇总
+        """
+        with self._lock:
+            users, self._users = self._users, OrderedDict()
+            rooms = []
+            for room in self._rooms.values():
+                if not room.window_count and room.server_total == room.last_server_total:
+                    continue
+                growth = room.server_total - room.last_server_total
+                room.unobserved = max(0, growth - room.window_count)
+                rooms.append((room.room_id, room.window_count, room.server_total, room.unobserved, room.observed))
+                room.last_server_total = room.server_total
+                room.window_count = 0
+        for summary in users.values():
+            self._emit_user(summary)
+        if self.on_room is not None:
+            for room_id, window_count, server_total, unobserved, observed in rooms:
+                snapshot = RoomLikeTotals(room_id)
+                snapshot.window_count = window_count
+                snapshot.server_total = server_total
+                snapshot.unobserved = unobserved
+                snapshot.observed = observed
+                self.on_room(snapshot)
+
+    def start(self):
+        """
+        启动后台线程，每 window_seconds 输出一次
+        """
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="like-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        return {
+            "messages_in": self.messages_in,
+            "summaries_out": self.summaries_out,
+            "reduction": round(self.messages_in / self.summaries_out, 1) if self.summaries_out else None,
+            "tracked_users": len(self._users),
+            "evicted": self.evicted,
+        }
+
+    def _emit_user(self, summary):
+        self.summaries_out += 1
+        try:
+            self.on_user(summary)
+        except Exception as e:
+            print(f"【点赞合并】输出失败: {e}", file=status_file())
+
+    def _run(self):
+        while not self._stopped.wait(self.window_seconds):
+            self.flush()
@@ -11,8 +11,11 @@ import gzip
 import hashlib
 import random
 import re
+import signal
+import socket
 import string
 import subprocess
+import sys
 import threading
 import time
 import execjs
@@ -20,17 +23,38 @@ import urllib.parse
 from contextlib import contextmanager
 from unittest.mock import patch
 
-import requests
 import websocket
 from py_mini_racer import MiniRacer
 
 from ac_signature import get__ac_signature
+from console import status_file
+from event_bus import EventBus
+from event_schema import normalize
+from fanout import create_publisher
+from broadcast_server import create_broadcast_server
+from ndjson_output import create_writer
+from state_tracker import StateTracker, format_changes
+from checkpoint import create_checkpointer
+from keyword_engine import KeywordEngine, KeywordMatch, create_keyword_engine
+from near_duplicate import create_detector
+from signer_pool import create_signer_pool
+from sampling_profiler import SamplingProfiler
+from fetch_transport import FetchPoller
+from gift_catalog import GiftCatalog, NameDictionary
+from templates import compile_templates
+from load_shedder import LoadShedder
+from latency import LatencyTracker
+from like_coalescer import LikeCoalescer
+from log_rotation import LogRotator
+from shm_ring import DecoderPool
+from stall_watchdog import StallWatchdog
+from sqlite_sink import SQLiteSink
+from viewer_store import ViewerStore
 from protobuf.douyin import *
 
 from urllib3.util.url import parse_url
 
 from datetime import datetime
-import csv
 import os
 import yaml
 
@@ -60,9 +84,62 @@ def execute_js(js_file: str):
     ctx = execjs.compile(js_code)
     return ctx
 
-from collections import defaultdict
 
-diamond_totals = defaultdict(lambda: {"name": "", "diamonds": 0})
+# 同一进程内的多个直播间共用同一日志目录下的分段管理与时序存储
+# key -> [资源, 使用者数, 已 start() 的使用者数]
+_shared_resources = {}
+_shared_lock = threading.Lock()
+
+
+def shared_resource(key, factory):
+    with _shared_lock:
+        entry = _shared_resources.get(key)
+        if entry is None:
+            entry = _shared_resources[key] = [factory(), 0, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def start_shared(key, start):
+    """
+    共用的后台服务（观众人数时序、关键词重新加载）：第一个 start() 的直播间调用 start(资源)
+    """
+    with _shared_lock:
+        entry = _shared_resources[key]
+        entry[2] += 1
+        if entry[2] == 1:
+            start(entry[0])
+
+
+def stop_shared(key, stop):
+    """
+    最后一个 stop() 的直播间调用 stop(资源)，其它直播间仍在运行时不关闭
+    """
+    with _shared_lock:
+        entry = _shared_resources[key]
+        entry[2] -= 1
+        if entry[2] == 0:
+            stop(entry[0])
+
+
+def release_resource(key, close=None):
+    """
+    使用者减一，最后一个使用者释放时移出缓存并调用 close(资源)
+    """
+    with _shared_lock:
+        entry = _shared_resources.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _shared_resources[key]
+    if close is not None:
+        close(entry[0])
+
+# 同一时间只运行一个采样分析
+_profile_lock = threading.Lock()
+
 
 
 @contextmanager
@@ -103,7 +180,7 @@ def generateSignature(wss, script_file='sign.js'):
         signature = ctx.call("get_sign", md5_param)
         return signature
     except Exception as e:
-        print(e)
+        print(e, file=status_file())
     
     # 以下代码对应js脚本为sign_v0.js
     # context = execjs.compile(script)
@@ -126,121 +203,159 @@ def generateMsToken(length=182):
     return random_str
 
 
-class DouyinLiveWebFetcher:
+# 各 CSV 日志的表头，行由 DouyinLiveWebFetcher._compileCsvRows 生成
+CSV_HEADERS = {
+    "chat_log": ["timestamp", "user_id", "user_name", "fans_club", "pay_grade", "content"],
+    "gift_log": ["timestamp", "user_name", "gift_name", "gift_count", "gift_value", "fans_club", "pay_grade",
+                 "user_id", "gift_id"],
+    "like_log": ["timestamp", "user_id", "user_name", "count", "total"],
+    "member_log": ["timestamp", "user_id", "user_name", "gender"],
+}
 
-    def load_message_handlers(self, config_path="message_handlers.yml"):
-        try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                self.handler_config = yaml.safe_load(f)
-            return {
-                msg_type: getattr(self, cfg["handler"])
-                for msg_type, cfg in self.handler_config.items()
-                if isinstance(cfg, dict) and cfg.get("enabled", False)
-            }
-        except Exception as e:
-            print(f"【配置加载失败】{e}")
-            self.handler_config = {}
-            return {}
+# 多进程解码时在解码进程中产生的统计
+DECODER_STATS = ("latency", "load_shedding", "events", "output", "state", "checkpoint", "keywords", "near_duplicate",
+                 "sqlite")
 
-    def __init__(self, live_id, abogus_file='a_bogus.js', config_path="message_handlers.yml"):
+
+class DouyinRoomClient:
+    """
+    直播间页面与接口请求：签名身份、ttwid / room_id 获取、a_bogus 等签名与开播状态查询。
+    只需要查询开播状态时（例如 room_scheduler 批量监控未开播的直播间）单独使用，不创建消息处理、日志等资源
+    """
+
+    def __init__(self, live_id, abogus_file='a_bogus.js', config_path="message_handlers.yml", room_id=None):
+        """
+        :param room_id: 已知 room_id 时直接传入，不再请求直播间页面
+        """
         self.abogus_file = abogus_file
-        self.__ttwid = None
-        self.__room_id = None
-        self.session = requests.Session()
+        self._abogus_ctx = None  # a_bogus.js 编译后的上下文，轮询时每次请求都要签名，只编译一次
+        self._room_id = room_id
         self.live_id = live_id
-        self.host = "https://www.douyin.com/"
-        self.live_url = "https://live.douyin.com/"
-        self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0"
-        self.headers = {
-            'User-Agent': self.user_agent
-        }
+        # 同一进程内共用的资源：名称 -> (key, 关闭函数)
+        self._sharedKeys = {}
+        self._closed = False
+        # 请求预算：room_id 与开播状态的每次请求前调用，返回 False 时放弃请求（见 room_scheduler.TokenBucket）
+        self.request_budget = None
         # 加载配置
+        self.config_path = config_path
         with open(config_path, "r", encoding="utf-8") as f:
             self.handler_config = yaml.safe_load(f)
-        self.total_diamonds = 0
 
-        # 运行时设置
-        self.heartbeat_interval = self.handler_config.get("heartbeat_interval", 5)
-        self.retry_on_failure = self.handler_config.get("retry_on_failure", True)
-        self.max_retries = self.handler_config.get("max_retries", 3)
-        self.retry_delay_seconds = self.handler_config.get("retry_delay_seconds", 10)
+        # 接口地址，压测时可指向本地 mock_server.py
+        endpoints = self.handler_config.get("endpoints", {})
+        self.host = endpoints.get("host", "https://www.douyin.com/")
+        self.live_url = endpoints.get("live_url", "https://live.douyin.com/")
+        self.wss_url = endpoints.get("wss_url", "wss://webcast100-ws-web-lq.douyin.com/webcast/im/push/v2/")
 
-        self.logging_cfg = self.handler_config.get("logging", {})
-        self.log_folder = self.logging_cfg.get("folder", "logs")
-        self.log_format = self.logging_cfg.get("format", "csv")
-        self.rotate_daily = self.logging_cfg.get("rotate_daily", True)
-        self.include_timestamp = self.logging_cfg.get("include_timestamp", True)
+        # 签名身份池：UA、设备 id、cookie 按身份区分，同一进程内的直播间共用
+        self.signer_cfg = self.handler_config.get("signer_pool", {})
+        self.signer_pool = self._sharedResource("signer_pool", ("signer_pool", os.path.abspath(config_path)),
+                                                lambda: create_signer_pool(self.signer_cfg))
+        self.identity = self.signer_pool.pick()
 
-        os.makedirs(self.log_folder, exist_ok=True)
+    def close(self):
+        """
+        释放登记的共用资源，同一进程内最后一个使用者释放时关闭
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for key, close in self._sharedKeys.values():
+            release_resource(key, close)
+        self._sharedKeys = {}
 
+    def _sharedResource(self, name, key, factory, close=None):
+        """
+        获取同一进程内共用的资源并登记，close() 时释放，最后一个直播间释放时调用 close(资源)
+        """
+        self._sharedKeys[name] = (key, close)
+        return shared_resource(key, factory)
+
+    def _acquireBudget(self):
+        if self.request_budget is not None and not self.request_budget():
+            raise RuntimeError("请求预算已停止")
+
+    @property
+    def session(self):
+        return self.identity.session
+
+    @property
+    def user_agent(self):
+        return self.identity.user_agent
+
+    @property
+    def headers(self):
+        return {'User-Agent': self.identity.user_agent}
 
-            
-    def start(self):
-        self._connectWebSocket()
-    
-    def stop(self):
-        self.ws.close()
-    
     @property
     def ttwid(self):
         """
         产生请求头部cookie中的ttwid字段，访问抖音网页版直播间首页可以获取到响应cookie中的ttwid
-        :return: ttwid
+        :return: ttwid，按身份分别缓存
         """
-        if self.__ttwid:
-            return self.__ttwid
+        identity = self.identity
+        if identity.ttwid:
+            return identity.ttwid
         headers = {
-            "User-Agent": self.user_agent,
+            "User-Agent": identity.user_agent,
         }
         try:
-            response = self.session.get(self.live_url, headers=headers)
+            response = identity.session.get(self.live_url, headers=headers)
             response.raise_for_status()
         except Exception as err:
-            print("【X】Request the live url error: ", err)
+            print("【X】Request the live url error: ", err, file=status_file())
         else:
-            self.__ttwid = response.cookies.get('ttwid')
-            return self.__ttwid
+            identity.ttwid = response.cookies.get('ttwid')
+            return identity.ttwid
     
     @property
     def room_id(self):
         """
-        根据直播间的地址获取到真正的直播间roomId，有时会有错误，可以重试请求解决
+        根据直播间的地址获取到真正的直播间roomId，有时会有错误，失败时换一个签名身份重试
         :return: room_id
         """
-        if self.__room_id:
-            return self.__room_id
+        if self._room_id:
+            return self._room_id
         url = self.live_url + self.live_id
-        headers = {
-            "User-Agent": self.user_agent,
-            "cookie": f"ttwid={self.ttwid}&msToken={generateMsToken()}; __ac_nonce=0123407cc00a9e438deb4",
-        }
-        try:
-            response = self.session.get(url, headers=headers)
+
+        def fetch(identity):
+            self._acquireBudget()
+            self.identity = identity
+            headers = {
+                "User-Agent": identity.user_agent,
+                "cookie": f"ttwid={self.ttwid}&msToken={generateMsToken()}; "
+                          f"__ac_nonce={identity.ac_nonce or self.get_ac_nonce()}",
+            }
+            response = identity.session.get(url, headers=headers)
             response.raise_for_status()
+            match = re.search(r'roomId\\":\\"(\d+)\\"', response.text)
+            if match is None:
+                raise ValueError("No match found for roomId")
+            return match.group(1)
+
+        try:
+            self._room_id, _ = self.signer_pool.call("room_id", fetch, self.signer_cfg.get("attempts", 3),
+                                                      identity=self.identity)
         except Exception as err:
-            print("【X】Request the live room url error: ", err)
+            print("【X】Request the live room url error: ", err, file=status_file())
         else:
-            match = re.search(r'roomId\\":\\"(\d+)\\"', response.text)
-            if match is None or len(match.groups()) < 1:
-                print("【X】No match found for roomId")
-            
-            self.__room_id = match.group(1)
-            
-            return self.__room_id
+            return self._room_id
 
     
     def get_ac_nonce(self):
         """
-        获取 __ac_nonce
+        获取 __ac_nonce，按身份缓存
         """
         resp_cookies = self.session.get(self.host, headers=self.headers).cookies
-        return resp_cookies.get("__ac_nonce")
+        self.identity.ac_nonce = resp_cookies.get("__ac_nonce")
+        return self.identity.ac_nonce
     
     def get_ac_signature(self, __ac_nonce: str = None) -> str:
         """
         获取 __ac_signature
         """
-        __ac_signature = get__ac_signature(self.host[8:], __ac_nonce, self.user_agent)
+        __ac_signature = self.signer_pool.sign(self.identity, "ac_signature.py", get__ac_signature,
+                                               self.host[8:], __ac_nonce, self.user_agent)
         self.session.cookies.set("__ac_signature", __ac_signature)
         return __ac_signature
     
@@ -249,71 +364,551 @@ class DouyinLiveWebFetcher:
         获取 a_bogus
         """
         url = urllib.parse.urlencode(url_params)
-        ctx = execute_js(self.abogus_file)
-        _a_bogus = ctx.call("get_ab", url, self.user_agent)
-        return _a_bogus
+
+        def sign(url, user_agent):
+            if self._abogus_ctx is None:
+                self._abogus_ctx = execute_js(self.abogus_file)
+            return self._abogus_ctx.call("get_ab", url, user_agent)
+        return self.signer_pool.sign(self.identity, "a_bogus.js", sign, url, self.user_agent)
     
     def get_room_status(self):
         """
         获取直播间开播状态:
         room_status: 2 直播已结束
         room_status: 0 直播进行中
+        a_bogus 等签名成功率不是 100%，接口未返回数据时换一个签名身份重试
+        :return: room_status，获取失败时为 None
+        """
+        def enter(identity):
+            self._acquireBudget()
+            self.identity = identity
+            msToken = generateMsToken()
+            nonce = self.get_ac_nonce()
+            signature = self.get_ac_signature(nonce)
+            url = (f'{self.live_url}webcast/room/web/enter/?aid=6383'
+                   '&app_name=douyin_web&live_id=1&device_platform=web&language=zh-CN&enter_from=page_refresh'
+                   '&cookie_enabled=true&screen_width=5120&screen_height=1440&browser_language=zh-CN&browser_platform=Win32'
+                   f'&browser_name={identity.browser_name}&browser_version={identity.chrome_version}'
+                   f'&web_rid={self.live_id}'
+                   f'&room_id_str={self.room_id}'
+                   '&enter_source=&is_need_double_stream=false&insert_task_id=&live_reason=&msToken=' + msToken)
+            query = parse_url(url).query
+            params = {i[0]: i[1] for i in [j.split('=') for j in query.split('&')]}
+            a_bogus = self.get_a_bogus(params)
+            url += f"&a_bogus={a_bogus}"
+            headers = self.headers.copy()
+            headers.update({
+                'Referer': f'{self.live_url}{self.live_id}',
+                'Cookie': f'ttwid={self.ttwid};__ac_nonce={nonce}; __ac_signature={signature}',
+            })
+            resp = self.session.get(url, headers=headers)
+            data = resp.json().get('data')
+            if not data:
+                raise ValueError(f"enter 接口未返回数据: {resp.status_code} {resp.text[:100]}")
+            return data
+
+        try:
+            data, _ = self.signer_pool.call("room_status", enter, self.signer_cfg.get("attempts", 3),
+                                            identity=self.identity)
+        except Exception as e:
+            print(f"【X】获取直播间状态失败: {e}", file=status_file())
+            return None
+        room_status = data.get('room_status')
+        user = data.get('user')
+        user_id = user.get('id_str')
+        nickname = user.get('nickname')
+
+        self.streamer_name = nickname  
+
+        print(f"【{nickname}】[{user_id}]直播间：{['正在直播', '已结束'][bool(room_status)]}.", file=status_file())
+        return room_status
+
+
+class DouyinLiveWebFetcher(DouyinRoomClient):
+
+    def load_message_handlers(self, config_path="message_handlers.yml"):
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                self.handler_config = yaml.safe_load(f)
+            # 运行时修改的配置（update_handlers）在重新加载后继续生效
+            for msg_type, overrides in self.handler_overrides.items():
+                cfg = self.handler_config.get(msg_type)
+                if isinstance(cfg, dict):
+                    cfg.update(overrides)
+                else:
+                    self.handler_config[msg_type] = dict(overrides)
+            handlers = {
+                msg_type: getattr(self, cfg["handler"])
+                for msg_type, cfg in self.handler_config.items()
+                if isinstance(cfg, dict) and cfg.get("enabled", False) and "handler" in cfg
+            }
+            # 输出模板只在加载配置时编译一次
+            self.formatters = compile_templates(self.handler_config, {
+                "total_pv": lambda m: parse_chinese_number(m.total_pv_for_anchor),
+            })
+            # CSV 行函数同样在加载配置时生成，处理消息时不再读取 log_to_csv / show_* 开关
+            self.csv_rows = self._compileCsvRows(self.handler_config)
+            self.track_total_diamonds = self.handler_config.get("WebcastGiftMessage", {}).get(
+                "track_total_diamonds", False)
+            return handlers
+        except Exception as e:
+            print(f"【配置加载失败】{e}", file=status_file())
+            self.handler_config = {}
+            self.formatters = {}
+            self.csv_rows = {}
+            self.track_total_diamonds = False
+            return {}
+
+    def _compileCsvRows(self, handler_config):
+        """
+        为开启 log_to_csv 的消息类型生成 CSV 行函数，show_* 开关在这里确定
+        :return: {消息类型: 函数(message) -> 行}，表头见 CSV_HEADERS
+        """
+        def enabled(msg_type):
+            cfg = handler_config.get(msg_type)
+            return cfg if isinstance(cfg, dict) and cfg.get("log_to_csv", False) else None
+
+        rows = {}
+        cfg = enabled("WebcastChatMessage")
+        if cfg is not None:
+            show_user_id = cfg.get("show_user_id", True)
+            show_fans_club = cfg.get("show_fans_club", True)
+            show_pay_grade = cfg.get("show_pay_grade", True)
+
+            def chat_row(message):
+                user = message.user
+                return [
+                    self._timestamp(),
+                    user.id if show_user_id else "",
+                    self._userRef(user.id, user.nick_name) if show_user_id else user.nick_name,
+                    user.fans_club.data.level if show_fans_club and user.fans_club and user.fans_club.data else "",
+                    user.pay_grade.level if show_pay_grade and user.pay_grade else "",
+                    message.content
+                ]
+            rows["WebcastChatMessage"] = chat_row
+
+        cfg = enabled("WebcastGiftMessage")
+        if cfg is not None:
+            show_gift_value = cfg.get("show_gift_value", True)
+
+            def gift_row(message):
+                user = message.user
+                return [
+                    self._timestamp(),
+                    self._userRef(user.id, user.nick_name),
+                    "" if self.dictionary_encoding else message.gift.name,
+                    message.combo_count,
+                    message.gift.diamond_count * message.combo_count if show_gift_value else "",
+                    user.fans_club.data.level if user.fans_club and user.fans_club.data else None,
+                    user.pay_grade.level if user.pay_grade else None,
+                    user.id,
+                    message.gift_id
+                ]
+            rows["WebcastGiftMessage"] = gift_row
+
+        if enabled("WebcastLikeMessage") is not None:
+            def like_row(like):
+                return [
+                    self._timestamp(),
+                    like.user.id,
+                    self._userRef(like.user.id, like.user.nick_name),
+                    like.count,
+                    like.total
+                ]
+            rows["WebcastLikeMessage"] = like_row
+
+        if enabled("WebcastMemberMessage") is not None:
+            def member_row(message):
+                gender_index = message.user.gender
+                return [
+                    self._timestamp(),
+                    message.user.id,
+                    self._userRef(message.user.id, message.user.nick_name),
+                    ["女", "男"][gender_index] if gender_index in [0, 1] else "未知"
+                ]
+            rows["WebcastMemberMessage"] = member_row
+        return rows
+
+    def reload_config(self):
+        """
+        重新加载 message_handlers.yml 中的消息处理开关与输出模板
         """
-        msToken = generateMsToken()
-        nonce = self.get_ac_nonce()
-        signature = self.get_ac_signature(nonce)
-        url = ('https://live.douyin.com/webcast/room/web/enter/?aid=6383'
-               '&app_name=douyin_web&live_id=1&device_platform=web&language=zh-CN&enter_from=page_refresh'
-               '&cookie_enabled=true&screen_width=5120&screen_height=1440&browser_language=zh-CN&browser_platform=Win32'
-               '&browser_name=Edge&browser_version=140.0.0.0'
-               f'&web_rid={self.live_id}'
-               f'&room_id_str={self.room_id}'
-               '&enter_source=&is_need_double_stream=false&insert_task_id=&live_reason=&msToken=' + msToken)
-        query = parse_url(url).query
-        params = {i[0]: i[1] for i in [j.split('=') for j in query.split('&')]}
-        a_bogus = self.get_a_bogus(params)  # 计算a_bogus,成功率不是100%，出现失败时重试即可
-        url += f"&a_bogus={a_bogus}"
-        headers = self.headers.copy()
-        headers.update({
-            'Referer': f'https://live.douyin.com/{self.live_id}',
-            'Cookie': f'ttwid={self.ttwid};__ac_nonce={nonce}; __ac_signature={signature}',
-        })
-        resp = self.session.get(url, headers=headers)
-        data = resp.json().get('data')
-        if data:
-            room_status = data.get('room_status')
-            user = data.get('user')
-            user_id = user.get('id_str')
-            nickname = user.get('nickname')
-
-            self.streamer_name = nickname  
-
-            print(f"【{nickname}】[{user_id}]直播间：{['正在直播', '已结束'][bool(room_status)]}.")
+        self.dispatch_map = self.load_message_handlers(self.config_path)
 
+    def update_handlers(self, overrides):
+        """
+        运行时修改消息处理开关与输出模板，不写回配置文件，例如 {"WebcastChatMessage": {"enabled": False}}
+        只影响 enabled / handler / template / log_to_csv / show_* 等在加载配置时编译的设置，其余配置在创建时已读取
+        """
+        for msg_type, cfg in overrides.items():
+            self.handler_overrides.setdefault(msg_type, {}).update(cfg)
+        self.reload_config()
+
+    def __init__(self, live_id, abogus_file='a_bogus.js', config_path="message_handlers.yml", transport=None,
+                 room_id=None, log_folder=None, decoder_pool=None, use_decoder_processes=True):
+        """
+        :param room_id: 已知 room_id 时直接传入，不再请求直播间页面
+        :param log_folder: 覆盖 logging.folder，多进程解码时每个进程使用独立目录
+        :param decoder_pool: 共享的 shm_ring.DecoderPool，为 None 时按 decoder_processes 配置创建
+        :param use_decoder_processes: 为 False 时忽略 decoder_processes 配置（解码进程中的 fetcher）
+        """
+        super().__init__(live_id, abogus_file, config_path, room_id)
+        # 已启动的共用后台服务：名称 -> 关闭函数
+        self._runningShared = {}
+        # 加载消息处理配置
+        self.handler_overrides = {}
+        self.dispatch_map = self.load_message_handlers(config_path)
+        self.total_diamonds = 0
+        self._stopped = False
+        self._wsOpened = False
+        self._connectStarted = 0.0
+        # 连接建立与收到第一批消息的时间（perf_counter），用于统计开始监听到首条消息的耗时
+        self.connected_at = None
+        self.first_message_at = None
+
+        # 运行时设置
+        self.heartbeat_interval = self.handler_config.get("heartbeat_interval", 5)
+        self.retry_on_failure = self.handler_config.get("retry_on_failure", True)
+        self.max_retries = self.handler_config.get("max_retries", 3)
+        self.retry_delay_seconds = self.handler_config.get("retry_delay_seconds", 10)
+        # websocket = 长连接推送，poll = HTTP 轮询 /webcast/im/fetch/
+        self.transport = transport or self.handler_config.get("transport", "websocket")
+        self.ws = None
+        self.poller = None
+        self._heartbeatStopped = None
+
+        # 推送停滞检测，停滞时关闭连接并重连
+        watchdog_cfg = self.handler_config.get("stall_watchdog", {})
+        self.watchdog = None
+        self._reconnecting = False
+        if watchdog_cfg.get("enabled", True):
+            self.watchdog = StallWatchdog(
+                self._onStall,
+                min_timeout=watchdog_cfg.get("min_timeout_seconds", 10),
+                max_timeout=watchdog_cfg.get("max_timeout_seconds", 120),
+                initial_timeout=watchdog_cfg.get("initial_timeout_seconds", 30),
+                multiplier=watchdog_cfg.get("multiplier", 3.0),
+                lag_limit=watchdog_cfg.get("lag_limit_seconds", 30),
+            )
+
+        # 多进程解码：websocket 收到的 PushFrame 写入共享内存，由解码进程解析
+        self.decoder_pool = decoder_pool
+        self._owns_decoder_pool = False
+        decoder_cfg = self.handler_config.get("decoder_processes", {})
+        if decoder_pool is None and use_decoder_processes and decoder_cfg.get("enabled", False):
+            self.decoder_pool = DecoderPool(
+                config_path,
+                workers=decoder_cfg.get("workers", 2),
+                ring_bytes=decoder_cfg.get("ring_mb", 16) * 1024 * 1024,
+                policy=decoder_cfg.get("policy", "block"),
+                stats_interval=decoder_cfg.get("stats_interval_seconds", 2),
+            )
+            self._owns_decoder_pool = True
+
+        self.logging_cfg = self.handler_config.get("logging", {})
+        self.log_folder = log_folder or self.logging_cfg.get("folder", "logs")
+        self.log_format = self.logging_cfg.get("format", "csv")
+        self.rotate_daily = self.logging_cfg.get("rotate_daily", True)
+        self.include_timestamp = self.logging_cfg.get("include_timestamp", True)
+
+        os.makedirs(self.log_folder, exist_ok=True)
+        self.sink = None
+        self.rotator = None
+        if self.log_format == "sqlite":
+            # 同一进程内写同一个数据库文件的直播间共用一个写入线程
+            db_path = os.path.join(self.log_folder, self.logging_cfg.get("sqlite_file", "douyin_live.db"))
+            self.sink = self._sharedResource("sink", ("sqlite", os.path.abspath(db_path)), lambda: SQLiteSink(
+                db_path,
+                batch_size=self.logging_cfg.get("batch_size", 500),
+                flush_interval=self.logging_cfg.get("flush_interval_seconds", 1.0),
+            ), close=SQLiteSink.close)
+        else:
+            rotation_cfg = self.logging_cfg.get("rotation", {})
+            key = ("rotator", os.path.abspath(self.log_folder))
+            self.rotator = self._sharedResource("rotator", key, lambda: LogRotator(
+                self.log_folder,
+                rotate_daily=self.rotate_daily,
+                max_bytes=rotation_cfg.get("max_size_mb", 50) * 1024 * 1024,
+                compression=rotation_cfg.get("compression", "gzip"),
+                retention_bytes=rotation_cfg.get("retention_mb", 1024) * 1024 * 1024,
+                retention_days=rotation_cfg.get("retention_days", 30),
+                retention=rotation_cfg.get("per_log", {}),
+            ), close=LogRotator.close)
+
+        # 礼物目录与日志字典编码（日志行只写 user_id / gift_id，名称记录在 user_dict / gift_dict 中）
+        catalog_path = os.path.join(self.log_folder, "gift_catalog.json")
+        self.gift_catalog = self._sharedResource(
+            "gift_catalog", ("gift_catalog", os.path.abspath(catalog_path)),
+            lambda: GiftCatalog(catalog_path, max_gifts=self.logging_cfg.get("max_gifts", 10000)),
+            close=GiftCatalog.close)
+        self.dictionary_encoding = self.logging_cfg.get("dictionary_encoding", False)
+        self.user_names = self._sharedResource(
+            "user_names", ("user_names", os.path.abspath(self.log_folder)),
+            lambda: NameDictionary(self.logging_cfg.get("dictionary_max_users", 200000)))
+
+        # 观众人数时序数据
+        viewer_cfg = self.logging_cfg.get("viewer_store", {})
+        self.viewer_store = None
+        if viewer_cfg.get("enabled", False):
+            path = os.path.join(self.log_folder, viewer_cfg.get("file", "viewer_series.bin"))
+            key = ("viewer_store", os.path.abspath(path))
+            self.viewer_store = self._sharedResource("viewer_store", key, lambda: ViewerStore(
+                path,
+                raw_retention=viewer_cfg.get("raw_retention_hours", 6) * 3600,
+                minute_retention=viewer_cfg.get("minute_retention_days", 7) * 86400,
+                hour_retention=viewer_cfg.get("hour_retention_days", 365) * 86400,
+                downsample_interval=viewer_cfg.get("downsample_interval_seconds", 60),
+            ), close=ViewerStore.close)
+        self._viewer_logged_at = {}
+
+        # 事件订阅
+        events_cfg = self.handler_config.get("events", {})
+        self.events = EventBus(
+            executor=events_cfg.get("executor", "inline"),
+            max_workers=events_cfg.get("max_workers", 4),
+            queue_size=events_cfg.get("queue_size", 1000),
+            policy=events_cfg.get("policy", "drop"),
+        )
+
+        # 过载降级
+        shed_cfg = self.handler_config.get("load_shedding", {})
+        self.shedder = None
+        if shed_cfg.get("enabled", False):
+            self.shedder = LoadShedder(
+                self.handler_config,
+                lag_soft_ms=shed_cfg.get("lag_soft_ms", 1000),
+                lag_hard_ms=shed_cfg.get("lag_hard_ms", 3000),
+                lag_critical_ms=shed_cfg.get("lag_critical_ms", 10000),
+                utilization_soft=shed_cfg.get("utilization_soft", 0.8),
+                utilization_hard=shed_cfg.get("utilization_hard", 0.95),
+                window_seconds=shed_cfg.get("window_seconds", 5),
+                cooldown_seconds=shed_cfg.get("cooldown_seconds", 10),
+            )
+
+        # 端到端延迟统计
+        latency_cfg = self.handler_config.get("latency", {})
+        self.latency = LatencyTracker() if latency_cfg.get("enabled", True) else None
+        self.latency_report_interval = latency_cfg.get("report_interval_seconds", 0)
+        self._latency_reported = time.monotonic()
+
+        # 点赞合并
+        like_cfg = self.handler_config.get("WebcastLikeMessage", {})
+        self.like_coalescer = None
+        if like_cfg.get("aggregate_window_seconds", 0):
+            self.like_coalescer = LikeCoalescer(
+                self._onLikeSummary,
+                self._onRoomLikeTotals,
+                window_seconds=like_cfg["aggregate_window_seconds"],
+                max_users=like_cfg.get("aggregate_max_users", 10000),
+            )
+
+        # 本地扇出发布，同一进程内的直播间共用一个 socket，事件中的 room_id 区分直播间
+        fanout_cfg = self.handler_config.get("fanout", {})
+        self.fanout = None
+        if fanout_cfg.get("enabled", False):
+            if fanout_cfg.get("transport", "unix") == "zmq":
+                fanout_key = ("fanout", fanout_cfg.get("endpoint", "ipc:///tmp/douyin_live.ipc"))
+            else:
+                fanout_key = ("fanout", os.path.abspath(fanout_cfg.get("path", "/tmp/douyin_live.sock")))
+            self.fanout = self._sharedResource(
+                "fanout", fanout_key, lambda: create_publisher(fanout_cfg), close=lambda publisher: publisher.close())
+            for method in fanout_cfg.get("events", ["WebcastChatMessage", "WebcastGiftMessage"]):
+                self.on(method, self._fanout_callback(method), executor="inline")
+
+        # 浏览器浮层广播（SSE / WebSocket），同一进程内的直播间共用一个端口
+        broadcast_cfg = self.handler_config.get("broadcast", {})
+        self.broadcast = None
+        if broadcast_cfg.get("enabled", False):
+            self.broadcast = self._sharedResource(
+                "broadcast", ("broadcast", broadcast_cfg.get("host", "127.0.0.1"), broadcast_cfg.get("port", 8780)),
+                lambda: create_broadcast_server(broadcast_cfg), close=lambda server: server.close())
+            for method in broadcast_cfg.get("events", ["WebcastChatMessage", "WebcastGiftMessage"]):
+                self.on(method, self._broadcast_callback(method), executor="inline")
+
+        # 状态类消息（排行榜、直播间统计、直播间信息）的变化检测
+        self.state = StateTracker()
+
+        # 累计状态（钻石、贡献榜、去重用户数、cursor、状态类消息）的快照与 WAL，启动时恢复
+        self.checkpoint_cfg = self.handler_config.get("checkpoint", {})
+        self.checkpoint = None
+
+        # 弹幕关键词匹配，同一进程内的直播间共用，关键词文件修改后在后台重新编译
+        keywords_cfg = self.handler_config.get("keywords", {})
+        self.keywords = None
+        if keywords_cfg.get("enabled", False):
+            self.keywords = self._sharedResource("keywords", ("keywords", os.path.abspath(config_path)),
+                                                 lambda: create_keyword_engine(keywords_cfg), close=KeywordEngine.stop)
+        self.print_keyword_matches = keywords_cfg.get("print_matches", True)
+
+        # 弹幕近似重复（刷屏）检测，每个直播间独立
+        dedup_cfg = self.handler_config.get("near_duplicate", {})
+        self.dedup = create_detector(dedup_cfg) if dedup_cfg.get("enabled", False) else None
+
+        # NDJSON 输出：替代控制台模板输出，每个事件一行 JSON，便于接入其它工具
+        output_cfg = self.handler_config.get("output", {})
+        self.output = None
+        if output_cfg.get("mode", "text") == "ndjson":
+            target = output_cfg.get("target", "-")
+            self.output = self._sharedResource(
+                "output", ("ndjson", target if target == "-" else os.path.abspath(target)),
+                lambda: create_writer(output_cfg), close=lambda writer: writer.close())
+
+    def _broadcast_callback(self, method):
+        def publish(message):
+            event = normalize(method, message, self.room_id)
+            self.broadcast.publish(event["room_id"], event)
+        return publish
+
+    def _fanout_callback(self, method):
+        def publish(message):
+            self.fanout.publish(normalize(method, message, self.room_id))
+        return publish
+
+    def on(self, event_type, callback, **kwargs):
+        """
+        注册消息回调，例如 room.on("WebcastChatMessage", func)
+        :param event_type: 消息类型，"*" 表示全部已启用的类型
+        :param callback: 参数为解析后的消息对象，可以是 async 函数
+        :param kwargs: executor / queue_size / policy，见 EventBus.subscribe
+        :return: Subscription，可传给 off() 取消订阅
+        """
+        return self.events.subscribe(event_type, callback, **kwargs)
+
+    def off(self, subscription):
+        self.events.unsubscribe(subscription)
+
+    def start(self):
+        self._stopped = False
+        self._reconnecting = False
+        self.connected_at = None
+        self.first_message_at = None
+        self._registerProfileSignal()
+        self._startServices()
+        if self.decoder_pool is not None:
+            self.decoder_pool.start()
+            self.decoder_pool.register(int(self.room_id), self)
+        if self.transport == "poll":
+            self._startPolling()
+        else:
+            self._connectWebSocket()
+    
+    def stop(self):
+        self._stopped = True
+        self._reconnecting = False
+        self._stopHeartbeat()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.poller is not None:
+            self.poller.stop()
+        if self.ws is not None:
+            self.ws.close()
+        if self.decoder_pool is not None and self._room_id:
+            self.decoder_pool.unregister(int(self._room_id))
+            if self._owns_decoder_pool:
+                self.decoder_pool.close()
+        if self.like_coalescer is not None:
+            self.like_coalescer.stop()
+        self._stopShared()
+        if self.sink is not None:
+            self.sink.flush()
+        if self.rotator is not None:
+            self.rotator.flush()
+        if self.output is not None:
+            self.output.flush()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+
+    def close(self):
+        """
+        停止并释放直播间独占的资源（回调线程池），不再使用该 fetcher 时调用；
+        同一进程内共用的资源（sqlite 写入线程、本地扇出等）在最后一个直播间 close() 时关闭
+        """
+        if self._closed:
+            return
+        self.stop()
+        self.events.close()
+        super().close()
+
+    def _startServices(self):
+        """
+        启动消息处理用到的后台服务（检查点、点赞合并窗口、观众人数时序、关键词重新加载），不建立连接；
+        解码进程中的 fetcher 只处理消息，由解码进程调用这一步
+        """
+        self._openCheckpoint()
+        if self.like_coalescer is not None:
+            self.like_coalescer.start()
+        if self.viewer_store is not None:
+            self._startShared("viewer_store", ViewerStore.start, ViewerStore.close)
+        if self.keywords is not None:
+            self._startShared("keywords", KeywordEngine.start, KeywordEngine.stop)
+
+    def _startShared(self, name, start, stop):
+        """
+        共用的后台服务按已启动的直播间计数，重复 start() 只计一次
+        """
+        if name in self._runningShared:
+            return
+        self._runningShared[name] = stop
+        start_shared(self._sharedKeys[name][0], start)
+
+    def _stopShared(self):
+        for name, stop in self._runningShared.items():
+            stop_shared(self._sharedKeys[name][0], stop)
+        self._runningShared = {}
+
+    def _openCheckpoint(self):
+        """
+        恢复上次保存的累计状态并开始写 WAL；多进程解码时消息在解码进程中处理，由解码进程中的 fetcher 记录
+        """
+        if not self.checkpoint_cfg.get("enabled", False) or self.decoder_pool is not None:
+            return
+        if self.checkpoint is None:
+            self.checkpoint = create_checkpointer(self.checkpoint_cfg, self.log_folder, self.room_id)
+            aggregates = self.checkpoint.recover()
+            self.total_diamonds = aggregates.total_diamonds
+            self.state.restore(self.room_id, aggregates.state_messages())
+            recovery = self.checkpoint.recovery
+            print(f"【检查点】已恢复 {self.room_id}：累计钻石 {aggregates.total_diamonds}，"
+                  f"重放 WAL {recovery['replayed']} 条，耗时 {recovery['ms']} ms", file=status_file())
+        self.checkpoint.start()
+    
     def _connectWebSocket(self):
         """
         连接抖音直播间websocket服务器，请求直播间数据
         """
+        try:
+            self._connectLoop()
+        finally:
+            # 连接循环结束（服务端正常关闭、stop() 或重试用尽）后不再检测停滞，避免之后误判停滞并触发重连
+            if self.watchdog is not None:
+                self.watchdog.stop()
+            self._reconnecting = False
+
+    def _connectLoop(self):
+        """
+        建立连接，失败时换签名身份重试；停滞检测主动断开时立即重连
+        """
         attempt = 0
-        while attempt < self.max_retries:
+        while attempt < self.max_retries and not self._stopped:
+            identity = self.identity
+            self._connectStarted = time.perf_counter()
             try:
-                wss = ("wss://webcast100-ws-web-lq.douyin.com/webcast/im/push/v2/?app_name=douyin_web"
+                wss = (f"{self.wss_url}?app_name=douyin_web"
                     "&version_code=180800&webcast_sdk_version=1.0.14-beta.0"
                     "&update_version_code=1.0.14-beta.0&compress=gzip&device_platform=web&cookie_enabled=true"
                     "&screen_width=1536&screen_height=864&browser_language=zh-CN&browser_platform=Win32"
                     "&browser_name=Mozilla"
-                    "&browser_version=5.0%20(Windows%20NT%2010.0;%20Win64;%20x64)%20AppleWebKit/537.36%20(KHTML,"
-                    "%20like%20Gecko)%20Chrome/126.0.0.0%20Safari/537.36"
+                    f"&browser_version={identity.browser_version}"
                     "&browser_online=true&tz_name=Asia/Shanghai"
                     "&cursor=d-1_u-1_fh-7392091211001140287_t-1721106114633_r-1"
-                    f"&internal_ext=internal_src:dim|wss_push_room_id:{self.room_id}|wss_push_did:7319483754668557238"
+                    f"&internal_ext=internal_src:dim|wss_push_room_id:{self.room_id}|wss_push_did:{identity.device_id}"
                     f"|first_req_ms:1721106114541|fetch_time:1721106114633|seq:1|wss_info:0-1721106114633-0-0|"
                     f"wrds_v:7392094459690748497"
                     f"&host=https://live.douyin.com&aid=6383&live_id=1&did_rule=3&endpoint=live_pc&support_wrds=1"
-                    f"&user_unique_id=7319483754668557238&im_path=/webcast/im/fetch/&identity=audience"
+                    f"&user_unique_id={identity.device_id}&im_path=/webcast/im/fetch/&identity=audience"
                     f"&need_persist_msg_count=15&insert_task_id=&live_reason=&room_id={self.room_id}&heartbeatDuration=0")
 
-                signature = generateSignature(wss)
+                signature = self.signer_pool.sign(identity, "sign.js", generateSignature, wss)
                 wss += f"&signature={signature}"
 
                 headers = {
@@ -330,39 +925,65 @@ class DouyinLiveWebFetcher:
                     on_close=self._wsOnClose
                 )
 
-                print(f"【连接尝试】第 {attempt + 1} 次连接 WebSocket...")
+                print(f"【连接尝试】第 {attempt + 1} 次连接 WebSocket（签名身份 {identity.name}）...", file=status_file())
+                self._wsOpened = False
                 self.ws.run_forever()
+                if not self._wsOpened and not self._stopped:
+                    raise ConnectionError("WebSocket 握手失败")
+                if self._reconnecting:
+                    # 停滞检测主动断开，立即重连，不计入重试次数
+                    self._reconnecting = False
+                    continue
                 break  # success, exit loop
 
             except Exception as e:
-                print(f"【连接失败】{e}")
+                print(f"【连接失败】{e}", file=status_file())
+                # 换一个签名身份重试
+                self.signer_pool.record(identity, "connect", False, time.perf_counter() - self._connectStarted, e)
+                self.identity = self.signer_pool.pick(exclude=(identity,))
                 attempt += 1
+                if self._stopped:
+                    break
                 if not self.retry_on_failure or attempt >= self.max_retries:
-                    print("【终止】已达到最大重试次数或关闭重试功能。")
+                    print("【终止】已达到最大重试次数或关闭重试功能。", file=status_file())
                     self.stop()
                     break
-                print(f"【重试中】将在 {self.retry_delay_seconds} 秒后重试...")
+                print(f"【重试中】将在 {self.retry_delay_seconds} 秒后重试...", file=status_file())
                 time.sleep(self.retry_delay_seconds)
 
-    def _sendHeartbeat(self):
-        while True:
+    def _sendHeartbeat(self, ws, stopped):
+        # 连接关闭（stopped 被设置）或重连后旧连接的心跳线程立即退出
+        while ws is self.ws and not stopped.is_set():
             try:
                 heartbeat = PushFrame(payload_type='hb').SerializeToString()
-                self.ws.send(heartbeat, websocket.ABNF.OPCODE_PING)
-                print("【√】发送心跳包")
+                ws.send(heartbeat, websocket.ABNF.OPCODE_PING)
+                print("【√】发送心跳包", file=status_file())
             except Exception as e:
-                print("【X】心跳包检测错误: ", e)
+                print("【X】心跳包检测错误: ", e, file=status_file())
                 break
-            else:
-                time.sleep(self.heartbeat_interval)
+            stopped.wait(self.heartbeat_interval)
+
+    def _stopHeartbeat(self):
+        if self._heartbeatStopped is not None:
+            self._heartbeatStopped.set()
+            self._heartbeatStopped = None
 
     
     def _wsOnOpen(self, ws):
         """
         连接建立成功
         """
-        print("【√】WebSocket连接成功.")
-        threading.Thread(target=self._sendHeartbeat).start()
+        print("【√】WebSocket连接成功.", file=status_file())
+        self._wsOpened = True
+        self.connected_at = time.perf_counter()
+        self.signer_pool.record(self.identity, "connect", True, time.perf_counter() - self._connectStarted)
+        self._stopHeartbeat()
+        self._heartbeatStopped = threading.Event()
+        threading.Thread(target=self._sendHeartbeat, args=(ws, self._heartbeatStopped), name="heartbeat",
+                         daemon=True).start()
+        if self.watchdog is not None:
+            self.watchdog.reset()
+            self.watchdog.start()
     
     def _wsOnMessage(self, ws, message):
         """
@@ -370,267 +991,450 @@ class DouyinLiveWebFetcher:
         :param ws: websocket实例
         :param message: 数据
         """
+        if self.decoder_pool is not None:
+            # 解析交给解码进程，ack 由解码进程交回后发送
+            if self.first_message_at is None:
+                self.first_message_at = time.perf_counter()
+            if self.watchdog is not None:
+                self.watchdog.observe()
+            self.decoder_pool.submit(int(self.room_id), message)
+            return
+
         # 解析proto结构体
         package = PushFrame().parse(message)
-        response = Response().parse(gzip.decompress(package.payload))
+        payload = gzip.decompress(package.payload)
+        response = Response().parse(payload)
+        if self.watchdog is not None:
+            self.watchdog.observe(response.now)
 
         # 返回ack确认消息
         if response.need_ack:
-            ack = PushFrame(
-                log_id=package.log_id,
-                payload_type='ack',
-                payload=response.internal_ext.encode('utf-8')
-            ).SerializeToString()
-            ws.send(ack, websocket.ABNF.OPCODE_BINARY)
+            self._sendAck(package.log_id, response.internal_ext)
+
+        self._dispatchResponse(response)
 
-        # 加载消息处理映射
-        dispatch_map = self.load_message_handlers()
+    def _onStall(self, info):
+        ws = self.ws
+        if ws is None:
+            return
+        self._reconnecting = True
+        ws.keep_running = False
+        # 直接关闭底层 socket，run_forever 立即返回，不等待已停止响应的服务端回复关闭帧
+        sock = ws.sock.sock if ws.sock is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _sendAck(self, log_id, internal_ext):
+        ack = PushFrame(
+            log_id=log_id,
+            payload_type='ack',
+            payload=internal_ext.encode('utf-8')
+        ).SerializeToString()
+        self.ws.send(ack, websocket.ABNF.OPCODE_BINARY)
+
+    def _startPolling(self):
+        """
+        以 HTTP 轮询方式获取直播间数据
+        """
+        poll_cfg = self.handler_config.get("poll", {})
+        self.poller = FetchPoller(
+            self,
+            min_interval=poll_cfg.get("min_interval_seconds", 0.5),
+            max_interval=poll_cfg.get("max_interval_seconds", 10),
+            default_interval=poll_cfg.get("default_interval_seconds", 1),
+        )
+        if self.checkpoint is not None:
+            # 从上次保存的 cursor 继续轮询
+            self.poller.cursor = self.checkpoint.aggregates.cursor
+        self.poller.run()
+
+    def _dispatchResponse(self, response):
+        """
+        分发 Response 中的消息，websocket 与轮询共用
+        """
+        dispatch_map = self.dispatch_map
+        shedder = self.shedder
+        latency = self.latency
+        checkpoint = self.checkpoint
+        received = time.time()
+        if self.first_message_at is None and response.messages_list:
+            self.first_message_at = time.perf_counter()
+        if latency is not None:
+            latency.observe_response(response.now, received)
+        if checkpoint is not None:
+            checkpoint.observe_response(response)
+        messages = response.messages_list if shedder is None else shedder.filter(response)
+        started = time.perf_counter()
 
         # 分发处理每条消息
-        for msg in response.messages_list:
+        for msg in messages:
             method = msg.method
             handler = dispatch_map.get(method)
             if handler:
                 try:
-                    handler(msg.payload)
+                    message = handler(msg.payload)
                 except Exception as e:
-                    print(f"【处理失败】{method}: {e}")
+                    print(f"【处理失败】{method}: {e}", file=status_file())
+                else:
+                    if message is not None:
+                        self.events.publish(method, message)
+                        if checkpoint is not None:
+                            checkpoint.observe(method, message)
+                        if latency is not None:
+                            latency.observe_message(method, message, received)
+
+        if shedder is not None:
+            shedder.record(time.perf_counter() - started)
+        if self.latency_report_interval and latency is not None:
+            now = time.monotonic()
+            if now - self._latency_reported >= self.latency_report_interval:
+                self._latency_reported = now
+                print(f"【延迟统计】p50/p99/max (ms)\n{latency.format()}", file=status_file())
+
+    def stats(self):
+        """
+        运行统计：各阶段延迟、过载降级、停滞检测、回调投递、浮层广播、NDJSON 输出、状态变化检测、签名身份、检查点、关键词匹配、刷屏检测、
+        SQLite 写入；多进程解码时另有 decoder（解码进程序号、上报时间、缓冲区统计）
+        """
+        result = {
+            "latency": self.latency.stats() if self.latency is not None else None,
+            "load_shedding": self.shedder.stats() if self.shedder is not None else None,
+            "stall_watchdog": self.watchdog.stats() if self.watchdog is not None else None,
+            "events": self.events.stats(),
+            "broadcast": self.broadcast.stats() if self.broadcast is not None else None,
+            "output": self.output.stats() if self.output is not None else None,
+            "state": self.state.stats(),
+            "signer_pool": self.signer_pool.stats(),
+            "checkpoint": self.checkpoint.stats() if self.checkpoint is not None else None,
+            "keywords": self.keywords.stats() if self.keywords is not None else None,
+            "near_duplicate": self.dedup.stats() if self.dedup is not None else None,
+            "sqlite": self.sink.stats() if self.sink is not None else None,
+        }
+        if self.decoder_pool is not None:
+            # 消息在解码进程中处理，处理相关的统计取自解码进程定期上报的结果，尚未上报时为 None
+            report = self.decoder_pool.room_stats(int(self.room_id))
+            for key in DECODER_STATS:
+                result[key] = report["stats"].get(key) if report is not None else None
+            result["decoder"] = {
+                "worker": report["worker"] if report is not None else None,
+                "reported_at": report["reported_at"] if report is not None else None,
+                "rings": self.decoder_pool.stats(),
+            }
+        return result
+
+    def profile(self, seconds=None, fmt=None, wait=True):
+        """
+        采样分析 seconds 秒，按 _wsOnMessage 阶段和 _parse*Msg 处理函数汇总耗时，结果保存到 profiler.folder
+        :param fmt: speedscope（可在 https://www.speedscope.app 打开）或 collapsed（flamegraph.pl）
+        :param wait: 为 False 时在后台线程中采样，立即返回
+        :return: 结果文件路径；已有采样在进行或 wait 为 False 时返回 None
+        """
+        cfg = self.handler_config.get("profiler", {})
+        seconds = seconds or cfg.get("seconds", 30)
+        fmt = fmt or cfg.get("format", "speedscope")
+        if not wait:
+            threading.Thread(target=self.profile, args=(seconds, fmt), name="profile", daemon=True).start()
+            return None
+        if not _profile_lock.acquire(blocking=False):
+            print("【性能采样】已有采样正在进行", file=status_file())
+            return None
+        try:
+            print(f"【性能采样】开始采样 {seconds} 秒", file=status_file())
+            profiler = SamplingProfiler(
+                interval=cfg.get("interval_ms", 5) / 1000,
+                files=None if cfg.get("all_threads", False) else [__file__],
+            ).run(seconds)
+            name = f"profile-{self.live_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            name += ".json" if fmt == "speedscope" else ".collapsed"
+            path = profiler.save(os.path.join(cfg.get("folder", os.path.join(self.log_folder, "profiles")), name), fmt)
+            print(f"【性能采样】{profiler.format_summary()}\n结果已保存到 {path}", file=status_file())
+            return path
+        finally:
+            _profile_lock.release()
+
+    def _registerProfileSignal(self):
+        """
+        收到 profiler.signal（默认 SIGUSR2）时在后台开始采样，只能在主线程注册
+        """
+        name = self.handler_config.get("profiler", {}).get("signal", "SIGUSR2")
+        sig = getattr(signal, name, None) if name else None
+        if sig is None or threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(sig, lambda signum, frame: self.profile(wait=False))
 
     def log_message(self, filename, headers, row):
-        if self.rotate_daily:
-            date_str = datetime.now().strftime("%Y-%m-%d")
-            filename = f"{date_str}_{filename}"
-        filepath = os.path.join(self.log_folder, f"{filename}.{self.log_format}")
-
-        file_exists = os.path.isfile(filepath)
-        with open(filepath, mode="a", newline="", encoding="utf-8-sig") as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(headers)
-            writer.writerow(row)
+        if self.sink is not None:
+            record = dict(zip(headers, row))
+            record["room_id"] = self.room_id
+            record["ts"] = time.time()
+            self.sink.write(filename, record)
+            return
+        self.rotator.write(filename, headers, row)
 
     
+    def _timestamp(self):
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S") if self.include_timestamp else ""
+
+    def _userRef(self, user_id, user_name):
+        """
+        日志中的用户名：开启字典编码时只在名称首次出现或变化时写入 user_dict，行内留空
+        """
+        if not self.dictionary_encoding or not user_id:
+            return user_name
+        if self.user_names.changed(user_id, user_name):
+            self.log_message("user_dict", ["timestamp", "user_id", "user_name"], [
+                self._timestamp(),
+                user_id,
+                user_name
+            ])
+        return ""
+
+    def _display(self, msg_type, message):
+        if self.output is not None:
+            self.output.write(normalize(msg_type, message, self.room_id))
+            return
+        formatter = self.formatters.get(msg_type)
+        if formatter is not None:
+            print(formatter(message))
+
+    def _displayChanges(self, msg_type, message, changes):
+        if self.output is not None:
+            event = normalize(msg_type, message, self.room_id)
+            event["changes"] = changes
+            self.output.write(event)
+        elif msg_type in self.formatters:
+            print(format_changes(msg_type, changes))
+
     def _wsOnError(self, ws, error):
-        print("WebSocket error: ", error)
+        print("WebSocket error: ", error, file=status_file())
     
     def _wsOnClose(self, ws, *args):
+        self._stopHeartbeat()
+        if self.watchdog is not None and not self._reconnecting:
+            # 不是停滞检测主动断开的，连接已经结束
+            self.watchdog.stop()
         self.get_room_status()
-        print("WebSocket connection closed.")
+        print("WebSocket connection closed.", file=status_file())
     
     def _parseChatMsg(self, payload):
         """聊天消息"""
         try:
             message = ChatMessage().parse(payload)
-            user_name = message.user.nick_name
-            user_id = message.user.id
-            content = message.content
-
-            cfg = self.handler_config.get("WebcastChatMessage", {})
-            show_user_id = cfg.get("show_user_id", True)
-            show_fans_club = cfg.get("show_fans_club", True)
-            show_pay_grade = cfg.get("show_pay_grade", True)
-            log_to_csv = cfg.get("log_to_csv", False)
-
-            fans_club = None
-            pay_grade = None
-            if message.user:
-                if show_fans_club and hasattr(message.user, 'fans_club') and message.user.fans_club and hasattr(message.user.fans_club, 'data') and message.user.fans_club.data:
-                    fans_club = message.user.fans_club.data.level
-                if show_pay_grade and hasattr(message.user, 'pay_grade') and message.user.pay_grade:
-                    pay_grade = message.user.pay_grade.level
-
-            # 显示记录
-            display_parts = []
-            if show_fans_club:
-                display_parts.append(f"[{fans_club}]")
-            if show_pay_grade:
-                display_parts.append(f"[{pay_grade}]")
-            if show_user_id and user_id != 111111:
-                display_parts.append(f"[{user_id}]{user_name}")
-            else:
-                display_parts.append(user_name)
-
-            print(f"【聊天msg】{' '.join(display_parts)}: {content}")
+            collapsed = False
+            if self.dedup is not None:
+                cluster, collapsed = self.dedup.observe(message.content)
+                message.cluster_id = cluster.id
+            # 关键词在合并刷屏之前匹配，刷屏的违禁词同样会提醒
+            if self.keywords is not None:
+                self._matchKeywords(message)
+            if collapsed:
+                if cluster.suppressed == 1:
+                    print(f"【刷屏】#{cluster.id} 已出现 {cluster.size - 1} 次，之后的相似弹幕合并：{cluster.sample}",
+                          file=status_file())
+                # 只合并输出、日志和回调，检查点的事件数照常累计
+                if self.checkpoint is not None:
+                    self.checkpoint.observe("WebcastChatMessage", message)
+                return None
+            self._display("WebcastChatMessage", message)
 
             # CSV 记录
-            if log_to_csv:
-                headers = ["timestamp", "user_id", "user_name", "fans_club", "pay_grade", "content"]
-                row = [
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S") if self.include_timestamp else "",
-                    user_id if show_user_id else "",
-                    user_name,
-                    fans_club if show_fans_club else "",
-                    pay_grade if show_pay_grade else "",
-                    content
-                ]
-                self.log_message("chat_log", headers, row)
-
-
+            row = self.csv_rows.get("WebcastChatMessage")
+            if row is not None:
+                self.log_message("chat_log", CSV_HEADERS["chat_log"], row(message))
             return message
         except Exception as e:
-            print(f"【聊天msg】解析失败: {e}")
+            print(f"【聊天msg】解析失败: {e}", file=status_file())
             return None
 
+    def _matchKeywords(self, message):
+        """
+        弹幕命中关键词时发布 KeywordMatch 事件（包含命中位置）
+        """
+        hits = self.keywords.match(message.content)
+        if not hits:
+            return
+        match = KeywordMatch(self.room_id, message.user, message.content, hits)
+        if self.print_keyword_matches:
+            words = "，".join(f"{hit.category}:{hit.keyword}" for hit in hits)
+            print(f"【关键词】[{message.user.id}]{message.user.nick_name}: {message.content} （{words}）", file=status_file())
+        self.events.publish("KeywordMatch", match)
 
     def _parseGiftMsg(self, payload):
         """礼物消息"""
         try:
-            message = GiftMessage().parse(payload)
-            user_name = message.user.nick_name
-            gift_name = message.gift.name
-            gift_cnt = message.combo_count
-            gift_value = message.gift.diamond_count * gift_cnt
-
-            cfg = self.handler_config.get("WebcastGiftMessage", {})
-            track_total = cfg.get("track_total_diamonds", False)
-            log_to_csv = cfg.get("log_to_csv", False)
-            show_gift_value = cfg.get("show_gift_value", True)
-
-            fans_club = None
-            pay_grade = None
-            if message.user:
-                if hasattr(message.user, 'fans_club') and message.user.fans_club and hasattr(message.user.fans_club, 'data') and message.user.fans_club.data:
-                    fans_club = message.user.fans_club.data.level
-                if hasattr(message.user, 'pay_grade') and message.user.pay_grade:
-                    pay_grade = message.user.pay_grade.level
+            # GiftStruct 按 gift_id 缓存，原始字节相同时不再解析
+            message, gift_changed = self.gift_catalog.parse_message(payload)
 
             # 显示
-            value_str = f"(价值: {gift_value})" if show_gift_value else ""
-            print(f"【礼物msg】[{fans_club}] [{pay_grade}]|{user_name} 送出了 {gift_name}x{gift_cnt} {value_str}")
+            self._display("WebcastGiftMessage", message)
 
             # 总钻
-            if track_total:
-                self.total_diamonds += gift_value
-                print(f"💎 当前累计钻石数: {self.total_diamonds}")
+            if self.track_total_diamonds:
+                self.total_diamonds += message.gift.diamond_count * message.combo_count
+                print(f"💎 当前累计钻石数: {self.total_diamonds}", file=status_file())
 
             # csv记录
-            if log_to_csv:
-                headers = ["timestamp", "user_name", "gift_name", "gift_count", "gift_value", "fans_club", "pay_grade"]
-                row = [
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S") if self.include_timestamp else "",
-                    user_name,
-                    gift_name,
-                    gift_cnt,
-                    gift_value if show_gift_value else "",
-                    fans_club,
-                    pay_grade
-                ]
-                self.log_message("gift_log", headers, row)
+            row = self.csv_rows.get("WebcastGiftMessage")
+            if row is not None:
+                if gift_changed and self.dictionary_encoding:
+                    self.log_message("gift_dict", ["timestamp", "gift_id", "gift_name", "diamond_count"], [
+                        self._timestamp(),
+                        message.gift_id,
+                        message.gift.name,
+                        message.gift.diamond_count
+                    ])
+                self.log_message("gift_log", CSV_HEADERS["gift_log"], row(message))
 
             return message
         except Exception as e:
-            print(f"【礼物msg】解析失败: {e}")
-            return None
+            print(f"【礼物msg】解析失败: {e}", file=status_file())
             return None
 
     def _parseLikeMsg(self, payload):
         '''点赞消息'''
         message = LikeMessage().parse(payload)
-        user_name = message.user.nick_name
-        count = message.count
-        print(f"【点赞msg】{user_name} 点了{count}个赞")
+        if self.like_coalescer is not None:
+            # 按窗口合并后由 _onLikeSummary 输出和发布，原始点赞不再进入事件总线
+            self.like_coalescer.add(message.common.room_id, message.user.id, message.user.nick_name,
+                                    message.count, message.total)
+            return None
+
+        self._display("WebcastLikeMessage", message)
+        self._logLike(message)
+        return message
+
+    def _logLike(self, like):
+        """
+        记录点赞，like 可以是 LikeMessage 或合并后的 LikeSummary
+        """
+        row = self.csv_rows.get("WebcastLikeMessage")
+        if row is not None:
+            self.log_message("like_log", CSV_HEADERS["like_log"], row(like))
+
+    def _onLikeSummary(self, summary):
+        '''合并后的点赞，在合并线程中调用'''
+        self._display("WebcastLikeMessage", summary)
+        self._logLike(summary)
+        self.events.publish("WebcastLikeMessage", summary)
+        if self.checkpoint is not None:
+            self.checkpoint.observe("WebcastLikeMessage", summary)
+
+    def _onRoomLikeTotals(self, totals):
+        missed = f", 未单独推送 {totals.unobserved}" if totals.unobserved else ""
+        print(f"【点赞统计】本轮 {totals.window_count} 个赞, 直播间累计 {totals.server_total}{missed}", file=status_file())
     
     def _parseMemberMsg(self, payload):
         """进入直播间消息"""
         try:
             message = MemberMessage().parse(payload)
-            user_name = message.user.nick_name
-            user_id = message.user.id
+            self._display("WebcastMemberMessage", message)
 
-            #添加未知性别
-            gender_map = ["女", "男"]
-            gender_index = message.user.gender
-            gender = gender_map[gender_index] if gender_index in [0, 1] else "未知"
-
-            #匿名不显示id
-            if user_id == 111111:
-                print(f"【进场msg】[{gender}]{user_name} 进入了直播间")
-            else:
-                print(f"【进场msg】[{user_id}][{gender}]{user_name} 进入了直播间")
+            row = self.csv_rows.get("WebcastMemberMessage")
+            if row is not None:
+                self.log_message("member_log", CSV_HEADERS["member_log"], row(message))
             return message
         except Exception as e:
-            print(f"【进场msg】解析失败: {e}")
+            print(f"【进场msg】解析失败: {e}", file=status_file())
             return None
     
     def _parseSocialMsg(self, payload):
         '''关注消息'''
         message = SocialMessage().parse(payload)
-        user_name = message.user.nick_name
-        user_id = message.user.id
-        print(f"【关注msg】[{user_id}]{user_name} 关注了主播")
+        self._display("WebcastSocialMessage", message)
+        return message
     
     def _parseRoomUserSeqMsg(self, payload):
         """直播间统计"""
         message = RoomUserSeqMessage().parse(payload)
-        current = message.total
-        total_raw = message.total_pv_for_anchor
-        total = parse_chinese_number(total_raw)
+        self._display("WebcastRoomUserSeqMessage", message)
 
-        now = datetime.now()
-        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
-        print(f"【统计msg】当前观看人数: {current}, 累计观看人数: {total}")
+        room_id = message.common.room_id
+        total_pv = parse_chinese_number(message.total_pv_for_anchor)
+        if self.viewer_store is not None:
+            self.viewer_store.record(room_id, "current", message.total)
+            if total_pv:
+                self.viewer_store.record(room_id, "total_pv", total_pv)
 
         cfg = self.handler_config.get("WebcastRoomUserSeqMessage", {})
         interval = cfg.get("log_interval_seconds", 300)
         log_to_csv = cfg.get("log_to_csv", False)
 
-        if hasattr(self, "last_logged_time") and (now - self.last_logged_time).total_seconds() < interval:
-            return
-        self.last_logged_time = now
+        # 按直播间分别限制记录频率
+        now = datetime.now()
+        last_logged = self._viewer_logged_at.get(room_id)
+        if last_logged is not None and (now - last_logged).total_seconds() < interval:
+            return message
+        self._viewer_logged_at[room_id] = now
 
         if log_to_csv:
-            headers = ["timestamp", "user_name", "gift_name", "gift_count", "gift_value", "fans_club", "pay_grade"]
+            headers = ["timestamp", "current", "total"]
             row = [
-                timestamp if self.include_timestamp else "",
-                "viewer_stats",  
-                "viewer_count",  
-                current,      
-                total,       
-                "",              
-                ""               
+                now.strftime("%Y-%m-%d %H:%M:%S") if self.include_timestamp else "",
+                message.total,
+                total_pv
             ]
-            self.log_message("gift_log", headers, row)
+            self.log_message("viewer_log", headers, row)
+        return message
 
     def _parseFansclubMsg(self, payload):
         '''粉丝团消息'''
         message = FansclubMessage().parse(payload)
-        content = message.content
-        print(f"【粉丝团msg】 {content}")
+        self._display("WebcastFansclubMessage", message)
+        return message
     
     def _parseEmojiChatMsg(self, payload):
         '''聊天表情包消息'''
         message = EmojiChatMessage().parse(payload)
-        emoji_id = message.emoji_id
-        user = message.user
-        common = message.common
-        default_content = message.default_content
-        print(f"【聊天表情包id】 {emoji_id},user：{user},common:{common},default_content:{default_content}")
+        self._display("WebcastEmojiChatMessage", message)
+        return message
     
+    def _parseState(self, method, payload, message_class):
+        """
+        状态类消息：开启 track_changes 时只在内容变化时输出，payload 与上一次相同时不解析
+        :return: (最新消息, 是否有变化)，未变化时返回上一次的消息
+        """
+        if not self.handler_config.get(method, {}).get("track_changes", False):
+            message = message_class().parse(payload)
+            self._display(method, message)
+            return message, True
+        message, changes = self.state.update(self._room_id, method, payload)
+        if changes is None:
+            self._display(method, message)
+        elif changes:
+            self._displayChanges(method, message, changes)
+        return message, changes != []
+
     def _parseRoomMsg(self, payload):
-        message = RoomMessage().parse(payload)
-        common = message.common
-        room_id = common.room_id
-        print(f"【直播间msg】直播间id:{room_id}")
+        message, changed = self._parseState("WebcastRoomMessage", payload, RoomMessage)
+        return message if changed else None
     
     def _parseRoomStatsMsg(self, payload):
-        message = RoomStatsMessage().parse(payload)
-        display_long = message.display_long
-        print(f"【直播间统计msg】{display_long}")
+        message, changed = self._parseState("WebcastRoomStatsMessage", payload, RoomStatsMessage)
+        if self.viewer_store is not None:
+            room_id = message.common.room_id
+            if message.display_value:
+                self.viewer_store.record(room_id, "stats_display_value", message.display_value)
+            if message.total:
+                self.viewer_store.record(room_id, "stats_total", message.total)
+        return message if changed else None
     
     def _parseRankMsg(self, payload):
-        message = RoomRankMessage().parse(payload)
-        ranks_list = message.ranks_list
-        print(f"【直播间排行榜msg】{ranks_list}")
+        message, changed = self._parseState("WebcastRoomRankMessage", payload, RoomRankMessage)
+        return message if changed else None
     
     def _parseControlMsg(self, payload):
         '''直播间状态消息'''
         message = ControlMessage().parse(payload)
         
         if message.status == 3:
-            print("直播间已结束")
+            print("直播间已结束", file=status_file())
             self.stop()
+        return message
     
     def _parseRoomStreamAdaptationMsg(self, payload):
         message = RoomStreamAdaptationMessage().parse(payload)
-        adaptationType = message.adaptation_type
-        print(f'直播间adaptation: {adaptationType}')
+        self._display("WebcastRoomStreamAdaptationMessage", message)
+        return message
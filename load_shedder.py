@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    load_shedder.py
+# @Project:     douyinLiveWebFetcher
+
+import time
+from collections import deque
+
+from console import status_file
+
+# 优先级：critical 永不丢弃；其余按过载级别依次降采样 / 丢弃
+PRIORITIES = {"critical": 0, "high": 1, "normal": 2, "low": 3}
+
+# 无论配置如何都不会被丢弃的消息类型
+NEVER_SHED = {"WebcastGiftMessage", "WebcastControlMessage"}
+
+
+class _TypeStats:
+    __slots__ = ("seen", "processed", "sampled_out", "dropped", "coalesced")
+
+    def __init__(self):
+        self.seen = 0
+        self.processed = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+
+class LoadShedder:
+    """
+    过载降级：根据测得的处理延迟和处理线程占用率计算过载级别（0-3），
+    按消息类型优先级在解析前降采样、合并或丢弃低价值消息，并记录每种类型被丢弃的数量。
+
+    延迟 = 本地接收时间 - Response.now - 基线，基线取最近 baseline_seconds 内的最小差值（抵消时钟偏差与网络延迟）。
+    过载期间（级别 > 0）基线冻结在过载前的值，只会变小，持续的积压不会被当作新的基线吸收掉。
+    占用率 = 最近 window_seconds 内处理消息所花的时间 / 窗口长度。
+
+    级别 1：low 类型按 sample_rate 采样；状态类消息（coalesce）每帧只保留最后一条
+    级别 2：low 类型全部丢弃，normal 类型按 sample_rate 采样
+    级别 3：normal 类型也全部丢弃，high 类型按 sample_rate 采样
+    critical 与礼物、下播消息永远不丢弃。
+    """
+
+    def __init__(self, type_config, lag_soft_ms=1000, lag_hard_ms=3000, lag_critical_ms=10000,
+                 utilization_soft=0.8, utilization_hard=0.95, window_seconds=5, baseline_seconds=60,
+                 cooldown_seconds=10):
+        self.lag_thresholds = (lag_soft_ms, lag_hard_ms, lag_critical_ms)
+        self.utilization_soft = utilization_soft
+        self.utilization_hard = utilization_hard
+        self.window_seconds = window_seconds
+        self.baseline_seconds = baseline_seconds
+        self.cooldown_seconds = cooldown_seconds
+
+        self.priority = {}
+        self.sample_every = {}
+        self.coalesce = set()
+        for msg_type, cfg in type_config.items():
+            if not isinstance(cfg, dict) or "handler" not in cfg:
+                continue
+            priority = cfg.get("shed_priority", "normal")
+            if msg_type in NEVER_SHED:
+                priority = "critical"
+            self.priority[msg_type] = PRIORITIES.get(priority, PRIORITIES["normal"])
+            rate = float(cfg.get("sample_rate", 0.1))
+            self.sample_every[msg_type] = max(1, round(1 / rate)) if rate > 0 else 0
+            if cfg.get("coalesce", False) and msg_type not in NEVER_SHED:
+                self.coalesce.add(msg_type)
+
+        self.level = 0
+        self.lag_ms = 0.0
+        self.utilization = 0.0
+        self.level_changes = 0
+        self._level_since = time.monotonic()
+        self._offsets = deque()  # (接收时间, 本地时间 - Response.now)，单调递增，队首为窗口内最小值
+        self._busy = deque()  # (结束时间, 耗时)
+        self._busy_total = 0.0
+        self._counters = {}
+        self.stats_by_type = {}
+
+    def filter(self, response):
+        """
+        根据当前过载级别筛选需要解析的消息
+        :return: 需要处理的 Message 列表
+        """
+        self._update_lag(response.now)
+        level = self.level
+        messages = response.messages_list
+        latest = None
+        if level >= 1 and self.coalesce:
+            latest = {}
+            for index, msg in enumerate(messages):
+                if msg.method in self.coalesce:
+                    latest[msg.method] = index
+
+        admitted = []
+        for index, msg in enumerate(messages):
+            method = msg.method
+            stats = self.stats_by_type.get(method)
+            if stats is None:
+                stats = self.stats_by_type[method] = _TypeStats()
+            stats.seen += 1
+            if latest is not None and method in latest and latest[method] != index:
+                stats.coalesced += 1
+                continue
+            if level and not self._admit(method, level, stats):
+                continue
+            stats.processed += 1
+            admitted.append(msg)
+        return admitted
+
+    def _admit(self, method, level, stats):
+        priority = self.priority.get(method, PRIORITIES["normal"])
+        if priority == PRIORITIES["critical"]:
+            return True
+        # 级别越高，越多优先级被降采样 / 丢弃
+        threshold = PRIORITIES["low"] - level + 1
+        if priority > threshold:
+            stats.dropped += 1
+            return False
+        if priority == threshold:
+            # 状态类消息已经按帧合并，不再额外采样
+            if method in self.coalesce:
+                return True
+            every = self.sample_every.get(method, 10)
+            count = self._counters.get(method, 0) + 1
+            self._counters[method] = count
+            if not every or count % every:
+                stats.sampled_out += 1
+                return False
+        return True
+
+    def record(self, elapsed):
+        """
+        记录一次处理耗时（秒），用于计算占用率并更新过载级别
+        """
+        now = time.monotonic()
+        self._busy.append((now, elapsed))
+        self._busy_total += elapsed
+        while self._busy and now - self._busy[0][0] > self.window_seconds:
+            self._busy_total -= self._busy.popleft()[1]
+        self.utilization = self._busy_total / self.window_seconds
+        self._update_level(now)
+
+    def _update_lag(self, server_now_ms):
+        if not server_now_ms:
+            return
+        now = time.monotonic()
+        offset = time.time() * 1000 - server_now_ms
+        offsets = self._offsets
+        if self.level and offsets:
+            # 过载期间冻结基线，只接受更小的差值
+            if offset < offsets[0][1]:
+                offsets.clear()
+                offsets.append((now, offset))
+            self.lag_ms = offset - offsets[0][1]
+            return
+        while offsets and offsets[-1][1] >= offset:
+            offsets.pop()
+        offsets.append((now, offset))
+        while now - offsets[0][0] > self.baseline_seconds:
+            offsets.popleft()
+        self.lag_ms = offset - offsets[0][1]
+
+    def _update_level(self, now):
+        level = sum(self.lag_ms >= threshold for threshold in self.lag_thresholds)
+        if self.utilization >= self.utilization_hard:
+            level = max(level, 2)
+        elif self.utilization >= self.utilization_soft:
+            level = max(level, 1)
+        # 升级立即生效，降级需要持续 cooldown_seconds
+        if level > self.level or (level < self.level and now - self._level_since >= self.cooldown_seconds):
+            print(f"【降载】过载级别 {self.level} -> {level} (延迟 {self.lag_ms:.0f}ms, 占用率 {self.utilization:.0%})",
+                  file=status_file())
+            self.level = level
+            self.level_changes += 1
+            self._level_since = now
+        elif level == self.level:
+            self._level_since = now
+
+    def stats(self):
+        """
+        :return: {"level", "lag_ms", "utilization", "types": {消息类型: 各项计数}}
+        """
+        return {
+            "level": self.level,
+            "lag_ms": round(self.lag_ms, 1),
+            "utilization": round(self.utilization, 3),
+            "types": {
+                method: {
+                    "seen": s.seen,
+                    "processed": s.processed,
+                    "sampled_out": s.sampled_out,
+                    "dropped": s.dropped,
+                    "coalesced": s.coalesced,
+                    "shed": s.sampled_out + s.dropped + s.coalesced,
+                }
+                for method, s in self.stats_by_type.items()
+            },
+        }
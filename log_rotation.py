@@ -0,0 +1,335 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    log_rotation.py
+# @Project:     douyinLiveWebFetcher
+
+import codecs
+import csv
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from console import status_file
+
+MANIFEST_FILE = "manifest.json"
+COMPRESSED_SUFFIX = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class Segment:
+    """
+    一个日志分段文件，对应 manifest 中的一条记录
+    """
+
+    def __init__(self, log, file, period, start=None, end=None, rows=0, size=0, closed=False, compressed=None,
+                 headers=None):
+        self.log = log
+        self.file = file
+        self.period = period
+        self.start = start
+        self.end = end
+        self.rows = rows
+        self.size = size
+        self.closed = closed
+        self.compressed = compressed
+        self.headers = headers  # 表头，旧版本的 manifest 没有记录时从文件首行读取
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class _SizedFile:
+    """
+    分段的 CSV 文件：按写入内容的 UTF-8 编码长度累计文件大小，不必每行调用 tell()
+    （文本模式的 tell() 需要重建解码器状态，开销远大于写入本身）
+    """
+
+    def __init__(self, path):
+        self.size = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.file = open(path, mode="a", newline="", encoding="utf-8-sig", buffering=1)
+
+    def write(self, text):
+        if not self.size:
+            self.size = len(codecs.BOM_UTF8)  # 空文件首次写入时带 BOM
+        self.size += len(text.encode("utf-8"))
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_headers(path):
+    """
+    读取 CSV 文件的表头，空文件或无法读取时返回 None
+    """
+    try:
+        with open(path, "r", newline="", encoding="utf-8-sig") as f:
+            return next(csv.reader(f), None)
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+
+
+class LogRotator:
+    """
+    CSV 日志分段管理：
+        - 按天（rotate_daily）和文件大小（max_bytes）切换新分段
+        - 关闭的分段交给低优先级后台线程用 gzip / zstd 压缩
+        - 每种日志按 retention_bytes / retention_days 删除最旧的分段
+        - manifest.json 记录每个分段的时间范围、行数和大小，读取时无需扫描目录
+    """
+
+    def __init__(self, folder, rotate_daily=True, max_bytes=50 * 1024 * 1024, compression="gzip",
+                 retention_bytes=1024 * 1024 * 1024, retention_days=30, retention=None, manifest_interval=10):
+        """
+        :param compression: gzip / zstd / None，zstd 需要安装 zstandard，未安装时退回 gzip
+        :param retention: 按日志类型覆盖默认限额 {"chat_log": {"max_mb": 2048, "days": 90}}
+        """
+        if compression == "zstd" and zstandard is None:
+            print("【日志轮转】未安装 zstandard，改用 gzip 压缩", file=status_file())
+            compression = "gzip"
+        self.folder = folder
+        self.rotate_daily = rotate_daily
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.retention_bytes = retention_bytes
+        self.retention_days = retention_days
+        self.retention = retention or {}
+        self.manifest_interval = manifest_interval
+        self.manifest_path = os.path.join(folder, MANIFEST_FILE)
+        self.segments = []
+        self._active = {}  # 日志名 -> (Segment, _SizedFile, csv.writer)
+        self._next_index = {}
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._manifest_saved = 0.0
+        os.makedirs(folder, exist_ok=True)
+        self._load_manifest()
+
+    def write(self, log, headers, row):
+        now = time.time()
+        with self._lock:
+            active = self._active.get(log)
+            period = self._period(now)
+            # 表头变化（例如新版本增加了列）时换新分段，不在旧表头的文件中追加
+            if active is not None and (active[0].period != period or active[0].size >= self.max_bytes
+                                       or active[0].headers != headers):
+                self._close(log)
+                active = None
+            if active is None:
+                active = self._open(log, headers, period, now)
+            segment, file, writer = active
+            writer.writerow(row)
+            segment.rows += 1
+            segment.end = now
+            segment.size = file.size
+            if now - self._manifest_saved >= self.manifest_interval:
+                self._save_manifest()
+
+    def find(self, log, start=None, end=None):
+        """
+        查找与 [start, end] 有时间交集的分段
+        :return: 按时间排序的 [(文件路径, Segment)]
+        """
+        with self._lock:
+            return [
+                (os.path.join(self.folder, s.file), s)
+                for s in sorted(self.segments, key=lambda s: s.start or 0)
+                if s.log == log
+                and (start is None or s.end is None or s.end >= start)
+                and (end is None or s.start is None or s.start <= end)
+            ]
+
+    def flush(self):
+        with self._lock:
+            for _, file, _ in self._active.values():
+                file.flush()
+            self._save_manifest()
+
+    def close(self):
+        """
+        关闭所有分段并等待压缩完成
+        """
+        with self._lock:
+            for log in list(self._active):
+                self._close(log)
+            self._save_manifest()
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for s in self.segments:
+                item = result.setdefault(s.log, {"segments": 0, "bytes": 0, "rows": 0, "compressed": 0})
+                item["segments"] += 1
+                item["bytes"] += s.size
+                item["rows"] += s.rows
+                item["compressed"] += bool(s.compressed)
+            return result
+
+    def _period(self, now):
+        return datetime.fromtimestamp(now).strftime("%Y-%m-%d") if self.rotate_daily else ""
+
+    def _open(self, log, headers, period, now):
+        base = f"{period}_{log}" if period else log
+        # 同一周期内的分段依次编号，编号只增不减，避免与待压缩或待删除的分段重名；
+        # 不在索引中的 {日期}_{日志}.csv 是旧版本写的文件，表头相同时继续追加
+        headers = list(headers)
+        used = {s.file for s in self.segments}
+        index = self._next_index.get((log, period), 0)
+        while True:
+            name = f"{base}.csv" if not index else f"{base}_{index}.csv"
+            path = os.path.join(self.folder, name)
+            compressed = [name + suffix for suffix in COMPRESSED_SUFFIX.values()]
+            taken = (name in used
+                     or (os.path.exists(path) and (index or read_headers(path) not in (None, headers)))
+                     or any(n in used or os.path.exists(os.path.join(self.folder, n)) for n in compressed))
+            if not taken:
+                break
+            index += 1
+        self._next_index[(log, period)] = index + 1
+        file = _SizedFile(path)
+        writer = csv.writer(file)
+        if not file.size:
+            writer.writerow(headers)
+        segment = Segment(log, name, period, start=now, end=now, size=file.size, headers=headers)
+        self.segments.append(segment)
+        self._active[log] = (segment, file, writer)
+        self._save_manifest()
+        return self._active[log]
+
+    def _close(self, log):
+        segment, file, _ = self._active.pop(log)
+        file.close()
+        segment.closed = True
+        segment.size = os.path.getsize(os.path.join(self.folder, segment.file))
+        self._save_manifest()
+        self._submit(segment)
+
+    def _submit(self, segment):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="log-rotation", daemon=True)
+            self._worker.start()
+        self._queue.put(segment)
+
+    def _run(self):
+        # 压缩线程降低优先级，避免影响消息处理（Linux 下 setpriority 作用于单个线程）
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            segment = self._queue.get()
+            if segment is None:
+                break
+            try:
+                if self.compression and not segment.compressed:
+                    self._compress(segment)
+                self._enforce_retention(segment.log)
+            except Exception as e:
+                print(f"【日志轮转失败】{segment.file}: {e}", file=status_file())
+
+    def _compress(self, segment):
+        source = os.path.join(self.folder, segment.file)
+        if not os.path.isfile(source):
+            return
+        name = segment.file + COMPRESSED_SUFFIX[self.compression]
+        target = os.path.join(self.folder, name)
+        tmp = target + ".tmp"
+        with open(source, "rb") as src:
+            if self.compression == "zstd":
+                with open(tmp, "wb") as dst:
+                    zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+            else:
+                with gzip.open(tmp, "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp, target)
+        with self._lock:
+            segment.file = name
+            segment.compressed = self.compression
+            segment.size = os.path.getsize(target)
+            self._save_manifest()
+        os.remove(source)
+
+    def _enforce_retention(self, log):
+        limits = self.retention.get(log, {})
+        max_bytes = limits["max_mb"] * 1024 * 1024 if "max_mb" in limits else self.retention_bytes
+        days = limits.get("days", self.retention_days)
+        expired_before = time.time() - days * 86400 if days else None
+        with self._lock:
+            closed = sorted((s for s in self.segments if s.log == log and s.closed), key=lambda s: s.start or 0)
+            # 等待压缩的分段按压缩后计算，不提前挤占限额
+            total = sum(s.size for s in self.segments
+                        if s.log == log and not (s.closed and self.compression and not s.compressed))
+            removed = []
+            for segment in closed:
+                expired = expired_before is not None and (segment.end or 0) < expired_before
+                if not expired and (not max_bytes or total <= max_bytes):
+                    break
+                total -= segment.size
+                removed.append(segment)
+            if not removed:
+                return
+            for segment in removed:
+                self.segments.remove(segment)
+            self._save_manifest()
+        for segment in removed:
+            try:
+                os.remove(os.path.join(self.folder, segment.file))
+            except FileNotFoundError:
+                pass
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.segments = [Segment(**item) for item in json.load(f).get("segments", [])]
+        except Exception as e:
+            print(f"【日志索引加载失败】{e}", file=status_file())
+            self.segments = []
+            return
+        # 上次运行未关闭的分段：当前周期继续追加，其余关闭后压缩
+        period = self._period(time.time())
+        for segment in self.segments:
+            if segment.closed:
+                if self.compression and not segment.compressed:
+                    self._submit(segment)
+                continue
+            path = os.path.join(self.folder, segment.file)
+            if not os.path.isfile(path):
+                segment.closed = True
+                continue
+            if segment.period == period and segment.log not in self._active and os.path.getsize(path) < self.max_bytes:
+                if segment.headers is None:
+                    segment.headers = read_headers(path)
+                file = _SizedFile(path)
+                segment.size = file.size
+                self._active[segment.log] = (segment, file, csv.writer(file))
+            else:
+                segment.closed = True
+                segment.size = os.path.getsize(path)
+                self._submit(segment)
+
+    def _save_manifest(self):
+        self._manifest_saved = time.time()
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segments": [s.to_dict() for s in self.segments]}, f, ensure_ascii=False)
+        os.replace(tmp, self.manifest_path)
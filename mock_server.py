@@ -0,0 +1,548 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    mock_server.py
+# @Project:     douyinLiveWebFetcher
+
+"""
+本地模拟抖音直播服务端，用于压测和断线重连测试，不访问线上接口。
+
+提供：
+    GET /                           返回 ttwid / __ac_nonce cookie
+    GET /<live_id>                  直播间页面（包含 roomId）
+    GET /webcast/room/web/enter/    直播间状态 JSON
+    GET /webcast/im/fetch/          HTTP 轮询，返回 Response protobuf
+    GET /webcast/im/push/v2/        websocket，按设定速率推送 gzip 压缩的 PushFrame
+    GET /stats                      统计 JSON
+
+用法:
+    python mock_server.py --port 8765 --rate 2000 --mix chat=5,gift=1,like=3,member=6,seq=0.2
+然后把 message_handlers.yml 的 endpoints 改为 http://127.0.0.1:8765/ 和 ws://127.0.0.1:8765/webcast/im/push/v2/
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from protobuf.douyin import *
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+DEFAULT_MIX = "chat=5,gift=1,like=3,member=6,social=0.5,seq=0.2,stats=0.1,rank=0.05"
+
+
+def _user(i):
+    return User(
+        id=10 ** 10 + i,
+        nick_name=f"用户{i}",
+        gender=i % 3,
+        pay_grade=PayGrade(level=i % 50),
+        fans_club=FansClub(data=FansClubData(level=i % 20)),
+    )
+
+
+def _common(method, room_id, i):
+    return Common(method=method, msg_id=random.getrandbits(63), room_id=room_id, create_time=int(time.time() * 1000))
+
+
+def build_message(kind, room_id, i):
+    """
+    生成一条指定类型的消息
+    :return: Message
+    """
+    user = _user(i % 5000)
+    if kind == "chat":
+        method = "WebcastChatMessage"
+        body = ChatMessage(common=_common(method, room_id, i), user=user, content=f"测试弹幕 {i}")
+    elif kind == "gift":
+        method = "WebcastGiftMessage"
+        gift_id = 463 + i % 8
+        body = GiftMessage(common=_common(method, room_id, i), user=user, gift_id=gift_id, combo_count=1 + i % 10,
+                           gift=GiftStruct(id=gift_id, name=f"礼物{gift_id}", diamond_count=1 + gift_id % 100))
+    elif kind == "like":
+        method = "WebcastLikeMessage"
+        body = LikeMessage(common=_common(method, room_id, i), user=user, count=1 + i % 15, total=i * 7)
+    elif kind == "member":
+        method = "WebcastMemberMessage"
+        body = MemberMessage(common=_common(method, room_id, i), user=user, member_count=20000 + i % 3000)
+    elif kind == "social":
+        method = "WebcastSocialMessage"
+        body = SocialMessage(common=_common(method, room_id, i), user=user, follow_count=1000 + i)
+    elif kind == "seq":
+        method = "WebcastRoomUserSeqMessage"
+        body = RoomUserSeqMessage(common=_common(method, room_id, i), total=20000 + i % 3000,
+                                  total_pv_for_anchor="43.6万")
+    elif kind == "stats":
+        method = "WebcastRoomStatsMessage"
+        body = RoomStatsMessage(common=_common(method, room_id, i), display_long=f"{436000 + i}人看过",
+                                display_value=436000 + i, total=436000 + i)
+    elif kind == "rank":
+        method = "WebcastRoomRankMessage"
+        body = RoomRankMessage(common=_common(method, room_id, i), ranks_list=[
+            RoomRankMessageRoomRank(user=_user((i + n) % 50), score_str=str(1000 - n)) for n in range(3)])
+    elif kind == "control":
+        method = "WebcastControlMessage"
+        body = ControlMessage(common=_common(method, room_id, i), status=3)
+    else:
+        raise ValueError(f"未知的消息类型: {kind}")
+    return Message(method=method, payload=bytes(body), msg_id=random.getrandbits(63))
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+class MockStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.connections = 0
+        self.active = 0
+        self.frames = 0
+        self.messages = 0
+        self.acks = 0
+        self.heartbeats = 0
+        self.ack_timeouts = 0
+        self.heartbeat_timeouts = 0
+        self.simulated_disconnects = 0
+        self.simulated_stalls = 0
+        self.rejected = 0
+        self.fetches = 0
+        self.reconnect_gaps = []
+        self.last_disconnect = None
+
+    def add(self, **kwargs):
+        with self.lock:
+            if kwargs.get("fetches") and not self.connections and not self.fetches:
+                self.started = time.time()
+            for key, value in kwargs.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def on_connect(self):
+        with self.lock:
+            if not self.connections and not self.fetches:
+                self.started = time.time()
+            self.connections += 1
+            self.active += 1
+            if self.last_disconnect is not None:
+                self.reconnect_gaps.append(time.time() - self.last_disconnect)
+                self.last_disconnect = None
+
+    def on_disconnect(self):
+        with self.lock:
+            self.active -= 1
+            self.last_disconnect = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            gaps = sorted(self.reconnect_gaps)
+            return {
+                "elapsed_seconds": round(elapsed, 1),
+                "connections": self.connections,
+                "active": self.active,
+                "frames": self.frames,
+                "messages": self.messages,
+                "messages_per_second": round(self.messages / elapsed, 1) if elapsed else 0,
+                "acks": self.acks,
+                "heartbeats": self.heartbeats,
+                "ack_timeouts": self.ack_timeouts,
+                "heartbeat_timeouts": self.heartbeat_timeouts,
+                "simulated_disconnects": self.simulated_disconnects,
+                "simulated_stalls": self.simulated_stalls,
+                "rejected": self.rejected,
+                "fetches": self.fetches,
+                "reconnects": len(gaps),
+                "reconnect_gap_p50": round(gaps[len(gaps) // 2], 3) if gaps else None,
+                "reconnect_gap_max": round(gaps[-1], 3) if gaps else None,
+            }
+
+
+class MockConfig:
+
+    def __init__(self, room_id="7392091211001140287", live_id="642367622110", nickname="测试主播", room_status=0,
+                 rate=1000.0, batch=20, mix=DEFAULT_MIX, need_ack=True, ack_timeout=10.0, heartbeat_timeout=30.0,
+                 disconnect_every=0.0, stall_after=0.0, fetch_interval_ms=1000, pool_size=200, reject_user_agents=(),
+                 sign_failure_rate=0.0):
+        self.room_id = room_id
+        self.live_id = live_id
+        self.nickname = nickname
+        self.room_status = room_status
+        self.rate = rate
+        self.batch = batch
+        self.mix = parse_mix(mix) if isinstance(mix, str) else dict(mix)
+        self.need_ack = need_ack
+        self.ack_timeout = ack_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.disconnect_every = disconnect_every
+        self.stall_after = stall_after
+        self.fetch_interval_ms = fetch_interval_ms
+        self.pool_size = pool_size
+        self.reject_user_agents = tuple(reject_user_agents)
+        self.sign_failure_rate = sign_failure_rate
+
+
+class MessagePool:
+    """
+    预先生成并序列化的消息池，压测时不让造数据本身成为瓶颈
+    """
+
+    def __init__(self, config):
+        kinds = list(config.mix)
+        weights = [config.mix[k] for k in kinds]
+        room_id = int(config.room_id)
+        chosen = random.choices(kinds, weights, k=config.pool_size)
+        self.messages = [build_message(kind, room_id, i) for i, kind in enumerate(chosen)]
+        self.index = 0
+        self.lock = threading.Lock()
+
+    def take(self, n):
+        with self.lock:
+            start = self.index
+            self.index = (self.index + n) % len(self.messages)
+        return [self.messages[(start + i) % len(self.messages)] for i in range(n)]
+
+
+class WebSocketConnection:
+    """
+    最小化的 websocket 服务端实现（RFC 6455），只支持本模拟服务需要的帧
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def send_frame(self, opcode, payload=b""):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(length)
+        elif length < 65536:
+            header.append(126)
+            header += struct.pack(">H", length)
+        else:
+            header.append(127)
+            header += struct.pack(">Q", length)
+        with self.send_lock:
+            self.sock.sendall(bytes(header) + payload)
+
+    def _recv_exact(self, n):
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            data += chunk
+        return bytes(data)
+
+    def recv_frame(self):
+        b1, b2 = self._recv_exact(2)
+        opcode = b1 & 0x0F
+        masked = b2 & 0x80
+        length = b2 & 0x7F
+        if length == 126:
+            (length,) = struct.unpack(">H", self._recv_exact(2))
+        elif length == 127:
+            (length,) = struct.unpack(">Q", self._recv_exact(8))
+        mask = self._recv_exact(4) if masked else None
+        payload = self._recv_exact(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def close(self, abrupt=False):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if abrupt:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            else:
+                self.send_frame(OPCODE_CLOSE, struct.pack(">H", 1000))
+        except OSError:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class PushSession:
+    """
+    单个 websocket 连接：按速率推送、校验 ack 与心跳、模拟断线
+    """
+
+    def __init__(self, server, ws):
+        self.server = server
+        self.config = server.config
+        self.stats = server.stats
+        self.ws = ws
+        self.log_id = 0
+        self.pending_acks = {}
+        self.last_heartbeat = time.monotonic()
+        self.lock = threading.Lock()
+
+    def run(self):
+        self.stats.on_connect()
+        reader = threading.Thread(target=self._read_loop, daemon=True)
+        reader.start()
+        try:
+            self._push_loop()
+        finally:
+            self.ws.close(abrupt=True)
+            self.stats.on_disconnect()
+
+    def _push_loop(self):
+        config = self.config
+        started = time.monotonic()
+        disconnect_at = started + config.disconnect_every if config.disconnect_every else None
+        stall_at = started + config.stall_after if config.stall_after else None
+        frame_interval = config.batch / config.rate if config.rate else 1.0
+        next_send = started
+        while not self.ws.closed:
+            now = time.monotonic()
+            if disconnect_at and now >= disconnect_at:
+                self.stats.add(simulated_disconnects=1)
+                return
+            if now - self.last_heartbeat > config.heartbeat_timeout:
+                self.stats.add(heartbeat_timeouts=1)
+                return
+            with self.lock:
+                expired = [log_id for log_id, sent in self.pending_acks.items() if now - sent > config.ack_timeout]
+            if expired:
+                self.stats.add(ack_timeouts=1)
+                return
+            if stall_at and now >= stall_at:
+                # 保持连接、继续响应心跳，但不再推送数据
+                self.stats.add(simulated_stalls=1)
+                while not self.ws.closed:
+                    time.sleep(0.05)
+                return
+            if now < next_send:
+                time.sleep(min(next_send - now, 0.05))
+                continue
+            next_send += frame_interval
+            # 落后太多时不补发，避免追赶造成突发
+            if next_send < now - 1:
+                next_send = now
+            self._send_batch(self.server.pool.take(config.batch))
+
+    def _send_batch(self, messages):
+        self.log_id += 1
+        response = Response(
+            messages_list=messages,
+            cursor=f"t-{int(time.time() * 1000)}_r-1_d-1_u-1_fh-{self.log_id}",
+            now=int(time.time() * 1000),
+            internal_ext=f"internal_src:dim|first_req_ms:{self.log_id}",
+            need_ack=self.config.need_ack,
+            heartbeat_duration=0,
+        )
+        frame = PushFrame(
+            seq_id=self.log_id,
+            log_id=self.log_id,
+            payload_encoding="gzip",
+            payload_type="msg",
+            payload=gzip.compress(bytes(response), compresslevel=1),
+        )
+        if self.config.need_ack:
+            with self.lock:
+                self.pending_acks[self.log_id] = time.monotonic()
+        try:
+            self.ws.send_frame(OPCODE_BINARY, bytes(frame))
+        except OSError:
+            self.ws.closed = True
+            return
+        self.stats.add(frames=1, messages=len(messages))
+
+    def _read_loop(self):
+        while not self.ws.closed:
+            try:
+                opcode, payload = self.ws.recv_frame()
+            except (ConnectionError, OSError):
+                self.ws.closed = True
+                return
+            if opcode == OPCODE_CLOSE:
+                self.ws.closed = True
+                return
+            if opcode == OPCODE_PING:
+                self.last_heartbeat = time.monotonic()
+                self.stats.add(heartbeats=1)
+                try:
+                    self.ws.send_frame(OPCODE_PONG, payload)
+                except OSError:
+                    self.ws.closed = True
+                continue
+            if opcode == OPCODE_BINARY:
+                try:
+                    frame = PushFrame().parse(payload)
+                except Exception:
+                    continue
+                if frame.payload_type == "ack":
+                    with self.lock:
+                        if self.pending_acks.pop(frame.log_id, None) is not None:
+                            self.stats.add(acks=1)
+                elif frame.payload_type == "hb":
+                    self.last_heartbeat = time.monotonic()
+                    self.stats.add(heartbeats=1)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type="text/html; charset=utf-8", cookies=()):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for cookie in cookies:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _rejected(self, config):
+        """
+        模拟签名校验失败：UA 包含 reject_user_agents 之一，或按 sign_failure_rate 随机拒绝
+        """
+        user_agent = self.headers.get("User-Agent", "")
+        if any(ua in user_agent for ua in config.reject_user_agents) or random.random() < config.sign_failure_rate:
+            self.server.stats.add(rejected=1)
+            return True
+        return False
+
+    def do_GET(self):
+        server = self.server
+        config = server.config
+        path = urlparse(self.path).path
+        if path in ("/webcast/im/push/v2/", "/webcast/im/fetch/") and self._rejected(config):
+            self.send_error(403)
+        elif path == "/webcast/im/push/v2/" and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._upgrade()
+        elif path == "/":
+            self._send(b"<html></html>", cookies=("ttwid=mock_ttwid; Path=/", "__ac_nonce=0123407cc00a9e438deb4; Path=/"))
+        elif path == "/webcast/room/web/enter/" and self._rejected(config):
+            # 与线上一致，签名无效时返回空数据
+            self._send(b'{"data": null, "status_code": 10011}', "application/json")
+        elif path == "/webcast/room/web/enter/":
+            data = {"data": {"room_status": config.room_status,
+                             "user": {"id_str": "100000001", "nickname": config.nickname}}}
+            self._send(json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+        elif path == "/webcast/im/fetch/":
+            server.stats.add(fetches=1)
+            messages = server.pool.take(config.batch)
+            server.stats.add(messages=len(messages))
+            response = Response(messages_list=messages, cursor=f"t-{int(time.time() * 1000)}",
+                                fetch_interval=config.fetch_interval_ms, now=int(time.time() * 1000),
+                                internal_ext="internal_src:dim", fetch_type=1)
+            self._send(bytes(response), "application/protobuffer")
+        elif path == "/stats":
+            self._send(json.dumps(server.stats.snapshot()).encode("utf-8"), "application/json")
+        elif path.strip("/") == config.live_id:
+            body = f'<script>self.__pace_f.push([1,"{{\\"roomId\\":\\"{config.room_id}\\"}}"])</script>'
+            self._send(body.encode("utf-8"))
+        else:
+            self.send_error(404)
+
+    def _upgrade(self):
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        PushSession(self.server, WebSocketConnection(self.connection)).run()
+
+
+class MockDouyinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8765), config=None):
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self.pool = MessagePool(self.config)
+        super().__init__(address, MockHandler)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def wss_url(self):
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}/webcast/im/push/v2/"
+
+    def start(self):
+        """
+        在后台线程中运行
+        """
+        thread = threading.Thread(target=self.serve_forever, name="mock-douyin", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟抖音直播服务端")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--room-id", default="7392091211001140287")
+    parser.add_argument("--live-id", default="642367622110")
+    parser.add_argument("--rate", type=float, default=1000, help="每个连接每秒推送的消息数")
+    parser.add_argument("--batch", type=int, default=20, help="每个 PushFrame 包含的消息数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="消息类型比例，例如 chat=5,gift=1,like=3")
+    parser.add_argument("--no-ack", action="store_true", help="不要求客户端返回 ack")
+    parser.add_argument("--ack-timeout", type=float, default=10, help="ack 超时断开（秒）")
+    parser.add_argument("--heartbeat-timeout", type=float, default=30, help="心跳超时断开（秒）")
+    parser.add_argument("--disconnect-every", type=float, default=0, help="每个连接存活多少秒后主动断开，0 为不断开")
+    parser.add_argument("--stall-after", type=float, default=0, help="每个连接推送多少秒后停止推送但不断开，0 为不停止")
+    parser.add_argument("--reject-ua", default="", help="拒绝 UA 包含这些字符串的请求（逗号分隔），模拟失效的签名身份")
+    parser.add_argument("--sign-failure-rate", type=float, default=0, help="随机拒绝请求的比例，模拟签名成功率不足")
+    parser.add_argument("--room-status", type=int, default=0, help="0 直播中，2 已结束")
+    parser.add_argument("--stats-interval", type=float, default=5, help="打印统计的间隔（秒）")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        room_id=args.room_id, live_id=args.live_id, room_status=args.room_status, rate=args.rate,
+        batch=args.batch, mix=args.mix, need_ack=not args.no_ack, ack_timeout=args.ack_timeout,
+        heartbeat_timeout=args.heartbeat_timeout, disconnect_every=args.disconnect_every,
+        stall_after=args.stall_after, reject_user_agents=[ua for ua in args.reject_ua.split(",") if ua],
+        sign_failure_rate=args.sign_failure_rate,
+    )
+    server = MockDouyinServer((args.host, args.port), config)
+    server.start()
+    print(f"【mock】live_url: {server.base_url}  wss_url: {server.wss_url}")
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            print(f"【mock统计】{server.stats.snapshot()}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
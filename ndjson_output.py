@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    ndjson_output.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import sys
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from console import release_stdout, reserve_stdout
+
+
+def get_line_encoder():
+    """
+    :return: dict -> 一行 JSON（bytes，含换行符）；安装 orjson 时使用 orjson
+    """
+    if orjson is not None:
+        option = orjson.OPT_APPEND_NEWLINE
+
+        def encode(obj):
+            return orjson.dumps(obj, default=str, option=option)
+        return encode
+
+    def encode(obj):
+        return (json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+    return encode
+
+
+class NDJSONWriter:
+    """
+    NDJSON 输出：每个事件一行紧凑 JSON，先写入内存缓冲区，
+    超过 buffer_bytes 或每隔 flush_interval 秒批量写出一次。
+    target 为 "-" 时写标准输出，否则为文件或命名管道路径（追加写入；命名管道会等待读取端打开）。
+    下游关闭管道后不再写入，也不影响直播间的其它处理。
+    """
+
+    def __init__(self, target="-", buffer_bytes=64 * 1024, flush_interval=0.2):
+        self.target = target
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.encode = get_line_encoder()
+        self.lines = 0
+        self.bytes_written = 0
+        self.flushes = 0
+        self.broken = False
+        if target == "-":
+            self._file = sys.stdout.buffer
+            self._owns_file = False
+            reserve_stdout()
+        else:
+            self._file = open(target, "ab")
+            self._owns_file = True
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ndjson-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, event):
+        line = self.encode(event)
+        with self._lock:
+            if self.broken:
+                return
+            self._buffer += line
+            self.lines += 1
+            if len(self._buffer) >= self.buffer_bytes:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or self.broken:
+            return
+        data, self._buffer = self._buffer, bytearray()
+        try:
+            self._file.write(data)
+            self._file.flush()
+        except (BrokenPipeError, ValueError):
+            self.broken = True
+            print("【NDJSON输出】下游已关闭，停止输出", file=sys.stderr)
+            return
+        self.bytes_written += len(data)
+        self.flushes += 1
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        if self._owns_file:
+            self._file.close()
+        else:
+            release_stdout()
+
+    def stats(self):
+        return {"lines": self.lines, "bytes": self.bytes_written, "flushes": self.flushes, "broken": self.broken}
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+
+def create_writer(cfg):
+    """
+    根据 message_handlers.yml 中的 output 配置创建 NDJSON 输出
+    """
+    return NDJSONWriter(
+        target=cfg.get("target", "-"),
+        buffer_bytes=cfg.get("buffer_kb", 64) * 1024,
+        flush_interval=cfg.get("flush_interval_ms", 200) / 1000,
+    )
@@ -0,0 +1,240 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    near_duplicate.py
+# @Project:     douyinLiveWebFetcher
+
+import random
+import re
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+from keyword_engine import Normalizer
+
+MASK64 = (1 << 64) - 1
+MAX_SHINGLES = 64  # 超长弹幕只取前面的分片
+MAX_CACHED_SHINGLES = 50000
+
+# 机器人常在同一句话后面追加递增或随机的数字，连续数字统一视为一个字符
+_DIGITS = re.compile(r"\d+")
+
+
+class ChatCluster:
+    """
+    一组近似重复的弹幕，id 在同一个检测器内递增。
+    一条弹幕同时与多个分组相似时这些分组合并（并查集），parent 指向合并到的分组
+    """
+    __slots__ = ("id", "size", "suppressed", "first_ts", "last_ts", "sample", "parent")
+
+    def __init__(self, cluster_id, sample, ts):
+        self.id = cluster_id
+        self.size = 0  # 该组存在期间收到的消息数（组内签名全部移出窗口后该组结束）
+        self.suppressed = 0  # 刷屏合并掉的消息数
+        self.first_ts = ts
+        self.last_ts = ts
+        self.sample = sample  # 第一条弹幕内容
+        self.parent = None
+
+    def root(self):
+        """
+        :return: 合并后的分组，顺带压缩路径
+        """
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        node = self
+        while node.parent is not None and node.parent is not root:
+            node.parent, node = root, node.parent
+        return root
+
+    def merge(self, other):
+        """
+        把另一个分组（根）合并进来
+        """
+        other.parent = self
+        self.size += other.size
+        self.suppressed += other.suppressed
+        self.first_ts = min(self.first_ts, other.first_ts)
+        self.last_ts = max(self.last_ts, other.last_ts)
+
+
+class NearDuplicateDetector:
+    """
+    弹幕近似重复检测：每条弹幕按字符分片计算 MinHash 签名，估计的 Jaccard 相似度不低于 similarity 的归为同一组。
+    签名分成 bands 段，每段 rows 个值，分段建 LSH 索引，每段的每个取值只记录最近出现的签名，
+    每条弹幕最多与 bands 个签名比较，耗时固定；与多个分组相似时把这些分组合并成一组。只保留 window_seconds 内出现过的签名，
+    数量超过 max_entries 时淘汰最久未出现的，内存有固定上限
+    """
+
+    def __init__(self, window_seconds=60, max_entries=20000, bands=8, rows=2, similarity=0.5, shingle=2,
+                 storm_threshold=5, collapse=False):
+        """
+        :param storm_threshold: 同一组的消息数超过该数量视为刷屏
+        :param collapse: 是否合并刷屏，超过 storm_threshold 之后的重复弹幕不再输出
+        """
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = rows
+        self.similarity = similarity
+        self.shingle = shingle
+        self.storm_threshold = storm_threshold
+        self.collapse = collapse
+        self.normalizer = Normalizer(fullwidth=True, ignore_symbols=True)
+        # bands * rows 个乘法哈希（奇数乘数），同一检测器内固定
+        rng = random.Random(bands * 1000 + rows)
+        self._hashes = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(bands * rows)]
+        self._entries = OrderedDict()  # 签名 -> [分组, 最后出现时间]，按最后出现时间排序
+        self._index = [{} for _ in range(bands)]  # 每段：段值 -> 最近出现的签名
+        self._shingles = {}
+        self._next_id = 1
+
+        # 统计
+        self.messages = 0
+        self.duplicates = 0
+        self.suppressed = 0
+        self.clusters = 0
+        self.merged = 0
+        self.evicted = 0
+
+    def signature(self, text):
+        """
+        :return: bands * rows 个 16 位 MinHash 值组成的 bytes
+        """
+        text = _DIGITS.sub("0", self.normalizer.normalize(text))
+        n = self.shingle
+        pieces = {text[i:i + n] for i in range(min(max(len(text) - n + 1, 1), MAX_SHINGLES))}
+        cache = self._shingles
+        if len(cache) > MAX_CACHED_SHINGLES:
+            cache.clear()
+        values = []
+        for piece in pieces:
+            hashed = cache.get(piece)
+            if hashed is None:
+                # 内置 hash() 每个进程加盐，用 crc32 保证不同运行、不同解码进程的分组结果一致
+                h = zlib.crc32(piece.encode("utf-8"))
+                hashed = cache[piece] = array("H", [((a * h + b) & MASK64) >> 48 for a, b in self._hashes])
+            values.append(hashed)
+        return array("H", map(min, zip(*values))).tobytes()
+
+    def observe(self, text, now=None):
+        """
+        :return: (ChatCluster, 是否应合并掉这条弹幕)
+        """
+        now = time.time() if now is None else now
+        self.messages += 1
+        self._expire(now)
+        signature = self.signature(text)
+        entry = self._entries.get(signature)
+        if entry is None:
+            cluster = self._nearest(signature)
+            if cluster is None:
+                cluster = ChatCluster(self._next_id, text, now)
+                self._next_id += 1
+                self.clusters += 1
+            entry = self._entries[signature] = [cluster, now]
+            width = self.rows * 2
+            for band, index in enumerate(self._index):
+                index[signature[band * width:(band + 1) * width]] = signature
+            if len(self._entries) > self.max_entries:
+                self._evict()
+        else:
+            entry[1] = now
+            self._entries.move_to_end(signature)
+        cluster = entry[0] = entry[0].root()
+        cluster.size += 1
+        cluster.last_ts = now
+        if cluster.size > 1:
+            self.duplicates += 1
+        if self.collapse and cluster.size > self.storm_threshold:
+            cluster.suppressed += 1
+            self.suppressed += 1
+            return cluster, True
+        return cluster, False
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "duplicates": self.duplicates,
+            "suppressed": self.suppressed,
+            "clusters": self.clusters,
+            "merged": self.merged,
+            "signatures": len(self._entries),
+            "evicted": self.evicted,
+            "storms": [{"id": c.id, "size": c.size, "suppressed": c.suppressed, "sample": c.sample}
+                       for c in self.storms(5) if c.size > self.storm_threshold],
+        }
+
+    def storms(self, limit=10):
+        """
+        :return: 当前窗口内消息最多的分组
+        """
+        clusters = {id(cluster): cluster for cluster in (entry[0].root() for entry in self._entries.values())}
+        return sorted(clusters.values(), key=lambda c: c.size, reverse=True)[:limit]
+
+    def _nearest(self, signature):
+        """
+        :return: 与所有相似签名所在分组合并后的分组（保留最早的分组），没有相似签名时为 None
+        """
+        width = self.rows * 2
+        values = array("H", signature)
+        needed = self.similarity * len(values)
+        checked = set()
+        found = None
+        for band, index in enumerate(self._index):
+            other = index.get(signature[band * width:(band + 1) * width])
+            if other is None or other in checked:
+                continue
+            checked.add(other)
+            if sum(a == b for a, b in zip(values, array("H", other))) < needed:
+                continue
+            cluster = self._entries[other][0].root()
+            if found is None or cluster is found:
+                found = cluster
+                continue
+            if cluster.id < found.id:
+                found, cluster = cluster, found
+            found.merge(cluster)
+            self.clusters -= 1
+            self.merged += 1
+        return found
+
+    def _expire(self, now):
+        deadline = now - self.window_seconds
+        entries = self._entries
+        while entries:
+            signature, entry = next(iter(entries.items()))
+            if entry[1] >= deadline:
+                return
+            self._remove(signature)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evicted += 1
+
+    def _remove(self, signature):
+        del self._entries[signature]
+        width = self.rows * 2
+        for band, index in enumerate(self._index):
+            key = signature[band * width:(band + 1) * width]
+            if index.get(key) == signature:
+                del index[key]
+
+
+def create_detector(cfg):
+    """
+    根据配置中的 near_duplicate 部分创建检测器
+    """
+    return NearDuplicateDetector(
+        window_seconds=cfg.get("window_seconds", 60),
+        max_entries=cfg.get("max_entries", 20000),
+        bands=cfg.get("bands", 8),
+        rows=cfg.get("rows", 2),
+        similarity=cfg.get("similarity", 0.5),
+        shingle=cfg.get("shingle", 2),
+        storm_threshold=cfg.get("storm_threshold", 5),
+        collapse=cfg.get("collapse", False),
+    )
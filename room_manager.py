@@ -0,0 +1,389 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    room_manager.py
+# @Project:     douyinLiveWebFetcher
+
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+
+from console import status_file
+from liveMan import DouyinLiveWebFetcher
+from shm_ring import DecoderPool
+
+
+class ManagedRoom:
+
+    def __init__(self, live_id, fetcher, room_id=None):
+        self.live_id = live_id
+        self.fetcher = fetcher
+        self.room_id = room_id
+        self.thread = None
+        self.paused = False
+        self.error = None
+        self.starts = 0
+        self.started_at = None  # perf_counter
+        self.room_id_at = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def status(self):
+        if self.paused:
+            return "paused"
+        if not self.running:
+            return "failed" if self.error else "stopped"
+        if self.fetcher.first_message_at is not None and self.fetcher.first_message_at >= self.started_at:
+            return "receiving"
+        return "connecting"
+
+    def timings(self):
+        """
+        :return: 从开始监听到解析 room_id、建立连接、收到第一批消息的耗时（秒）
+        """
+        fetcher = self.fetcher
+        started = self.started_at
+        if started is None:
+            return {}
+        return {
+            name: round(at - started, 3) if at is not None and at >= started else None
+            for name, at in (("room_id", self.room_id_at), ("connected", fetcher.connected_at),
+                             ("first_message", fetcher.first_message_at))
+        }
+
+    def summary(self):
+        return {
+            "live_id": self.live_id,
+            "room_id": self.room_id,
+            "status": self.status,
+            "starts": self.starts,
+            "error": self.error,
+            "timings": self.timings(),
+            "handlers": sorted(self.fetcher.dispatch_map),
+            "overrides": self.fetcher.handler_overrides,
+        }
+
+
+class RoomManager:
+    """
+    长期运行的多直播间服务：运行时添加、移除、暂停、恢复直播间，修改单个直播间的消息处理配置。
+    每个直播间在独立线程中连接，增删改只作用于对应的直播间，其它连接不受影响；
+    同一进程内的直播间通过 shared_resource 共用签名身份池、日志分段、浮层广播等资源。
+    """
+
+    def __init__(self, config_path="message_handlers.yml", fetcher_factory=DouyinLiveWebFetcher):
+        self.config_path = config_path
+        self.fetcher_factory = fetcher_factory
+        self.rooms = {}
+        self._lock = threading.Lock()
+        # 开启多进程解码时所有直播间共用一个解码进程池
+        with open(config_path, "r", encoding="utf-8") as f:
+            decoder_cfg = (yaml.safe_load(f) or {}).get("decoder_processes", {})
+        self.decoder_pool = None
+        if decoder_cfg.get("enabled", False):
+            self.decoder_pool = DecoderPool(
+                config_path,
+                workers=decoder_cfg.get("workers", 2),
+                ring_bytes=decoder_cfg.get("ring_mb", 16) * 1024 * 1024,
+                policy=decoder_cfg.get("policy", "block"),
+                stats_interval=decoder_cfg.get("stats_interval_seconds", 2),
+            )
+
+    def add(self, live_id, room_id=None, overrides=None, paused=False):
+        """
+        :param overrides: 该直播间的消息处理配置，见 DouyinLiveWebFetcher.update_handlers
+        :param paused: 只创建不连接
+        """
+        live_id = str(live_id)
+        with self._lock:
+            room = self.rooms.get(live_id)
+        if room is not None:
+            return room
+        # 创建 fetcher 要读取配置、编译模板、打开日志等，放在锁外，不阻塞其它直播间的增删查
+        fetcher = self.fetcher_factory(live_id, config_path=self.config_path, room_id=room_id,
+                                       decoder_pool=self.decoder_pool)
+        if overrides:
+            fetcher.update_handlers(overrides)
+        with self._lock:
+            room = self.rooms.get(live_id)
+            if room is None:
+                room = self.rooms[live_id] = ManagedRoom(live_id, fetcher, room_id)
+                fetcher = None
+        if fetcher is not None:
+            # 同一个直播间已被并发的请求添加
+            fetcher.close()
+            return room
+        print(f"【直播间管理】添加 {live_id}", file=status_file())
+        if paused:
+            room.paused = True
+        else:
+            self._start(room)
+        return room
+
+    def remove(self, live_id):
+        with self._lock:
+            room = self.rooms.pop(str(live_id), None)
+        if room is None:
+            return None
+        self._stop(room)
+        room.fetcher.close()
+        print(f"【直播间管理】移除 {live_id}", file=status_file())
+        return room
+
+    def pause(self, live_id):
+        """
+        断开连接但保留直播间及其状态（排行榜快照、延迟统计等），resume 后重新连接
+        """
+        room = self.get(live_id)
+        if room.paused:
+            return room
+        room.paused = True
+        self._stop(room)
+        print(f"【直播间管理】暂停 {live_id}", file=status_file())
+        return room
+
+    def resume(self, live_id):
+        room = self.get(live_id)
+        if room.running and not room.paused:
+            return room
+        room.paused = False
+        self._start(room)
+        print(f"【直播间管理】恢复 {live_id}", file=status_file())
+        return room
+
+    def configure(self, live_id, overrides):
+        """
+        修改单个直播间的消息处理配置，立即生效，不重新连接
+        """
+        room = self.get(live_id)
+        room.fetcher.update_handlers(overrides)
+        return room
+
+    def get(self, live_id):
+        """
+        :raise KeyError: 直播间不存在
+        """
+        with self._lock:
+            return self.rooms[str(live_id)]
+
+    def list(self):
+        with self._lock:
+            rooms = list(self.rooms.values())
+        return [room.summary() for room in rooms]
+
+    def profile(self, seconds=None, fmt=None):
+        """
+        在后台采样整个进程，见 DouyinLiveWebFetcher.profile
+        """
+        with self._lock:
+            room = next(iter(self.rooms.values()), None)
+        if room is None:
+            return False
+        room.fetcher.profile(seconds, fmt, wait=False)
+        return True
+
+    def close(self):
+        with self._lock:
+            rooms = list(self.rooms.values())
+            self.rooms.clear()
+        for room in rooms:
+            self._stop(room)
+            room.fetcher.close()
+        if self.decoder_pool is not None:
+            self.decoder_pool.close()
+
+    def _start(self, room):
+        if room.running:
+            return
+        fetcher = room.fetcher
+        room.error = None
+        room.starts += 1
+        room.started_at = time.perf_counter()
+        room.room_id_at = None
+
+        def run():
+            try:
+                room.room_id = fetcher.room_id
+                room.room_id_at = time.perf_counter()
+                # 解析 room_id 期间可能已被暂停或移除
+                if not room.paused and self.rooms.get(room.live_id) is room:
+                    fetcher.start()
+            except Exception as e:
+                room.error = str(e)
+                print(f"【直播间管理】{room.live_id} 连接失败: {e}", file=status_file())
+
+        room.thread = threading.Thread(target=run, name=f"room-{room.live_id}", daemon=True)
+        room.thread.start()
+
+    def _stop(self, room):
+        fetcher = room.fetcher
+        fetcher.stop()
+        thread = room.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=fetcher.retry_delay_seconds + 5)
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """
+    控制接口（JSON）：
+        GET    /rooms                      列出直播间、状态与首条消息耗时
+        POST   /rooms                      {"live_id", "room_id"?, "config"?, "paused"?} 添加直播间
+        GET    /rooms/{live_id}            单个直播间，包括 stats()
+        DELETE /rooms/{live_id}            移除直播间
+        POST   /rooms/{live_id}/pause      暂停
+        POST   /rooms/{live_id}/resume     恢复
+        PATCH  /rooms/{live_id}/config     {"WebcastChatMessage": {"enabled": false}} 修改消息处理配置
+        POST   /profile?seconds=10         在后台采样，结果见 profiler.folder
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _route(self, method):
+        manager = self.server.manager
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            if parts == ["rooms"] and method == "GET":
+                return self._send(200, manager.list())
+            if parts == ["rooms"] and method == "POST":
+                body = self._body()
+                if not body.get("live_id"):
+                    return self._send(400, {"error": "缺少 live_id"})
+                room = manager.add(body["live_id"], room_id=body.get("room_id"), overrides=body.get("config"),
+                                   paused=body.get("paused", False))
+                return self._send(201, room.summary())
+            if parts == ["profile"] and method == "POST":
+                seconds = parse_qs(url.query).get("seconds", [None])[0]
+                started = manager.profile(float(seconds) if seconds else None)
+                return self._send(202 if started else 409, {"started": started})
+            if len(parts) >= 2 and parts[0] == "rooms":
+                live_id = parts[1]
+                action = parts[2] if len(parts) > 2 else None
+                if action is None and method == "GET":
+                    room = manager.get(live_id)
+                    return self._send(200, dict(room.summary(), stats=room.fetcher.stats()))
+                if action is None and method == "DELETE":
+                    if manager.remove(live_id) is None:
+                        raise KeyError(live_id)
+                    return self._send(200, {"removed": live_id})
+                if action == "pause" and method == "POST":
+                    return self._send(200, manager.pause(live_id).summary())
+                if action == "resume" and method == "POST":
+                    return self._send(200, manager.resume(live_id).summary())
+                if action == "config" and method in ("PATCH", "POST"):
+                    return self._send(200, manager.configure(live_id, self._body()).summary())
+            return self._send(404, {"error": "未知接口"})
+        except KeyError as e:
+            return self._send(404, {"error": f"直播间不存在: {e}"})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+class ControlServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, manager, address=("127.0.0.1", 8790)):
+        self.manager = manager
+        super().__init__(address, ControlHandler)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="room-control", daemon=True)
+        thread.start()
+        return thread
+
+
+class UnixControlServer(socketserver.ThreadingUnixStreamServer):
+    """
+    通过 Unix socket 提供同样的控制接口，例如 curl --unix-socket logs/control.sock http://localhost/rooms
+    """
+
+    daemon_threads = True
+
+    def __init__(self, manager, path):
+        self.manager = manager
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, ControlHandler)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="room-control", daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多直播间服务模式，通过控制接口运行时增删直播间")
+    parser.add_argument("live_ids", nargs="*", help="启动时监听的直播间，也可在配置 control.rooms 中设置")
+    parser.add_argument("--config", default="message_handlers.yml")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--unix-socket", default=None, help="改用 Unix socket 提供控制接口")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = (yaml.safe_load(f) or {}).get("control", {})
+    manager = RoomManager(args.config)
+    unix_socket = args.unix_socket or cfg.get("unix_socket")
+    if unix_socket:
+        server = UnixControlServer(manager, unix_socket)
+        print(f"【直播间管理】控制接口: unix:{unix_socket}", file=status_file())
+    else:
+        server = ControlServer(manager, (args.host or cfg.get("host", "127.0.0.1"), args.port or cfg.get("port", 8790)))
+        host, port = server.server_address[:2]
+        print(f"【直播间管理】控制接口: http://{host}:{port}/rooms", file=status_file())
+    server.start()
+    for live_id in args.live_ids or cfg.get("rooms") or []:
+        manager.add(live_id)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
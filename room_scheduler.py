@@ -0,0 +1,263 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    room_scheduler.py
+# @Project:     douyinLiveWebFetcher
+
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from console import status_file
+from liveMan import DouyinLiveWebFetcher, DouyinRoomClient
+
+ROOM_LIVE = 0
+
+
+class TokenBucket:
+    """
+    全局请求预算：每分钟最多 rate 次开播状态 / room_id 请求
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, rate_per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """
+        阻塞直到拿到一个令牌，stop_event 被设置时返回 False
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class RoomState:
+
+    def __init__(self, live_id, client):
+        self.live_id = live_id
+        self.client = client  # 只用于查询开播状态
+        self.fetcher = None  # 开播后才创建
+        self.next_check = 0.0
+        self.checks = 0
+        self.room_status = None
+        self.thread = None
+        self.last_live_at = None
+        self.start_minutes = deque(maxlen=30)  # 历史开播时间（一天中的第几分钟）
+        self.removed = False
+
+    @property
+    def connected(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+class LivenessScheduler:
+    """
+    批量监控直播间开播状态：只对正在直播的直播间建立连接。
+
+    查询间隔自适应：
+        - 接近历史开播时间（前后 near_window_minutes 分钟内）使用 min_interval
+        - 其余时间按距离上次开播的时长逐步放慢，最长 max_interval
+    所有直播间共享 requests_per_minute 的请求预算，开播状态查询、room_id 获取以及连接断开后 fetcher 自己的状态查询都计入。
+    未开播的直播间只保留轻量的 DouyinRoomClient，第一次开播时才创建完整的 fetcher。
+    直播间下播（ControlMessage.status == 3）时 fetcher 自行断开，调度器随后恢复轮询。
+    """
+
+    def __init__(self, live_ids=(), min_interval=30, max_interval=1800, near_window_minutes=30,
+                 dormant_step_hours=6, requests_per_minute=60, state_file=None,
+                 fetcher_factory=DouyinLiveWebFetcher, client_factory=DouyinRoomClient):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.near_window_minutes = near_window_minutes
+        self.dormant_step_hours = dormant_step_hours
+        self.budget = TokenBucket(requests_per_minute)
+        self.state_file = state_file
+        self.fetcher_factory = fetcher_factory
+        self.client_factory = client_factory
+        self.rooms = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._history = self._load_history()
+        for live_id in live_ids:
+            self.add(live_id)
+
+    def add(self, live_id):
+        with self._lock:
+            if live_id in self.rooms and not self.rooms[live_id].removed:
+                return self.rooms[live_id]
+            room = RoomState(live_id, self.client_factory(live_id))
+            room.client.request_budget = self._acquire
+            history = self._history.get(live_id, {})
+            room.start_minutes.extend(history.get("start_minutes", []))
+            room.last_live_at = history.get("last_live_at")
+            self.rooms[live_id] = room
+            heapq.heappush(self._heap, (room.next_check, live_id))
+        self._wakeup.set()
+        return room
+
+    def remove(self, live_id):
+        with self._lock:
+            room = self.rooms.pop(live_id, None)
+        if room is not None:
+            room.removed = True
+            self._close(room)
+
+    def next_interval(self, room, now=None):
+        """
+        根据历史开播时间和休眠时长计算下一次查询间隔（秒）
+        """
+        now = now or time.time()
+        if room.start_minutes:
+            current = datetime.fromtimestamp(now)
+            minute = current.hour * 60 + current.minute
+            for start in room.start_minutes:
+                distance = abs(minute - start)
+                if min(distance, 1440 - distance) <= self.near_window_minutes:
+                    return self.min_interval
+        if room.last_live_at is None:
+            dormant_hours = 24.0
+        else:
+            dormant_hours = (now - room.last_live_at) / 3600
+        interval = self.min_interval * (1 + dormant_hours / self.dormant_step_hours)
+        return min(self.max_interval, interval)
+
+    def run(self):
+        """
+        阻塞运行直到 stop()
+        """
+        while not self._stopped.is_set():
+            with self._lock:
+                item = self._heap[0] if self._heap else None
+            if item is None:
+                self._wait(self.min_interval)
+                continue
+            due, live_id = item
+            delay = due - time.time()
+            if delay > 0:
+                self._wait(delay)
+                continue
+            with self._lock:
+                heapq.heappop(self._heap)
+                room = self.rooms.get(live_id)
+            if room is None or room.removed or room.next_check != due:
+                continue
+            if room.connected:
+                self._schedule(room, self.min_interval)
+                continue
+            self._check(room)
+        for room in list(self.rooms.values()):
+            self._close(room)
+        self._save_history()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def stats(self):
+        return [{
+            "live_id": room.live_id,
+            "room_status": room.room_status,
+            "connected": room.connected,
+            "checks": room.checks,
+            "next_check_in": max(0.0, round(room.next_check - time.time(), 1)),
+        } for room in list(self.rooms.values())]
+
+    def _acquire(self):
+        """
+        直播间的每次请求前取一个令牌，stop() 后返回 False
+        """
+        return self.budget.acquire(self._stopped)
+
+    def _close(self, room):
+        room.client.close()
+        if room.fetcher is not None:
+            room.fetcher.close()
+
+    def _wait(self, seconds):
+        self._wakeup.wait(min(seconds, self.min_interval))
+        self._wakeup.clear()
+
+    def _schedule(self, room, interval):
+        room.next_check = time.time() + interval
+        with self._lock:
+            heapq.heappush(self._heap, (room.next_check, room.live_id))
+
+    def _check(self, room):
+        room.checks += 1
+        try:
+            room.room_status = room.client.get_room_status()
+        except Exception as e:
+            print(f"【开播检测失败】{room.live_id}: {e}", file=status_file())
+            room.room_status = None
+        if room.room_status == ROOM_LIVE:
+            self._record_start(room)
+            self._connect(room)
+        self._schedule(room, self.next_interval(room))
+
+    def _record_start(self, room):
+        now = time.time()
+        # 距离上次记录的开播超过一小时才算一次新的开播
+        if room.last_live_at is None or now - room.last_live_at > 3600:
+            current = datetime.fromtimestamp(now)
+            room.start_minutes.append(current.hour * 60 + current.minute)
+        room.last_live_at = now
+
+    def _connect(self, room):
+        print(f"【开播】{room.live_id} 正在直播，建立连接", file=status_file())
+        if room.fetcher is None:
+            # room_id 在查询开播状态时已获取，fetcher 不再请求直播间页面
+            room.fetcher = self.fetcher_factory(room.live_id, room_id=room.client.room_id)
+            room.fetcher.request_budget = self._acquire
+
+        def run():
+            try:
+                room.fetcher.start()
+            finally:
+                room.last_live_at = time.time()
+                # 连接结束后尽快复查，可能只是断线
+                if not room.removed:
+                    self._schedule(room, self.min_interval)
+                    self._wakeup.set()
+
+        room.thread = threading.Thread(target=run, name=f"room-{room.live_id}", daemon=True)
+        room.thread.start()
+
+    def _load_history(self):
+        if not self.state_file or not os.path.isfile(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"【开播历史加载失败】{e}", file=status_file())
+            return {}
+
+    def _save_history(self):
+        if not self.state_file:
+            return
+        data = {
+            room.live_id: {"start_minutes": list(room.start_minutes), "last_live_at": room.last_live_at}
+            for room in self.rooms.values()
+        }
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    sampling_profiler.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import linecache
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# 统计阶段的函数：样本落在这些函数里时，按当前执行的代码行归入阶段
+STAGE_FUNCTIONS = ("_wsOnMessage", "_dispatchResponse")
+HANDLER_PATTERN = re.compile(r"^_parse\w*Msg$")
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程每隔 interval 秒读取一次各线程的调用栈（sys._current_frames），
+    不安装 sys.setprofile / settrace，未运行时没有任何开销。
+    结果可输出为 collapsed stacks（flamegraph.pl / speedscope 均可读取）或 speedscope JSON，
+    并按 _wsOnMessage 阶段和 _parse*Msg 处理函数汇总。
+    """
+
+    def __init__(self, interval=0.005, files=None):
+        """
+        :param files: 只保留调用栈中包含这些源文件的样本，为 None 时保留所有线程
+        """
+        self.interval = interval
+        self.files = {os.path.abspath(f) for f in files} if files else None
+        self.samples = Counter()  # 调用栈（由根到叶的 (code, 行号) 元组）-> 次数
+        self.started = None
+        self.elapsed = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._caller = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.samples.clear()
+        self._stopped.clear()
+        # 发起采样的线程只是在等待，不计入样本
+        self._caller = threading.get_ident()
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+
+    def run(self, seconds):
+        """
+        阻塞采样 seconds 秒
+        """
+        self.start()
+        self._stopped.wait(seconds)
+        self.stop()
+        return self
+
+    def _run(self):
+        skip = {threading.get_ident(), self._caller}
+        files = self.files
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skip:
+                    continue
+                stack = []
+                keep = files is None
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code, frame.f_lineno))
+                    if not keep and code.co_filename in files:
+                        keep = True
+                    frame = frame.f_back
+                if keep:
+                    stack.reverse()
+                    self.samples[tuple(stack)] += 1
+
+    @staticmethod
+    def qualname(code):
+        # co_qualname 从 Python 3.11 开始才有，旧版本只有函数名
+        return getattr(code, "co_qualname", code.co_name)
+
+    def frame_name(self, code):
+        return f"{self.qualname(code)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def collapsed(self):
+        """
+        :return: collapsed stacks 文本，每行 "根;...;叶 次数"
+        """
+        lines = Counter()
+        for stack, count in self.samples.items():
+            lines[";".join(self.frame_name(code) for code, _ in stack)] += count
+        return "".join(f"{stack} {count}\n" for stack, count in lines.most_common())
+
+    def speedscope(self, name="douyinLiveWebFetcher"):
+        """
+        :return: speedscope 的 sampled 格式
+        """
+        frames = []
+        index = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            ids = []
+            for code, _ in stack:
+                frame_id = index.get(code)
+                if frame_id is None:
+                    frame_id = index[code] = len(frames)
+                    frames.append({"name": self.qualname(code), "file": code.co_filename, "line": code.co_firstlineno})
+                ids.append(frame_id)
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "exporter": "douyinLiveWebFetcher sampling_profiler",
+        }
+
+    def summary(self):
+        """
+        :return: {"samples", "busy", "stages": {阶段: 次数}, "handlers": {处理函数: 次数}}，
+                 阶段为 _wsOnMessage / _dispatchResponse 中正在执行的代码行，busy 为落在这些阶段中的样本数
+        """
+        stages = Counter()
+        handlers = Counter()
+        total = 0
+        busy = 0
+        for stack, count in self.samples.items():
+            total += count
+            stage = None
+            for code, lineno in stack:
+                if code.co_name in STAGE_FUNCTIONS:
+                    line = linecache.getline(code.co_filename, lineno).strip()
+                    stage = f"{code.co_name}: {line}"
+                elif HANDLER_PATTERN.match(code.co_name):
+                    handlers[code.co_name] += count
+                    break
+            if stage is not None:
+                stages[stage] += count
+                busy += count
+        return {"samples": total, "busy": busy, "stages": dict(stages.most_common()),
+                "handlers": dict(handlers.most_common())}
+
+    def format_summary(self, top=10):
+        """
+        :return: 各阶段、各处理函数占消息处理样本的比例
+        """
+        summary = self.summary()
+        total = summary["busy"] or 1
+        lines = [f"{self.elapsed:.1f} 秒，{summary['samples']} 个样本，其中处理消息 {summary['busy']} 个"]
+        for title in ("stages", "handlers"):
+            for name, count in list(summary[title].items())[:top]:
+                lines.append(f"  {count / total:6.1%}  {name}")
+        return "\n".join(lines)
+
+    def save(self, path, fmt=None):
+        """
+        :param fmt: collapsed 或 speedscope，为 None 时按扩展名判断（.json 为 speedscope）
+        """
+        fmt = fmt or ("speedscope" if path.endswith(".json") else "collapsed")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if fmt == "speedscope":
+                json.dump(self.speedscope(), f, ensure_ascii=False)
+            else:
+                f.write(self.collapsed())
+        return path
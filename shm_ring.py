@@ -0,0 +1,355 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    shm_ring.py
+# @Project:     douyinLiveWebFetcher
+
+import gzip
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import yaml
+
+from console import status_file
+
+# 头部：写位置、读位置、写满次数、丢弃数、关闭标记（均为只增的 u64）
+_HEAD, _TAIL, _FULL, _DROPPED, _CLOSED = 0, 8, 16, 24, 32
+CONTROL_SIZE = 64
+
+# 每条记录：长度(u32) 标记(u32) room_id(u64) 序号(u64)，之后是 PushFrame 原始字节，按 8 字节对齐
+RECORD = struct.Struct("<IIQQ")
+FLAG_WRAP = 1
+
+_U64 = struct.Struct("<Q")
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class ShmRing:
+    """
+    基于 multiprocessing.shared_memory 的单生产者单消费者环形缓冲区。
+    生产者写完数据后才更新写位置，消费者处理完后才更新读位置，双方只写各自的位置，不需要锁。
+    写位置与读位置只增不减，取模得到偏移；剩余空间放不下一条记录时写入回绕标记从头开始。
+    """
+
+    def __init__(self, name=None, size=16 * 1024 * 1024):
+        """
+        :param name: 连接已有的共享内存；为 None 时创建新的
+        :param size: 数据区大小（字节），仅创建时有效
+        """
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=CONTROL_SIZE + _align(size))
+            self.shm.buf[:CONTROL_SIZE] = bytes(CONTROL_SIZE)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.capacity = self.shm.size - CONTROL_SIZE
+        self.max_record = self.capacity // 2
+
+    def _get(self, offset):
+        return _U64.unpack_from(self.buf, offset)[0]
+
+    def _set(self, offset, value):
+        _U64.pack_into(self.buf, offset, value)
+
+    def write(self, room_id, seq, data, block=True, timeout=None):
+        """
+        写入一条记录。空间不足时 block=True 等待消费者（反压），否则丢弃
+        :return: 是否写入
+        """
+        length = len(data)
+        size = _align(RECORD.size + length)
+        if size > self.max_record:
+            raise ValueError(f"记录过大: {length} 字节")
+        capacity = self.capacity
+        head = self._get(_HEAD)
+        offset = head % capacity
+        pad = capacity - offset if capacity - offset < size else 0
+        deadline = None
+        delay = 0.0001
+        while head + pad + size - self._get(_TAIL) > capacity:
+            if deadline is None:
+                self._set(_FULL, self._get(_FULL) + 1)
+                deadline = time.monotonic() + timeout if timeout is not None else float("inf")
+            if not block or time.monotonic() >= deadline:
+                self._set(_DROPPED, self._get(_DROPPED) + 1)
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.005)
+
+        if pad:
+            if pad >= RECORD.size:
+                RECORD.pack_into(self.buf, CONTROL_SIZE + offset, 0, FLAG_WRAP, 0, 0)
+            head += pad
+            offset = 0
+        start = CONTROL_SIZE + offset
+        RECORD.pack_into(self.buf, start, length, 0, room_id, seq)
+        self.buf[start + RECORD.size:start + RECORD.size + length] = data
+        self._set(_HEAD, head + size)
+        return True
+
+    def drain(self, callback, max_records=1024):
+        """
+        依次处理已写入的记录，callback(room_id, seq, view) 返回后该记录的空间即被释放，
+        view 是共享内存上的 memoryview，不能在 callback 之外保留
+        :return: 处理的记录数
+        """
+        capacity = self.capacity
+        buf = self.buf
+        head = self._get(_HEAD)
+        tail = self._get(_TAIL)
+        count = 0
+        while tail < head and count < max_records:
+            offset = tail % capacity
+            if capacity - offset < RECORD.size:
+                tail += capacity - offset
+                continue
+            start = CONTROL_SIZE + offset
+            length, flags, room_id, seq = RECORD.unpack_from(buf, start)
+            if flags & FLAG_WRAP:
+                tail += capacity - offset
+                continue
+            view = buf[start + RECORD.size:start + RECORD.size + length]
+            try:
+                callback(room_id, seq, view)
+            finally:
+                view.release()
+                tail += _align(RECORD.size + length)
+                self._set(_TAIL, tail)
+            count += 1
+        if tail != self._get(_TAIL):
+            self._set(_TAIL, tail)
+        return count
+
+    @property
+    def used(self):
+        return self._get(_HEAD) - self._get(_TAIL)
+
+    @property
+    def closed(self):
+        return bool(self._get(_CLOSED))
+
+    def mark_closed(self):
+        self._set(_CLOSED, 1)
+
+    def stats(self):
+        return {
+            "used": self.used,
+            "capacity": self.capacity,
+            "full": self._get(_FULL),
+            "dropped": self._get(_DROPPED),
+        }
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _decoder_main(index, ring_name, config_path, log_folder, acks, setup, stats_interval):
+    """
+    解码进程：从环形缓冲区读取 PushFrame，解压、解析并按直播间分发；
+    每 stats_interval 秒把各直播间的 stats() 通过 acks 队列交回主进程
+    """
+    from liveMan import DouyinLiveWebFetcher
+    from protobuf.douyin import PushFrame, Response
+
+    ring = ShmRing(ring_name)
+    fetchers = {}
+    expected = {}
+    gaps = [0]
+    reported = time.monotonic()
+
+    def report():
+        for room_id, fetcher in fetchers.items():
+            try:
+                acks.put(("stats", room_id, index, fetcher.stats()))
+            except Exception as e:
+                print(f"【解码进程{index}】统计上报失败: {e}", file=status_file())
+
+    def handle(room_id, seq, view):
+        # 同一直播间的帧总是进入同一个缓冲区，序号不连续说明生产者丢弃了帧
+        if room_id in expected and seq != expected[room_id]:
+            gaps[0] += seq - expected[room_id]
+        expected[room_id] = seq + 1
+
+        fetcher = fetchers.get(room_id)
+        if fetcher is None:
+            fetcher = fetchers[room_id] = DouyinLiveWebFetcher(
+                str(room_id), config_path=config_path, room_id=room_id, log_folder=log_folder,
+                use_decoder_processes=False)
+            if setup is not None:
+                setup(fetcher)
+            # 不建立连接，只启动点赞合并、观众人数时序等后台服务
+            fetcher._startServices()
+        package = PushFrame().parse(view)
+        log_id = package.log_id
+        response = Response().parse(gzip.decompress(package.payload))
+        del package
+        if response.need_ack:
+            acks.put(("ack", room_id, log_id, response.internal_ext))
+        fetcher._dispatchResponse(response)
+
+    delay = 0.0005
+    while True:
+        if stats_interval and time.monotonic() - reported >= stats_interval:
+            reported = time.monotonic()
+            report()
+        try:
+            handled = ring.drain(handle)
+        except Exception as e:
+            print(f"【解码进程{index}】处理失败: {e}", file=status_file())
+            continue
+        if handled:
+            delay = 0.0005
+            continue
+        if ring.closed and not ring.used:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+    for fetcher in fetchers.values():
+        fetcher.stop()
+    if stats_interval:
+        report()
+    if gaps[0]:
+        print(f"【解码进程{index}】丢失 {gaps[0]} 帧", file=status_file())
+    ring.close()
+
+
+class DecoderPool:
+    """
+    多进程解码：网络线程只接收 PushFrame 原始字节写入共享内存环形缓冲区，
+    workers 个解码进程各自读取一个缓冲区完成解压、解析和消息处理，绕开 GIL。
+
+        - 同一直播间固定进入同一个缓冲区，并带有递增序号，保证处理顺序
+        - 缓冲区写满时 policy="block" 阻塞接收线程（TCP 反压），"drop" 丢弃并计数
+        - 需要 ack 的帧由解码进程通过队列交回主进程发送
+        - 解码进程每 stats_interval 秒上报各直播间的 stats()，主进程 fetcher.stats() 中的处理统计取自这里
+        - 解码进程中的 fetcher 由 setup(fetcher) 注册回调（需为可 pickle 的顶层函数），
+          日志写入 {logging.folder}/decoder-{序号}，避免多进程写同一个文件
+    """
+
+    def __init__(self, config_path="message_handlers.yml", workers=2, ring_bytes=16 * 1024 * 1024,
+                 policy="block", setup=None, stats_interval=2.0):
+        self.config_path = config_path
+        self.workers = workers
+        self.policy = policy
+        self.setup = setup
+        self.stats_interval = stats_interval
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        self.log_folder = config.get("logging", {}).get("folder", "logs")
+        self.ring_bytes = ring_bytes
+        self.rings = []
+        self.processes = []
+        self._seq = {}
+        self._fetchers = {}
+        self._room_stats = {}  # room_id -> 解码进程最近一次上报的 {"worker", "reported_at", "stats"}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._acks = None
+        self._ack_thread = None
+        self._write_locks = []
+
+    def start(self):
+        if self.processes:
+            return
+        self._acks = self._ctx.Queue()
+        for index in range(self.workers):
+            ring = ShmRing(size=self.ring_bytes)
+            process = self._ctx.Process(
+                target=_decoder_main,
+                args=(index, ring.name, self.config_path,
+                      os.path.join(self.log_folder, f"decoder-{index}"), self._acks, self.setup,
+                      self.stats_interval),
+                name=f"decoder-{index}",
+                daemon=True,
+            )
+            process.start()
+            self.rings.append(ring)
+            self.processes.append(process)
+            self._write_locks.append(threading.Lock())
+        self._ack_thread = threading.Thread(target=self._receive, name="decoder-acks", daemon=True)
+        self._ack_thread.start()
+
+    def register(self, room_id, fetcher):
+        """
+        登记直播间对应的 fetcher，用于发送 ack
+        """
+        self._fetchers[room_id] = fetcher
+
+    def unregister(self, room_id):
+        self._fetchers.pop(room_id, None)
+
+    def room_stats(self, room_id):
+        """
+        :return: 解码进程最近一次上报的该直播间统计 {"worker", "reported_at", "stats"}，尚未上报时为 None
+        """
+        return self._room_stats.get(room_id)
+
+    def submit(self, room_id, frame):
+        """
+        提交一个 PushFrame 原始字节
+        :return: 是否写入（policy="drop" 且缓冲区已满时为 False）
+        """
+        index = room_id % len(self.rings)
+        # 多个连接线程可能写同一个缓冲区，序号分配和写入放在同一把锁内
+        with self._write_locks[index]:
+            seq = self._seq.get(room_id, 0)
+            self._seq[room_id] = seq + 1
+            return self.rings[index].write(room_id, seq, frame, block=self.policy == "block")
+
+    def close(self, timeout=30):
+        """
+        通知解码进程处理完剩余数据后退出
+        """
+        for ring in self.rings:
+            ring.mark_closed()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._acks is not None:
+            self._acks.put(None)
+            self._ack_thread.join()
+        for ring in self.rings:
+            ring.close()
+        self.rings = []
+        self.processes = []
+        self._write_locks = []
+
+    def stats(self):
+        return [ring.stats() for ring in self.rings]
+
+    def _receive(self):
+        """
+        接收解码进程交回的 ack 与统计
+        """
+        while True:
+            try:
+                item = self._acks.get()
+            except (EOFError, OSError):
+                break
+            if item is None:
+                break
+            if item[0] == "stats":
+                _, room_id, worker, stats = item
+                self._room_stats[room_id] = {"worker": worker, "reported_at": time.time(), "stats": stats}
+                continue
+            _, room_id, log_id, internal_ext = item
+            fetcher = self._fetchers.get(room_id)
+            if fetcher is not None:
+                try:
+                    fetcher._sendAck(log_id, internal_ext)
+                except Exception as e:
+                    print(f"【ack 发送失败】{room_id}: {e}", file=status_file())
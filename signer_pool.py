@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    signer_pool.py
+# @Project:     douyinLiveWebFetcher
+
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from console import status_file
+
+# 第一个身份保持原来的 UA 与设备 id
+DEFAULT_DEVICE_ID = "7319483754668557238"
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36 Edg/138.0.0.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36 Edg/139.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36",
+]
+
+# 签名结果的最短长度，低于该长度视为签名失败
+SIGNERS = {
+    "sign.js": 16,
+    "a_bogus.js": 100,
+    "ac_signature.py": 20,
+}
+
+
+class SignerError(Exception):
+    pass
+
+
+class HealthStats:
+    """
+    成功率与耗时的指数滑动平均，新身份从成功率 1.0 开始，保证会被尝试
+    """
+
+    __slots__ = ("alpha", "success_rate", "latency", "attempts", "failures", "consecutive_failures", "last_error")
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.success_rate = 1.0
+        self.latency = None
+        self.attempts = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def record(self, ok, seconds, error=None):
+        self.attempts += 1
+        self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+        if ok:
+            self.consecutive_failures = 0
+            self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+
+    def summary(self):
+        return {
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "success_rate": round(self.success_rate, 3),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class Identity:
+    """
+    一组签名身份：UA、设备 id（wss 中的 did / user_unique_id）、独立的 session 与 cookie（ttwid、__ac_nonce）
+    """
+
+    def __init__(self, name, user_agent, device_id, pool_size=10):
+        self.name = name
+        self.user_agent = user_agent
+        self.device_id = device_id
+        self.session = requests.Session()
+        # 连接池在创建身份时挂载一次，轮询、签名请求共用其中的 keep-alive 连接
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.ttwid = None
+        self.ac_nonce = None
+        self.health = HealthStats()
+        self.operations = {}  # 操作或签名脚本 -> HealthStats
+        self.cooldown_until = 0.0
+        self.cooldowns = 0
+
+    @property
+    def browser_version(self):
+        """
+        wss 地址中的 browser_version：UA 去掉 "Mozilla/" 前缀
+        """
+        return urllib.parse.quote(self.user_agent.split("/", 1)[-1], safe="();,/")
+
+    @property
+    def chrome_version(self):
+        match = re.search(r"Chrome/([\d.]+)", self.user_agent)
+        return match.group(1) if match else "140.0.0.0"
+
+    @property
+    def browser_name(self):
+        return "Edge" if "Edg/" in self.user_agent else "Chrome"
+
+    def reset_cookies(self):
+        self.session.cookies.clear()
+        self.ttwid = None
+        self.ac_nonce = None
+
+    def __repr__(self):
+        return f"Identity({self.name})"
+
+
+def default_identities(size, pool_size=10):
+    identities = [Identity("id-0", USER_AGENTS[0], DEFAULT_DEVICE_ID, pool_size)]
+    for i in range(1, size):
+        device_id = str(random.randrange(7300000000000000000, 7399999999999999999))
+        identities.append(Identity(f"id-{i}", USER_AGENTS[i % len(USER_AGENTS)], device_id, pool_size))
+    return identities
+
+
+class SignerPool:
+    """
+    签名身份池：
+        - pick 按成功率加权随机选择身份，连续失败 failure_threshold 次的身份暂停 cooldown 秒（连续暂停时翻倍）
+        - call 执行一次操作，出现异常或结果未通过校验时换一个身份重试
+        - sign 调用签名脚本并校验结果，按身份和签名脚本分别统计成功率与耗时
+    同一进程内的直播间共用一个身份池，某个身份失效后所有直播间都会避开它。
+    """
+
+    def __init__(self, identities, failure_threshold=3, cooldown_seconds=60, max_cooldown_seconds=600):
+        self.identities = list(identities)
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.signers = {}  # 签名脚本 -> HealthStats（所有身份合计）
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def pick(self, exclude=()):
+        """
+        :param exclude: 本次不使用的身份（刚刚失败的）
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [i for i in self.identities if i not in exclude and i.cooldown_until <= now]
+            if not candidates:
+                # 全部暂停时选择最早恢复的身份
+                rest = [i for i in self.identities if i not in exclude] or self.identities
+                return min(rest, key=lambda i: i.cooldown_until)
+            weights = [i.health.success_rate ** 2 + 0.01 for i in candidates]
+            return random.choices(candidates, weights)[0]
+
+    def record(self, identity, operation, ok, seconds, error=None):
+        with self._lock:
+            stats = identity.operations.get(operation)
+            if stats is None:
+                stats = identity.operations[operation] = HealthStats()
+            stats.record(ok, seconds, error)
+            if operation in SIGNERS:
+                signer = self.signers.get(operation)
+                if signer is None:
+                    signer = self.signers[operation] = HealthStats()
+                signer.record(ok, seconds, error)
+                # 签名失败会让所在的操作失败，身份的整体健康度只按操作统计，避免重复计数
+                return
+            identity.health.record(ok, seconds, error)
+            if ok:
+                identity.cooldowns = 0
+            elif identity.health.consecutive_failures >= self.failure_threshold:
+                cooldown = min(self.max_cooldown_seconds, self.cooldown_seconds * 2 ** identity.cooldowns)
+                identity.cooldowns += 1
+                identity.health.consecutive_failures = 0
+                identity.cooldown_until = time.monotonic() + cooldown
+                print(f"【签名身份】{identity.name} 连续失败，暂停使用 {cooldown} 秒: {error}", file=status_file())
+
+    def sign(self, identity, signer, func, *args):
+        """
+        调用签名函数，结果为空或过短时抛出 SignerError
+        """
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+            if not isinstance(result, str) or len(result) < SIGNERS.get(signer, 1):
+                raise SignerError(f"{signer} 返回无效签名: {result!r}")
+        except Exception as e:
+            self.record(identity, signer, False, time.perf_counter() - started, e)
+            raise
+        self.record(identity, signer, True, time.perf_counter() - started)
+        return result
+
+    def call(self, operation, func, attempts=3, identity=None):
+        """
+        :param func: func(identity) -> 结果，失败时抛出异常
+        :param identity: 第一次尝试使用的身份，为 None 时由 pick 选择
+        :return: (结果, 成功的身份)
+        """
+        tried = []
+        error = None
+        for attempt in range(attempts):
+            if attempt or identity is None:
+                identity = self.pick(exclude=tried)
+            tried.append(identity)
+            started = time.perf_counter()
+            try:
+                result = func(identity)
+            except Exception as e:
+                error = e
+                self.record(identity, operation, False, time.perf_counter() - started, e)
+                if attempt + 1 < attempts:
+                    with self._lock:
+                        self.retries += 1
+                    print(f"【签名身份】{operation} 使用 {identity.name} 失败，换身份重试: {e}", file=status_file())
+                continue
+            self.record(identity, operation, True, time.perf_counter() - started)
+            return result, identity
+        raise error
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "signers": {name: stats.summary() for name, stats in self.signers.items()},
+                "identities": [{
+                    "name": i.name,
+                    "user_agent": i.user_agent,
+                    "device_id": i.device_id,
+                    "cooldown": max(0.0, round(i.cooldown_until - now, 1)),
+                    "health": i.health.summary(),
+                    "operations": {op: stats.summary() for op, stats in i.operations.items()},
+                } for i in self.identities],
+            }
+
+
+def create_signer_pool(cfg):
+    """
+    根据 message_handlers.yml 中的 signer_pool 配置创建身份池
+    """
+    pool_size = cfg.get("connection_pool_size", 10)
+    identities = [Identity(f"id-{i}", item["user_agent"], str(item.get("device_id") or DEFAULT_DEVICE_ID), pool_size)
+                  for i, item in enumerate(cfg.get("identities") or [])]
+    if not identities:
+        identities = default_identities(cfg.get("size", 4), pool_size)
+    return SignerPool(
+        identities,
+        failure_threshold=cfg.get("failure_threshold", 3),
+        cooldown_seconds=cfg.get("cooldown_seconds", 60),
+        max_cooldown_seconds=cfg.get("max_cooldown_seconds", 600),
+    )
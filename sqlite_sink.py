@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    sqlite_sink.py
+# @Project:     douyinLiveWebFetcher
+
+import queue
+import sqlite3
+import threading
+import time
+
+from console import status_file
+
+# 日志名 -> (表名, 列)，日志名与 log_message 的 filename 参数一致
+TABLES = {
+    "chat_log": ("chat", ["room_id", "ts", "user_id", "user_name", "fans_club", "pay_grade", "content"]),
+    "gift_log": ("gift", ["room_id", "ts", "user_id", "user_name", "gift_id", "gift_name", "gift_count",
+                          "gift_value", "fans_club", "pay_grade"]),
+    "member_log": ("member", ["room_id", "ts", "user_id", "user_name", "gender"]),
+    "like_log": ("like_event", ["room_id", "ts", "user_id", "user_name", "count", "total"]),
+    "viewer_log": ("viewer_stats", ["room_id", "ts", "current", "total"]),
+    "gift_dict": ("gift_dict", ["ts", "gift_id", "gift_name", "diamond_count"]),
+    "user_dict": ("user_dict", ["ts", "user_id", "user_name"]),
+}
+
+# 按顺序执行的建表/迁移脚本，当前版本记录在 PRAGMA user_version 中，每个脚本与版本号在同一个事务中提交
+# 修改表结构时只追加新脚本，不要改动已有脚本
+
+# 写入失败（数据库被其它进程锁住等）时的重试次数与间隔（秒）
+WRITE_RETRIES = 3
+RETRY_DELAY = 0.2
+MIGRATIONS = [
+    """
+    CREATE TABLE chat (
+        id INTEGER PRIMARY KEY,
+        room_id INTEGER,
+        ts REAL NOT NULL,
+        user_id INTEGER,
+        user_name TEXT,
+        fans_club INTEGER,
+        pay_grade INTEGER,
+        content TEXT
+    );
+    CREATE TABLE gift (
+        id INTEGER PRIMARY KEY,
+        room_id INTEGER,
+        ts REAL NOT NULL,
+        user_id INTEGER,
+        user_name TEXT,
+        gift_name TEXT,
+        gift_count INTEGER,
+        gift_value INTEGER,
+        fans_club INTEGER,
+        pay_grade INTEGER
+    );
+    CREATE TABLE member (
+        id INTEGER PRIMARY KEY,
+        room_id INTEGER,
+        ts REAL NOT NULL,
+        user_id INTEGER,
+        user_name TEXT,
+        gender TEXT
+    );
+    CREATE TABLE like_event (
+        id INTEGER PRIMARY KEY,
+        room_id INTEGER,
+        ts REAL NOT NULL,
+        user_id INTEGER,
+        user_name TEXT,
+        count INTEGER,
+        total INTEGER
+    );
+    CREATE TABLE viewer_stats (
+        id INTEGER PRIMARY KEY,
+        room_id INTEGER,
+        ts REAL NOT NULL,
+        current INTEGER,
+        total INTEGER
+    );
+    CREATE INDEX idx_chat_room_ts ON chat (room_id, ts);
+    CREATE INDEX idx_chat_user ON chat (user_id);
+    CREATE INDEX idx_gift_room_ts ON gift (room_id, ts);
+    CREATE INDEX idx_gift_user ON gift (user_id);
+    CREATE INDEX idx_member_room_ts ON member (room_id, ts);
+    CREATE INDEX idx_member_user ON member (user_id);
+    CREATE INDEX idx_like_room_ts ON like_event (room_id, ts);
+    CREATE INDEX idx_like_user ON like_event (user_id);
+    CREATE INDEX idx_viewer_room_ts ON viewer_stats (room_id, ts);
+    """,
+    # 字典编码：行内只写 id，名称变化历史记录在 *_dict 表中，gift_named 视图按时间还原名称
+    """
+    ALTER TABLE gift ADD COLUMN gift_id INTEGER;
+    CREATE TABLE gift_dict (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        gift_id INTEGER NOT NULL,
+        gift_name TEXT,
+        diamond_count INTEGER
+    );
+    CREATE TABLE user_dict (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        user_name TEXT
+    );
+    CREATE INDEX idx_gift_dict_id_ts ON gift_dict (gift_id, ts);
+    CREATE INDEX idx_user_dict_id_ts ON user_dict (user_id, ts);
+    CREATE VIEW gift_named AS
+    SELECT g.id, g.room_id, g.ts, g.user_id,
+           COALESCE(g.user_name, (SELECT u.user_name FROM user_dict u
+                                  WHERE u.user_id = g.user_id AND u.ts <= g.ts
+                                  ORDER BY u.ts DESC LIMIT 1)) AS user_name,
+           g.gift_id,
+           COALESCE(g.gift_name, (SELECT d.gift_name FROM gift_dict d
+                                  WHERE d.gift_id = g.gift_id AND d.ts <= g.ts
+                                  ORDER BY d.ts DESC LIMIT 1)) AS gift_name,
+           g.gift_count, g.gift_value, g.fans_club, g.pay_grade
+    FROM gift g;
+    """,
+]
+
+
+def migrate(conn):
+    """
+    将数据库升级到最新版本。executescript 会先提交已有事务，脚本内自己 BEGIN / COMMIT，
+    中途失败时回滚整个脚本，表结构和 user_version 保持在上一个版本
+    :return: 升级后的版本号
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for index in range(version, len(MIGRATIONS)):
+        try:
+            conn.executescript(f"BEGIN;\n{MIGRATIONS[index]}\nPRAGMA user_version = {index + 1};\nCOMMIT;")
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+    return len(MIGRATIONS)
+
+
+class SQLiteSink:
+    """
+    SQLite 日志写入：write() 只入队，后台线程按批次用 executemany 在单个事务中写入。
+    同一进程内写同一个数据库文件的直播间共用一个写入线程，避免多个写入方争抢写锁
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.failed = 0  # 重试后仍写入失败而丢弃的记录数
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="sqlite-sink", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def write(self, log_name, record):
+        """
+        写入一条记录
+        :param log_name: 日志名，见 TABLES
+        :param record: 列名 -> 值，缺失的列写入 NULL，空字符串视为 NULL
+        """
+        if self._closed:
+            return
+        table, columns = TABLES[log_name]
+        values = tuple(None if record.get(c) == "" else record.get(c) for c in columns)
+        self._queue.put((table, values))
+
+    def flush(self):
+        """
+        阻塞直到当前已入队的记录全部写入；写入线程已退出时立即返回
+        """
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(0.5):
+            if not self._thread.is_alive():
+                return
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {"written": self.written, "batches": self.batches, "failed": self.failed,
+                "queued": self._queue.qsize(), "last_error": self.last_error}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        migrate(conn)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        statements = {
+            table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            for table, columns in TABLES.values()
+        }
+        running = True
+        while running:
+            batch = {}
+            waiters = []
+            count = 0
+            deadline = None
+            while count < self.batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                table, values = item
+                batch.setdefault(table, []).append(values)
+                count += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._write_batch(conn, statements, batch, count)
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _write_batch(self, conn, statements, batch, count):
+        """
+        整批在一个事务中写入，数据库被锁住时重试，仍失败则丢弃该批并计数
+        """
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    for table, rows in batch.items():
+                        conn.executemany(statements[table], rows)
+                self.written += count
+                self.batches += 1
+                return
+            except sqlite3.OperationalError as e:
+                self.last_error = str(e)
+                if attempt < WRITE_RETRIES:
+                    time.sleep(RETRY_DELAY * (attempt + 1))
+            except Exception as e:
+                self.last_error = str(e)
+                break
+        self.failed += count
+        print(f"【SQLite写入失败】丢弃 {count} 条记录（累计 {self.failed} 条）: {self.last_error}", file=status_file())
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    stall_watchdog.py
+# @Project:     douyinLiveWebFetcher
+
+import threading
+import time
+from collections import deque
+
+from console import status_file
+
+
+class StallWatchdog:
+    """
+    推送停滞检测：连接仍然打开、心跳也正常，但服务端不再推送数据时主动重连。
+
+        - 间隔阈值：最近 window 个帧间隔的 99 分位 × multiplier，限制在 [min_timeout, max_timeout]，
+          样本不足 min_samples 个时使用 initial_timeout
+        - 服务端时间：Response.now 与本地时间之差超过基线（窗口内最小差值）lag_limit 秒，说明收到的是积压的旧数据
+    超过阈值时调用 on_stall(info)，数据恢复后记录本次停滞时长。
+    """
+
+    def __init__(self, on_stall, min_timeout=10, max_timeout=120, initial_timeout=30, multiplier=3.0,
+                 window=200, min_samples=20, lag_limit=30, check_interval=1.0):
+        self.on_stall = on_stall
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.initial_timeout = initial_timeout
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.lag_limit = lag_limit
+        self.check_interval = check_interval
+        self.gaps = deque(maxlen=window)
+        self.durations = deque(maxlen=100)  # 最近的停滞时长（秒）
+        self.stalls = 0
+        self.frames = 0
+        self.lag = 0.0
+        self._threshold = initial_timeout
+        self._last_frame = None
+        self._stalled_at = None
+        self._offsets = deque()  # (本地时间, 本地时间 - Response.now)，单调递增
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def observe(self, server_now_ms=None):
+        """
+        每收到一帧调用一次
+        :param server_now_ms: Response.now，未解析时为 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            if self._last_frame is not None and self._stalled_at is None:
+                self.gaps.append(now - self._last_frame)
+                if len(self.gaps) >= self.min_samples and self.frames % 10 == 0:
+                    self._threshold = self._compute_threshold()
+            if self._stalled_at is not None:
+                duration = now - self._stalled_at
+                self.durations.append(duration)
+                print(f"【数据恢复】停滞 {duration:.1f} 秒", file=status_file())
+                self._stalled_at = None
+            self._last_frame = now
+            if server_now_ms:
+                self._update_lag(now, time.time() - server_now_ms / 1000)
+
+    def reset(self):
+        """
+        连接建立时调用，重新开始计时（保留已学习的间隔分布）；因停滞重连时记录本次停滞时长，新连接同样停滞时可以再次检测到
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._stalled_at is not None:
+                self.durations.append(now - self._stalled_at)
+                self._stalled_at = None
+            self._last_frame = now
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    def _compute_threshold(self):
+        gaps = sorted(self.gaps)
+        p99 = gaps[min(len(gaps) - 1, int(len(gaps) * 0.99))]
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.multiplier))
+
+    def _update_lag(self, now, offset):
+        offsets = self._offsets
+        while offsets and offsets[-1][1] >= offset:
+            offsets.pop()
+        offsets.append((now, offset))
+        while now - offsets[0][0] > 300:
+            offsets.popleft()
+        self.lag = offset - offsets[0][1]
+
+    def check(self):
+        """
+        检查一次是否停滞
+        :return: 停滞原因，未停滞时为 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_frame is None or self._stalled_at is not None:
+                return None
+            idle = now - self._last_frame
+            if idle > self._threshold:
+                reason = f"{idle:.1f} 秒未收到数据（阈值 {self._threshold:.1f} 秒）"
+            elif self.lag > self.lag_limit:
+                reason = f"服务端数据延迟 {self.lag:.1f} 秒"
+                self._offsets.clear()
+                self.lag = 0.0
+            else:
+                return None
+            self.stalls += 1
+            self._stalled_at = self._last_frame
+            info = {"reason": reason, "idle": idle, "threshold": self._threshold, "stalls": self.stalls}
+        print(f"【停滞检测】{reason}，重新连接", file=status_file())
+        try:
+            self.on_stall(info)
+        except Exception as e:
+            print(f"【停滞检测】重连失败: {e}", file=status_file())
+        return reason
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        with self._lock:
+            idle = time.monotonic() - self._last_frame if self._last_frame is not None else None
+            return {
+                "frames": self.frames,
+                "threshold": round(self._threshold, 2),
+                "idle": round(idle, 2) if idle is not None else None,
+                "lag": round(self.lag, 2),
+                "stalls": self.stalls,
+                "stall_durations": [round(d, 2) for d in self.durations],
+            }
+
+    def _run(self):
+        while not self._stopped.wait(self.check_interval):
+            self.check()
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    state_tracker.py
+# @Project:     douyinLiveWebFetcher
+
+import hashlib
+
+from protobuf.douyin import RoomMessage, RoomRankMessage, RoomStatsMessage
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def payload_digest(payload, skip_fields=(1,)):
+    """
+    按顶层字段计算 payload 的哈希，跳过 skip_fields（默认跳过 common：msg_id、create_time 每条都不同）
+    :return: 16 字节摘要
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    data = memoryview(payload)
+    pos = 0
+    end = len(data)
+    while pos < end:
+        start = pos
+        tag, pos = _read_varint(data, pos)
+        wire_type = tag & 0x7
+        if wire_type == 0:
+            _, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            pos += length
+        elif wire_type == 5:
+            pos += 4
+        else:
+            # 不认识的 wire type，整段参与哈希
+            digest.update(data[start:])
+            break
+        if tag >> 3 not in skip_fields:
+            digest.update(data[start:pos])
+    return digest.digest()
+
+
+def _rank_entries(message):
+    entries = {}
+    for index, rank in enumerate(message.ranks_list, 1):
+        user = rank.user
+        key = user.id or f"#{index}"
+        entries[key] = (index, user.nick_name, rank.score_str)
+    return entries
+
+
+def diff_rank(old, new):
+    """
+    排行榜差异：entered 新上榜、left 离开、moved 名次变化、score 名次不变但贡献值变化
+    """
+    before = _rank_entries(old)
+    after = _rank_entries(new)
+    changes = []
+    for key, (rank, name, score) in after.items():
+        previous = before.get(key)
+        user_id = key if isinstance(key, int) else None
+        if previous is None:
+            changes.append({"change": "entered", "user_id": user_id, "user_name": name, "rank": rank, "score": score})
+        elif previous[0] != rank:
+            changes.append({"change": "moved", "user_id": user_id, "user_name": name, "from": previous[0],
+                            "to": rank, "score": score})
+        elif previous[2] != score:
+            changes.append({"change": "score", "user_id": user_id, "user_name": name, "rank": rank,
+                            "from": previous[2], "to": score})
+    for key, (rank, name, _) in before.items():
+        if key not in after:
+            changes.append({"change": "left", "user_id": key if isinstance(key, int) else None,
+                            "user_name": name, "rank": rank})
+    return changes
+
+
+def field_differ(*fields):
+    """
+    按字段比较的差异函数
+    """
+    def diff(old, new):
+        changes = []
+        for field in fields:
+            before, after = getattr(old, field), getattr(new, field)
+            if before != after:
+                changes.append({"change": "field", "field": field, "from": before, "to": after})
+        return changes
+    return diff
+
+
+class StateType:
+    __slots__ = ("message_class", "skip_fields", "diff", "label")
+
+    def __init__(self, message_class, diff, skip_fields=(1,), label=""):
+        self.message_class = message_class
+        self.diff = diff
+        self.skip_fields = skip_fields
+        self.label = label
+
+
+# 状态类消息：每条都是完整快照，只有内容变化才有意义
+STATE_TYPES = {
+    "WebcastRoomRankMessage": StateType(RoomRankMessage, diff_rank, label="排行榜"),
+    # display_version 每次推送都会递增，不参与比较
+    "WebcastRoomStatsMessage": StateType(
+        RoomStatsMessage,
+        field_differ("display_short", "display_middle", "display_long", "display_value", "total", "is_hidden"),
+        skip_fields=(1, 6), label="直播间统计"),
+    "WebcastRoomMessage": StateType(
+        RoomMessage, field_differ("content", "roommessagetype", "system_top_msg", "biz_scene"), label="直播间"),
+}
+
+
+class _Snapshot:
+    __slots__ = ("digest", "message")
+
+    def __init__(self, digest, message):
+        self.digest = digest
+        self.message = message
+
+
+class StateTracker:
+    """
+    按直播间保存状态类消息的最新快照，新快照先比较 payload 哈希（相同则不解析），
+    哈希不同再解析并逐字段比较，只有真正变化时才返回差异。
+    """
+
+    def __init__(self, types=None):
+        self.types = STATE_TYPES if types is None else types
+        self._snapshots = {}  # (room_id, 消息类型) -> _Snapshot
+        self._stats = {method: {"snapshots": 0, "same_payload": 0, "same_fields": 0, "changed": 0}
+                       for method in self.types}
+
+    def update(self, room_id, method, payload):
+        """
+        :return: (最新快照, 差异列表)；首次出现时差异为 None；内容未变化时差异为 []，
+                 其中 payload 完全相同的快照不会被解析，返回的是上一次的消息
+        """
+        state_type = self.types[method]
+        stats = self._stats[method]
+        stats["snapshots"] += 1
+        key = (room_id, method)
+        digest = payload_digest(payload, state_type.skip_fields)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.digest == digest:
+            stats["same_payload"] += 1
+            return snapshot.message, []
+
+        message = state_type.message_class().parse(payload)
+        if snapshot is None:
+            self._snapshots[key] = _Snapshot(digest, message)
+            stats["changed"] += 1
+            return message, None
+        changes = state_type.diff(snapshot.message, message)
+        snapshot.digest = digest
+        snapshot.message = message
+        stats["changed" if changes else "same_fields"] += 1
+        return message, changes
+
+    def get(self, room_id, method):
+        snapshot = self._snapshots.get((room_id, method))
+        return snapshot.message if snapshot is not None else None
+
+    def reset(self, room_id=None):
+        if room_id is None:
+            self._snapshots.clear()
+            return
+        for key in [k for k in self._snapshots if k[0] == room_id]:
+            del self._snapshots[key]
+
+    def restore(self, room_id, messages):
+        """
+        从检查点恢复快照，:param messages: {消息类型: 消息}
+        """
+        for method, message in messages.items():
+            state_type = self.types.get(method)
+            if state_type is not None:
+                digest = payload_digest(bytes(message), state_type.skip_fields)
+                self._snapshots[(room_id, method)] = _Snapshot(digest, message)
+
+    def stats(self):
+        return {method: dict(stats) for method, stats in self._stats.items()}
+
+
+def format_changes(method, changes):
+    """
+    :return: 控制台输出的一行差异摘要
+    """
+    parts = []
+    for c in changes:
+        kind = c["change"]
+        if kind == "entered":
+            parts.append(f"{c['user_name']} 上榜第{c['rank']}名({c['score']})")
+        elif kind == "left":
+            parts.append(f"{c['user_name']} 离榜(原第{c['rank']}名)")
+        elif kind == "moved":
+            parts.append(f"{c['user_name']} 第{c['from']}→{c['to']}名({c['score']})")
+        elif kind == "score":
+            parts.append(f"{c['user_name']} {c['from']}→{c['to']}")
+        else:
+            parts.append(f"{c['field']}: {c['from']} → {c['to']}")
+    label = STATE_TYPES[method].label if method in STATE_TYPES else method
+    return f"【{label}变化】" + "，".join(parts)
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    templates.py
+# @Project:     douyinLiveWebFetcher
+
+import operator
+import string
+
+from betterproto import serialized_on_wire
+
+ANONYMOUS_USER_ID = 111111
+
+
+# betterproto 消息的真值判断会逐个字段与默认值比较，开销很大，这里只检查字段是否出现在数据中
+def _fans_club(m):
+    data = m.user.fans_club.data
+    return data.level if serialized_on_wire(data) else None
+
+
+def _pay_grade(m):
+    pay_grade = m.user.pay_grade
+    return pay_grade.level if serialized_on_wire(pay_grade) else None
+
+
+def _gender(m):
+    return {0: "女", 1: "男"}.get(m.user.gender, "未知")
+
+
+def _user_id_tag(m):
+    user_id = m.user.id
+    return "" if user_id == ANONYMOUS_USER_ID else f"[{user_id}]"
+
+
+def _ranks(m):
+    return " ".join(f"{index}.{rank.user.nick_name}({rank.score_str})" for index, rank in enumerate(m.ranks_list, 1))
+
+
+# 模板中可用的派生字段，其余字段名按消息属性读取，支持 user.nick_name 这样的点号路径
+FIELDS = {
+    "user_name": operator.attrgetter("user.nick_name"),
+    "user_id": operator.attrgetter("user.id"),
+    "user_id_tag": _user_id_tag,
+    "gender": _gender,
+    "fans_club": _fans_club,
+    "pay_grade": _pay_grade,
+    "gift_name": operator.attrgetter("gift.name"),
+    "gift_count": operator.attrgetter("combo_count"),
+    "gift_value": lambda m: m.gift.diamond_count * m.combo_count,
+    "room_id": operator.attrgetter("common.room_id"),
+    "ranks": _ranks,
+}
+
+# 未在配置中指定 template 时使用的默认模板
+DEFAULT_TEMPLATES = {
+    "WebcastLikeMessage": "【点赞msg】{user_name} 点了{count}个赞",
+    "WebcastMemberMessage": "【进场msg】{user_id_tag}[{gender}]{user_name} 进入了直播间",
+    "WebcastSocialMessage": "【关注msg】[{user_id}]{user_name} 关注了主播",
+    "WebcastRoomUserSeqMessage": "【统计msg】当前观看人数: {total}, 累计观看人数: {total_pv}",
+    "WebcastFansclubMessage": "【粉丝团msg】 {content}",
+    "WebcastEmojiChatMessage": "【聊天表情包id】 {emoji_id},user：{user_name},default_content:{default_content}",
+    "WebcastRoomMessage": "【直播间msg】直播间id:{room_id}",
+    "WebcastRoomStatsMessage": "【直播间统计msg】{display_long}",
+    "WebcastRoomRankMessage": "【直播间排行榜msg】{ranks}",
+    "WebcastRoomStreamAdaptationMessage": "直播间adaptation: {adaptation_type}",
+}
+
+
+def default_template(msg_type, cfg):
+    """
+    默认模板，聊天和礼物消息根据 show_* 开关生成
+    """
+    if msg_type == "WebcastChatMessage":
+        parts = []
+        if cfg.get("show_fans_club", True):
+            parts.append("[{fans_club}]")
+        if cfg.get("show_pay_grade", True):
+            parts.append("[{pay_grade}]")
+        parts.append("{user_id_tag}{user_name}" if cfg.get("show_user_id", True) else "{user_name}")
+        return "【聊天msg】" + " ".join(parts) + ": {content}"
+    if msg_type == "WebcastGiftMessage":
+        value = " (价值: {gift_value})" if cfg.get("show_gift_value", True) else " "
+        return "【礼物msg】[{fans_club}] [{pay_grade}]|{user_name} 送出了 {gift_name}x{gift_count}" + value
+    return DEFAULT_TEMPLATES.get(msg_type)
+
+
+def compile_template(template, fields=None):
+    """
+    将模板编译成格式化函数，只读取模板中引用到的字段
+    :param template: str.format 语法的模板，例如 "【聊天msg】{user_name}: {content}"
+    :param fields: 额外的派生字段 {名称: 函数(message)}，优先于 FIELDS
+    :return: 函数(message) -> str
+    """
+    getters = dict(FIELDS)
+    if fields:
+        getters.update(fields)
+
+    namespace = {"format": format, "str": str}
+    pieces = []
+    for index, (literal, name, spec, conversion) in enumerate(string.Formatter().parse(template)):
+        if literal:
+            namespace[f"L{index}"] = literal
+            pieces.append(f"L{index}")
+        if name is None:
+            continue
+        if not name:
+            raise ValueError(f"模板中不支持位置参数: {template}")
+        namespace[f"G{index}"] = getters.get(name) or operator.attrgetter(name)
+        value = f"G{index}(m)"
+        if conversion == "r":
+            value = f"repr({value})"
+            namespace["repr"] = repr
+        elif conversion == "a":
+            value = f"ascii({value})"
+            namespace["ascii"] = ascii
+        if spec:
+            namespace[f"S{index}"] = spec
+            pieces.append(f"format({value}, S{index})")
+        else:
+            pieces.append(f"str({value})")
+
+    if not pieces:
+        source = "def render(m):\n    return ''\n"
+    elif len(pieces) == 1:
+        source = f"def render(m):\n    return {pieces[0]}\n"
+    else:
+        source = f"def render(m):\n    return ''.join(({', '.join(pieces)},))\n"
+    exec(compile(source, f"<template {template!r}>", "exec"), namespace)
+    render = namespace["render"]
+    render.template = template
+    return render
+
+
+def compile_templates(handler_config, fields=None):
+    """
+    根据 message_handlers.yml 为每种消息类型编译模板
+    :return: {消息类型: 格式化函数}
+    """
+    formatters = {}
+    for msg_type, cfg in handler_config.items():
+        if not isinstance(cfg, dict) or "handler" not in cfg:
+            continue
+        template = cfg.get("template") or default_template(msg_type, cfg)
+        if template:
+            formatters[msg_type] = compile_template(template, fields)
+    return formatters
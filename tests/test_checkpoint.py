@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_checkpoint.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import WAL_HEADER, Checkpointer
+from protobuf.douyin import GiftMessage, GiftStruct, User
+
+
+def gift(user_id, diamonds):
+    return GiftMessage(user=User(id=user_id, nick_name=f"用户{user_id}"), gift=GiftStruct(diamond_count=diamonds),
+                       combo_count=1)
+
+
+def read_wal(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    records, pos = [], 0
+    while pos < len(data):
+        length, _ = WAL_HEADER.unpack_from(data, pos)
+        records.append(json.loads(data[pos + WAL_HEADER.size:pos + WAL_HEADER.size + length]))
+        pos += WAL_HEADER.size + length
+    return records
+
+
+class CheckpointRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def _open(self):
+        checkpoint = Checkpointer(self.folder, 1, snapshot_interval=3600, flush_interval=3600)
+        checkpoint.recover()
+        checkpoint.start()
+        return checkpoint
+
+    def _crash(self, checkpoint):
+        """
+        模拟进程退出：停止后台线程，不写最后的快照
+        """
+        checkpoint._stopped.set()
+        checkpoint._thread.join()
+        checkpoint._wal.close()
+
+    def _write(self, checkpoint, *gifts):
+        for user_id, diamonds in gifts:
+            checkpoint.observe("WebcastGiftMessage", gift(user_id, diamonds))
+        checkpoint.flush()
+
+    def test_truncated_wal_record(self):
+        checkpoint = self._open()
+        self._write(checkpoint, (1, 10), (2, 5))
+        self._write(checkpoint, (1, 100))
+        self._crash(checkpoint)
+        wal_path = checkpoint.wal_path
+        size = os.path.getsize(wal_path)
+        # 第二条记录只写了一半
+        with open(wal_path, "r+b") as f:
+            f.truncate(size - 5)
+
+        recovered = Checkpointer(self.folder, 1)
+        aggregates = recovered.recover()
+        self.assertEqual(aggregates.total_diamonds, 15)
+        self.assertEqual(aggregates.gifts, 2)
+        self.assertEqual(aggregates.top(), [("1", "用户1", 10), ("2", "用户2", 5)])
+        self.assertEqual(recovered.recovery["replayed"], 1)
+        self.assertEqual(len(read_wal(wal_path)), 1)
+
+    def test_skips_records_in_snapshot(self):
+        checkpoint = self._open()
+        self._write(checkpoint, (1, 10))
+        self._write(checkpoint, (2, 20))
+        with open(checkpoint.wal_path, "rb") as f:
+            covered = f.read()
+        checkpoint.snapshot()
+        self._write(checkpoint, (3, 30))
+        self._crash(checkpoint)
+        # 模拟快照写入后、清空 WAL 前崩溃：WAL 中仍有快照已包含的记录
+        with open(checkpoint.wal_path, "rb") as f:
+            tail = f.read()
+        with open(checkpoint.wal_path, "wb") as f:
+            f.write(covered + tail)
+
+        recovered = Checkpointer(self.folder, 1)
+        aggregates = recovered.recover()
+        self.assertEqual(aggregates.total_diamonds, 60)
+        self.assertEqual(aggregates.gifts, 3)
+        self.assertEqual(recovered.recovery["snapshot_seq"], 2)
+        self.assertEqual(recovered.recovery["replayed"], 1)
+
+    def test_seq_continues_after_recovery(self):
+        checkpoint = self._open()
+        self._write(checkpoint, (1, 10))
+        self._write(checkpoint, (2, 20))
+        self._crash(checkpoint)
+
+        checkpoint = self._open()
+        self.assertEqual(checkpoint.aggregates.seq, 2)
+        self._write(checkpoint, (3, 30))
+        self.assertEqual([record["seq"] for record in read_wal(checkpoint.wal_path)], [1, 2, 3])
+        self._crash(checkpoint)
+
+        recovered = Checkpointer(self.folder, 1)
+        aggregates = recovered.recover()
+        self.assertEqual(aggregates.seq, 3)
+        self.assertEqual(aggregates.total_diamonds, 60)
+        self.assertEqual(recovered.recovery["replayed"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
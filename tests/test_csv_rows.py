@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_csv_rows.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import liveMan
+from protobuf.douyin import (ChatMessage, FansClub, FansClubData, GiftMessage, GiftStruct, MemberMessage, PayGrade,
+                             User)
+
+
+class CsvRowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.fetcher = liveMan.DouyinLiveWebFetcher("1", config_path=os.path.join(ROOT, "message_handlers.yml"),
+                                                    room_id="1", log_folder=self.folder)
+        self.addCleanup(self.fetcher.close)
+        self.fetcher.include_timestamp = False
+        self.logged = []
+        self.fetcher.log_message = lambda name, headers, row: self.logged.append((name, headers, row))
+        self.user = User(id=7, nick_name="小明", fans_club=FansClub(data=FansClubData(level=3)),
+                         pay_grade=PayGrade(level=12))
+
+    def _configure(self, msg_type, **cfg):
+        self.fetcher.update_handlers({msg_type: dict(cfg, log_to_csv=True)})
+
+    def test_chat_row_follows_show_flags(self):
+        self._configure("WebcastChatMessage", show_user_id=False, show_fans_club=True, show_pay_grade=False)
+        # 行函数在加载配置时生成，处理消息时不再读取配置
+        self.fetcher.handler_config = {}
+        self.fetcher._parseChatMsg(bytes(ChatMessage(user=self.user, content="你好")))
+        self.assertEqual(self.logged, [("chat_log", liveMan.CSV_HEADERS["chat_log"], ["", "", "小明", 3, "", "你好"])])
+
+    def test_csv_disabled_at_runtime(self):
+        self._configure("WebcastChatMessage", show_user_id=True, show_fans_club=True, show_pay_grade=True)
+        self.fetcher._parseChatMsg(bytes(ChatMessage(user=self.user, content="1")))
+        self.fetcher.update_handlers({"WebcastChatMessage": {"log_to_csv": False}})
+        self.fetcher._parseChatMsg(bytes(ChatMessage(user=self.user, content="2")))
+        self.assertEqual([row[-1] for _, _, row in self.logged], ["1"])
+        self.assertEqual(self.logged[0][2], ["", 7, "小明", 3, 12, "1"])
+
+    def test_gift_and_member_rows(self):
+        self._configure("WebcastGiftMessage", show_gift_value=False)
+        self._configure("WebcastMemberMessage")
+        gift = GiftMessage(user=self.user, gift_id=5, combo_count=2, gift=GiftStruct(id=5, name="玫瑰", diamond_count=1))
+        self.fetcher._parseGiftMsg(bytes(gift))
+        self.fetcher._parseMemberMsg(bytes(MemberMessage(user=User(id=8, nick_name="小红", gender=0))))
+        self.assertEqual(self.logged, [
+            ("gift_log", liveMan.CSV_HEADERS["gift_log"], ["", "小明", "玫瑰", 2, "", 3, 12, 7, 5]),
+            ("member_log", liveMan.CSV_HEADERS["member_log"], ["", 8, "小红", "女"]),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
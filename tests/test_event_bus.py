@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_event_bus.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_bus import EventBus
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def free_slots(sub):
+    """
+    取走并归还全部可用名额，返回可用名额数
+    """
+    count = 0
+    while sub._slots.acquire(blocking=False):
+        count += 1
+    for _ in range(count):
+        sub._slots.release()
+    return count
+
+
+class ExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.addCleanup(self.bus.close)
+
+    def test_inline(self):
+        received = []
+        sub = self.bus.subscribe("WebcastChatMessage", received.append)
+        self.assertEqual(self.bus.publish("WebcastChatMessage", 1), 1)
+        self.assertEqual(self.bus.publish("WebcastGiftMessage", 2), 0)
+        self.assertEqual(received, [1])
+        self.assertEqual(sub.stats()["delivered"], 1)
+
+    def test_wildcard(self):
+        received = []
+        self.bus.subscribe("*", received.append)
+        self.bus.publish("WebcastChatMessage", 1)
+        self.bus.publish("WebcastGiftMessage", 2)
+        self.assertEqual(received, [1, 2])
+
+    def test_thread_keeps_order(self):
+        received = []
+        sub = self.bus.subscribe("WebcastChatMessage", received.append, executor="thread")
+        for i in range(200):
+            self.bus.publish("WebcastChatMessage", i)
+        self.assertTrue(wait_until(lambda: len(received) == 200))
+        self.assertEqual(received, list(range(200)))
+        self.assertTrue(wait_until(lambda: sub.stats()["delivered"] == 200))
+
+    def test_async(self):
+        received = []
+
+        async def callback(event):
+            received.append((event, threading.current_thread().name))
+
+        sub = self.bus.subscribe("WebcastChatMessage", callback)
+        self.assertEqual(sub.executor, "async")
+        for i in range(5):
+            self.bus.publish("WebcastChatMessage", i)
+        self.assertTrue(wait_until(lambda: len(received) == 5))
+        self.assertEqual([event for event, _ in received], list(range(5)))
+        self.assertEqual({name for _, name in received}, {"event-bus-loop"})
+
+    def test_errors_counted(self):
+        def callback(event):
+            raise ValueError(event)
+
+        sub = self.bus.subscribe("WebcastChatMessage", callback)
+        self.bus.publish("WebcastChatMessage", 1)
+        stats = sub.stats()
+        self.assertEqual((stats["delivered"], stats["errors"]), (1, 1))
+        self.assertIn("ValueError", stats["last_error"])
+
+    def test_concurrent_publishers_counted(self):
+        sub = self.bus.subscribe("WebcastChatMessage", lambda event: None)
+
+        def publish():
+            for i in range(2000):
+                self.bus.publish("WebcastChatMessage", i)
+
+        threads = [threading.Thread(target=publish) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sub.stats()["delivered"], 8000)
+
+
+class PolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.addCleanup(self.bus.close)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.received = []
+
+    def _slow(self, event):
+        self.release.wait(2)
+        self.received.append(event)
+
+    def test_drop_when_full(self):
+        sub = self.bus.subscribe("WebcastChatMessage", self._slow, executor="thread", queue_size=2, policy="drop")
+        results = [self.bus.publish("WebcastChatMessage", i) for i in range(5)]
+        # 队列只能容纳 2 条，其余丢弃，不阻塞发布方
+        self.assertEqual(results, [1, 1, 0, 0, 0])
+        self.assertEqual(sub.stats()["dropped"], 3)
+        self.release.set()
+        self.assertTrue(wait_until(lambda: len(self.received) == 2))
+        self.assertTrue(wait_until(lambda: free_slots(sub) == 2))
+
+    def test_block_when_full(self):
+        sub = self.bus.subscribe("WebcastChatMessage", self._slow, executor="thread", queue_size=1, policy="block")
+        self.bus.publish("WebcastChatMessage", 0)
+        publisher = threading.Thread(target=self.bus.publish, args=("WebcastChatMessage", 1))
+        publisher.start()
+        publisher.join(0.2)
+        self.assertTrue(publisher.is_alive())
+        self.release.set()
+        publisher.join(2)
+        self.assertFalse(publisher.is_alive())
+        self.assertTrue(wait_until(lambda: self.received == [0, 1]))
+        self.assertEqual(sub.stats()["dropped"], 0)
+
+    def test_unsubscribe_releases_queued_slots(self):
+        sub = self.bus.subscribe("WebcastChatMessage", self._slow, executor="thread", queue_size=3, policy="block")
+        for i in range(3):
+            self.bus.publish("WebcastChatMessage", i)
+        # 第一条正在处理，其余两条仍在队列中
+        self.assertTrue(wait_until(lambda: len(sub._pending) == 2))
+        publisher = threading.Thread(target=self.bus.publish, args=("WebcastChatMessage", 3))
+        publisher.start()
+        self.bus.unsubscribe(sub)
+        publisher.join(2)
+        self.assertFalse(publisher.is_alive())
+        self.assertEqual(sub.stats()["dropped"], 2)
+        self.release.set()
+        self.assertTrue(wait_until(lambda: free_slots(sub) == 3))
+        self.assertEqual(self.received, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_fanout.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fanout import UnixSocketPublisher, iter_frames
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class UnixSocketPublisherTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self.path = os.path.join(folder, "fanout.sock")
+        self.publisher = UnixSocketPublisher(self.path, batch_interval=0.001)
+        self.addCleanup(self.publisher.close)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        self.addCleanup(sock.close)
+        self.assertTrue(wait_until(lambda: self.publisher.subscriber_count == 1))
+        return sock
+
+    def test_delivers_frames(self):
+        sock = self._connect()
+        for i in range(3):
+            self.publisher.publish({"seq": i})
+        frames = iter_frames(sock)
+        self.assertEqual([next(frames)["seq"] for _ in range(3)], [0, 1, 2])
+
+    def test_subscriber_writes_do_not_spin(self):
+        sock = self._connect()
+        sock.sendall(b"hello")
+        time.sleep(0.1)
+        started = time.process_time()
+        time.sleep(0.5)
+        # 订阅端写入的数据被读出丢弃，发布线程不会因为 select 一直可读而空转
+        self.assertLess(time.process_time() - started, 0.25)
+        self.assertEqual(self.publisher.subscriber_count, 1)
+        self.publisher.publish({"seq": 1})
+        self.assertEqual(next(iter_frames(sock))["seq"], 1)
+
+    def test_closed_subscriber_removed(self):
+        sock = self._connect()
+        sock.close()
+        self.assertTrue(wait_until(lambda: self.publisher.subscriber_count == 0))
+        self.assertEqual(self.publisher.dropped_subscribers, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_fetch_transport.py
+# @Project:     douyinLiveWebFetcher
+
+import gzip
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetch_transport import FetchPoller
+from protobuf.douyin import Message, Response
+from signer_pool import create_signer_pool
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    /webcast/im/fetch/ 桩：按顺序返回 server.replies 中的 (状态码, Response)，记录每次请求的参数
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(parse_qs(urlparse(self.path).query, keep_blank_values=True))
+        status, response = server.replies.pop(0) if server.replies else (200, Response())
+        body = gzip.compress(bytes(response)) if status == 200 else b"error"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Identity:
+    def __init__(self, name):
+        self.name = name
+        self.device_id = f"device-{name}"
+        self.session = requests.Session()
+
+
+class SignerPool:
+    def __init__(self):
+        self.identities = [Identity("a"), Identity("b")]
+        self.records = []
+
+    def record(self, identity, kind, ok, elapsed, error=None):
+        self.records.append((identity.name, kind, ok))
+
+    def pick(self, exclude=()):
+        return next(i for i in self.identities if i not in exclude)
+
+
+class StubFetcher:
+    """
+    FetchPoller 用到的 DouyinLiveWebFetcher 属性
+    """
+
+    def __init__(self, live_url, max_retries=3):
+        self.live_url = live_url
+        self.live_id = "123"
+        self.room_id = "7392091211001140287"
+        self.user_agent = "test"
+        self.ttwid = "ttwid"
+        self.signer_pool = SignerPool()
+        self.identity = self.signer_pool.identities[0]
+        self.retry_on_failure = True
+        self.max_retries = max_retries
+        self.retry_delay_seconds = 0
+        self.dispatched = []
+        self.poller = None
+
+    @property
+    def session(self):
+        return self.identity.session
+
+    def get_a_bogus(self, params):
+        return "signed"
+
+    def _dispatchResponse(self, response):
+        self.dispatched.append(response)
+        if len(self.dispatched) >= 3:
+            self.poller.stop()
+
+
+def chat(i):
+    return Message(method="WebcastChatMessage", msg_id=i, payload=b"")
+
+
+class FetchPollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.requests = []
+        self.server.replies = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.fetcher = StubFetcher(f"http://127.0.0.1:{self.server.server_address[1]}/")
+        self.poller = self.fetcher.poller = FetchPoller(self.fetcher, min_interval=0.01, max_interval=0.05)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cursor_and_dispatch(self):
+        self.server.replies = [
+            (200, Response(messages_list=[chat(1), chat(2)], cursor="c1", internal_ext="ext1", fetch_interval=10)),
+            (200, Response(messages_list=[chat(3)], cursor="c2", internal_ext="ext2", fetch_interval=10)),
+            (200, Response(cursor="c3", fetch_interval=10)),
+        ]
+        self.poller.run()
+        sent = self.server.requests
+        self.assertEqual(len(sent), 3)
+        self.assertEqual([r["cursor"][0] for r in sent], ["", "c1", "c2"])
+        self.assertEqual([r["internal_ext"][0] for r in sent], ["", "ext1", "ext2"])
+        self.assertEqual(sent[0]["a_bogus"], ["signed"])
+        self.assertEqual(sent[0]["room_id"], [self.fetcher.room_id])
+        self.assertEqual([len(r.messages_list) for r in self.fetcher.dispatched], [2, 1, 0])
+        self.assertEqual(self.poller.cursor, "c3")
+        self.assertEqual(self.poller.messages, 3)
+
+    def test_fetch_interval(self):
+        self.assertEqual(self.poller.next_interval(Response(fetch_interval=20)), 0.02)
+        # 限制在 [min_interval, max_interval]
+        self.assertEqual(self.poller.next_interval(Response(fetch_interval=1)), 0.01)
+        self.assertEqual(self.poller.next_interval(Response(fetch_interval=60000)), 0.05)
+        self.assertEqual(self.poller.next_interval(Response()), self.poller.default_interval)
+
+    def test_retry_switches_identity(self):
+        self.server.replies = [
+            (500, None),
+            (200, Response(cursor="c1", fetch_interval=10)),
+            (200, Response(cursor="c2", fetch_interval=10)),
+            (200, Response(cursor="c3", fetch_interval=10)),
+        ]
+        self.poller.run()
+        self.assertEqual(len(self.fetcher.dispatched), 3)
+        self.assertEqual(self.fetcher.signer_pool.records[0], ("a", "fetch", False))
+        self.assertEqual(self.fetcher.identity.name, "b")
+        self.assertEqual(self.server.requests[1]["user_unique_id"], ["device-b"])
+        # 失败的请求不改变 cursor
+        self.assertEqual([r["cursor"][0] for r in self.server.requests], ["", "", "c1", "c2"])
+
+    def test_gives_up_after_max_retries(self):
+        self.server.replies = [(500, None)] * 5
+        self.poller.run()
+        self.assertEqual(len(self.server.requests), self.fetcher.max_retries)
+        self.assertEqual(self.fetcher.dispatched, [])
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def test_adapters_mounted_once_per_identity(self):
+        fetcher = StubFetcher("http://127.0.0.1/")
+        fetcher.signer_pool = create_signer_pool({"size": 2, "connection_pool_size": 3})
+        adapters = [identity.session.get_adapter("https://live.douyin.com/")
+                    for identity in fetcher.signer_pool.identities]
+        self.assertTrue(all(adapter._pool_maxsize == 3 for adapter in adapters))
+        # 新建轮询器复用身份已有的连接池，不会重新挂载
+        FetchPoller(fetcher)
+        FetchPoller(fetcher)
+        self.assertEqual([identity.session.get_adapter("https://live.douyin.com/")
+                          for identity in fetcher.signer_pool.identities], adapters)
+
+
+if __name__ == "__main__":
+    unittest.main()
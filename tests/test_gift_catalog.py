@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_gift_catalog.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gift_catalog import GiftCatalog
+from protobuf.douyin import GiftMessage, GiftStruct, Text, User
+
+
+class GiftCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, "gift_catalog.json")
+        self.catalog = GiftCatalog(self.path, save_interval=0)
+        self.addCleanup(self.catalog.close)
+
+    def test_parse_full_gift_message(self):
+        original = GiftMessage(gift_id=5, combo_count=3, user=User(id=1, nick_name="用户"),
+                               gift=GiftStruct(id=5, name="玫瑰", diamond_count=1),
+                               income_taskgifts=7, room_fan_ticket_count=9, tray_display_text=Text(key="tray"))
+        first, changed = self.catalog.parse_message(bytes(original))
+        second, changed_again = self.catalog.parse_message(bytes(original))
+        self.assertIs(type(first), GiftMessage)
+        self.assertEqual(first.to_dict(), original.to_dict())
+        self.assertEqual(bytes(first), bytes(original))
+        self.assertEqual((changed, changed_again), (True, False))
+        # 相同的 GiftStruct 只解析一次
+        self.assertIs(second.gift, first.gift)
+        self.assertEqual(self.catalog.stats()["decoded"], 1)
+
+    def test_price_change(self):
+        self.catalog.parse_message(bytes(GiftMessage(gift_id=5, gift=GiftStruct(id=5, name="玫瑰", diamond_count=1))))
+        message, changed = self.catalog.parse_message(
+            bytes(GiftMessage(gift_id=5, gift=GiftStruct(id=5, name="玫瑰", diamond_count=2))))
+        self.assertTrue(changed)
+        self.assertEqual(message.gift.diamond_count, 2)
+        self.assertEqual([h[2] for h in self.catalog.get(5).history], [1, 2])
+
+    def test_save_on_close(self):
+        self.catalog.parse_message(bytes(GiftMessage(gift_id=5, gift=GiftStruct(id=5, name="玫瑰"))))
+        self.assertFalse(os.path.exists(self.path))  # 消息处理时不写文件
+        self.catalog.close()
+        self.assertEqual(json.load(open(self.path, encoding="utf-8"))["5"]["name"], "玫瑰")
+        self.assertEqual(GiftCatalog(self.path, save_interval=0).name(5), "玫瑰")
+
+    def test_concurrent_saves(self):
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(30):
+                    self.catalog.observe(n * 100 + i, GiftStruct(id=n * 100 + i, name=f"礼物{n}-{i}"))
+                    self.catalog.save()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(json.load(open(self.path, encoding="utf-8"))), 120)
+        self.assertEqual(os.listdir(self.folder), ["gift_catalog.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
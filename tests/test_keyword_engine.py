@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_keyword_engine.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keyword_engine
+from keyword_engine import Automaton, Normalizer
+
+# 测试环境不一定安装了 pypinyin，用固定的读音表代替
+PINYIN = {"爱": "ai", "白": "bai", "菜": "cai", "好": "hao", "吃": "chi", "微": "wei", "威": "wei", "信": "xin"}
+
+
+def fake_pinyin(text):
+    return [PINYIN.get(ch, ch) for ch in text]
+
+
+class PinyinMatchTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(keyword_engine, "lazy_pinyin", fake_pinyin)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.automaton = Automaton([("爱", "watched"), ("微信", "banned")], Normalizer(pinyin=True))
+
+    def test_no_match_inside_syllable(self):
+        self.assertEqual(self.automaton.search("白菜好吃"), [])
+
+    def test_homophone_match(self):
+        hits = self.automaton.search("加威 信")
+        self.assertEqual([(hit.keyword, hit.start, hit.end) for hit in hits], [("微信", 1, 4)])
+
+    def test_single_syllable_match(self):
+        hits = self.automaton.search("我爱吃白菜")
+        self.assertEqual([hit.keyword for hit in hits], ["爱"])
+
+
+class NormalizerTest(unittest.TestCase):
+
+    def test_fullwidth_and_symbols(self):
+        self.assertEqual(Normalizer().normalize("ＶＸ：ａｂ ㎏"), "vxabkg")
+
+
+if __name__ == "__main__":
+    unittest.main()
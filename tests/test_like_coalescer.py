@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_like_coalescer.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import liveMan
+from like_coalescer import LikeCoalescer, LikeSummary
+from protobuf.douyin import Common, LikeMessage, Message, Response, User
+
+
+class CoalescedLikeDispatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.fetcher = liveMan.DouyinLiveWebFetcher("1", config_path=os.path.join(ROOT, "message_handlers.yml"),
+                                                    room_id="1", log_folder=self.folder)
+        self.addCleanup(self.fetcher.close)
+        self.fetcher.like_coalescer = LikeCoalescer(self.fetcher._onLikeSummary, window_seconds=60)
+        self.likes = []
+        self.fetcher.on("WebcastLikeMessage", self.likes.append)
+
+    def _response(self, *likes):
+        messages = [Message(method="WebcastLikeMessage", payload=bytes(
+            LikeMessage(common=Common(room_id=1), user=User(id=user_id, nick_name=f"用户{user_id}"),
+                        count=count, total=total)))
+            for user_id, count, total in likes]
+        return Response(messages_list=messages)
+
+    def test_only_summaries_published(self):
+        self.fetcher._dispatchResponse(self._response((1, 3, 10), (1, 2, 12), (2, 5, 17)))
+        # 窗口结束前原始点赞不进入事件总线
+        self.assertEqual(self.likes, [])
+        self.fetcher.like_coalescer.flush()
+        self.assertEqual(len(self.likes), 2)
+        self.assertTrue(all(isinstance(like, LikeSummary) for like in self.likes))
+        counts = {like.user.id: like.count for like in self.likes}
+        self.assertEqual(counts, {1: 5, 2: 5})
+
+    def test_uncoalesced_likes_published_individually(self):
+        self.fetcher.like_coalescer = None
+        self.fetcher._dispatchResponse(self._response((1, 3, 10), (1, 2, 12)))
+        self.assertEqual(len(self.likes), 2)
+        self.assertTrue(all(isinstance(like, LikeMessage) for like in self.likes))
+
+
+if __name__ == "__main__":
+    unittest.main()
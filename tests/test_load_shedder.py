@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_load_shedder.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import load_shedder
+from load_shedder import LoadShedder
+
+
+class FakeClock:
+    """
+    替代 load_shedder 中的 time 模块，本地时钟比服务端快 clock_skew_ms
+    """
+
+    def __init__(self, clock_skew_ms=500):
+        self.seconds = 1000.0
+        self.clock_skew_ms = clock_skew_ms
+
+    def monotonic(self):
+        return self.seconds
+
+    def time(self):
+        return self.seconds + self.clock_skew_ms / 1000
+
+
+class SustainedLagTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(load_shedder, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shedder = LoadShedder({}, baseline_seconds=60, cooldown_seconds=10)
+
+    def receive(self, lag_ms):
+        """
+        收到一帧：服务端时间比本地接收时间早 lag_ms
+        """
+        server_now = (self.clock.seconds - lag_ms / 1000) * 1000
+        self.shedder.filter(SimpleNamespace(now=server_now, messages_list=[]))
+        self.shedder.record(0.0)
+        self.clock.seconds += 1
+
+    def test_sustained_lag_not_absorbed(self):
+        for _ in range(30):
+            self.receive(0)
+        self.assertEqual(self.shedder.level, 0)
+        # 积压持续的时间超过基线窗口，延迟和级别都保持不变
+        for _ in range(180):
+            self.receive(5000)
+        self.assertAlmostEqual(self.shedder.lag_ms, 5000, delta=1)
+        self.assertEqual(self.shedder.level, 2)
+
+    def test_recovers_after_lag_clears(self):
+        for _ in range(30):
+            self.receive(0)
+        for _ in range(30):
+            self.receive(5000)
+        for _ in range(30):
+            self.receive(0)
+        self.assertAlmostEqual(self.shedder.lag_ms, 0, delta=1)
+        self.assertEqual(self.shedder.level, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
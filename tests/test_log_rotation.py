@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_log_rotation.py
+# @Project:     douyinLiveWebFetcher
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_rotation import LogRotator
+
+OLD_HEADERS = ["timestamp", "user_name", "gift_name"]
+NEW_HEADERS = ["timestamp", "user_name", "gift_name", "user_id", "gift_id"]
+
+
+def read_rows(path):
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        return list(csv.reader(f))
+
+
+class LogRotatorHeaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.legacy = os.path.join(self.folder, f"{datetime.now():%Y-%m-%d}_gift_log.csv")
+
+    def _rotator(self):
+        return LogRotator(self.folder, compression=None)
+
+    def _write_legacy(self, headers):
+        with open(self.legacy, "w", newline="", encoding="utf-8-sig") as f:
+            csv.writer(f).writerows([headers, ["t0", "老用户", "小心心"]])
+
+    def test_legacy_file_with_same_headers_appended(self):
+        self._write_legacy(NEW_HEADERS)
+        rotator = self._rotator()
+        rotator.write("gift_log", NEW_HEADERS, ["t1", "用户", "玫瑰", "1", "2"])
+        rotator.close()
+        self.assertEqual(len(read_rows(self.legacy)), 3)
+
+    def test_legacy_file_with_old_headers_not_appended(self):
+        self._write_legacy(OLD_HEADERS)
+        rotator = self._rotator()
+        rotator.write("gift_log", NEW_HEADERS, ["t1", "用户", "玫瑰", "1", "2"])
+        rotator.close()
+        self.assertEqual(read_rows(self.legacy), [OLD_HEADERS, ["t0", "老用户", "小心心"]])
+        [(path, segment)] = rotator.find("gift_log")
+        self.assertNotEqual(path, self.legacy)
+        self.assertEqual(read_rows(path)[0], NEW_HEADERS)
+        self.assertEqual(segment.headers, NEW_HEADERS)
+
+    def test_resumed_segment_with_old_headers_rotated(self):
+        rotator = self._rotator()
+        rotator.write("gift_log", OLD_HEADERS, ["t0", "老用户", "小心心"])
+        rotator.flush()
+        # 模拟进程退出：分段未关闭，下次启动时继续当前周期的分段
+        for _, file, _ in rotator._active.values():
+            file.close()
+
+        rotator = self._rotator()
+        self.assertIn("gift_log", rotator._active)
+        rotator.write("gift_log", NEW_HEADERS, ["t1", "用户", "玫瑰", "1", "2"])
+        rotator.close()
+        paths = [path for path, _ in rotator.find("gift_log")]
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(read_rows(paths[0]), [OLD_HEADERS, ["t0", "老用户", "小心心"]])
+        self.assertEqual(read_rows(paths[1]), [NEW_HEADERS, ["t1", "用户", "玫瑰", "1", "2"]])
+
+    def test_size_tracked_without_tell(self):
+        rotator = self._rotator()
+        for i in range(50):
+            rotator.write("chat_log", ["timestamp", "content"], [str(i), "弹幕内容，带逗号与\"引号\""])
+        segment, file, _ = rotator._active["chat_log"]
+        file.flush()
+        self.assertEqual(segment.size, os.path.getsize(os.path.join(self.folder, segment.file)))
+        rotator.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
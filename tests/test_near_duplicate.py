@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_near_duplicate.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import liveMan
+from keyword_engine import KeywordEngine
+from near_duplicate import NearDuplicateDetector
+from protobuf.douyin import ChatMessage, User
+
+
+def make_signature(values):
+    return array("H", values).tobytes()
+
+
+class ClusterMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        # 固定签名，8 段 x 2 个值
+        self.signatures = {
+            "a": make_signature([1] * 16),
+            "b": make_signature([1] * 8 + [2] * 8),
+            "bridge": make_signature([1] * 12 + [2] * 4),
+            "other": make_signature([3] * 16),
+        }
+        self.detector = NearDuplicateDetector(storm_threshold=100)
+        self.detector.signature = self.signatures.__getitem__
+
+    def test_bridge_merges_separate_clusters(self):
+        detector = self.detector
+        detector.similarity = 0.75  # 至少 12 个值相同才算相似，a 与 b 只有 8 个相同，分成两组
+        a, _ = detector.observe("a", now=0)
+        b, _ = detector.observe("b", now=1)
+        self.assertIsNot(a, b)
+        other, _ = detector.observe("other", now=2)
+        # bridge 与 a、b 都有 12 个值相同，两组合并成最早的 a
+        cluster, _ = detector.observe("bridge", now=3)
+        self.assertIs(cluster, a)
+        self.assertIs(b.root(), a)
+        self.assertEqual(cluster.size, 3)
+        self.assertEqual(detector.stats()["clusters"], 2)
+        self.assertEqual(detector.stats()["merged"], 1)
+        self.assertIsNot(other.root(), a)
+        # 合并后再出现 b，返回合并后的分组
+        again, _ = detector.observe("b", now=4)
+        self.assertIs(again, a)
+        self.assertEqual(a.size, 4)
+        self.assertEqual(len(detector.storms()), 2)
+
+
+class NearDuplicateTest(unittest.TestCase):
+
+    def test_variants_share_cluster(self):
+        detector = NearDuplicateDetector()
+        first, _ = detector.observe("加我VX领取福利abc", now=0)
+        for i, text in enumerate(["加我ＶＸ领取福利abc123", "加我VX领取福利abc！！🔥", "加我 VX 领取福利 abc 9527"]):
+            cluster, _ = detector.observe(text, now=i + 1)
+            self.assertIs(cluster, first, text)
+        other, _ = detector.observe("主播今天唱的歌真好听", now=5)
+        self.assertIsNot(other, first)
+        self.assertEqual(first.size, 4)
+        self.assertEqual(detector.stats()["clusters"], 2)
+
+    def test_collapse_after_storm_threshold(self):
+        detector = NearDuplicateDetector(storm_threshold=3, collapse=True)
+        results = [detector.observe(f"点击主页进群免费领皮肤{i}", now=i)[1] for i in range(5)]
+        self.assertEqual(results, [False, False, False, True, True])
+        self.assertEqual(detector.stats()["suppressed"], 2)
+        # 不合并时只分组，不丢弃
+        detector = NearDuplicateDetector(storm_threshold=3)
+        self.assertFalse(any(detector.observe(f"点击主页进群免费领皮肤{i}", now=i)[1] for i in range(5)))
+
+    def test_window_expiry(self):
+        detector = NearDuplicateDetector(window_seconds=10)
+        first, _ = detector.observe("刷一波礼物支持主播", now=0)
+        same, _ = detector.observe("刷一波礼物支持主播", now=5)
+        self.assertIs(same, first)
+        # 超过窗口后签名被移出，同一句话重新计为新的分组
+        later, _ = detector.observe("刷一波礼物支持主播", now=16)
+        self.assertIsNot(later, first)
+        self.assertEqual(detector.stats()["signatures"], 1)
+
+    def test_max_entries_eviction(self):
+        detector = NearDuplicateDetector(max_entries=2)
+        first, _ = detector.observe("主播太好看了吧冲冲冲", now=0)
+        detector.observe("这个价格也太便宜了吧", now=1)
+        detector.observe("有没有一起开黑的加我", now=2)
+        stats = detector.stats()
+        self.assertEqual((stats["signatures"], stats["evicted"]), (2, 1))
+        # 最久未出现的签名已被淘汰
+        again, _ = detector.observe("主播太好看了吧冲冲冲", now=3)
+        self.assertIsNot(again, first)
+
+    def test_signature_stable_across_processes(self):
+        text = "关注我每天抽奖送iPhone"
+        code = ("import sys; sys.path.insert(0, %r); from near_duplicate import NearDuplicateDetector; "
+                "print(NearDuplicateDetector().signature(%r).hex())" % (ROOT, text))
+        outputs = {
+            subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PYTHONHASHSEED=seed),
+                           capture_output=True, text=True, check=True).stdout.strip()
+            for seed in ("1", "2")
+        }
+        self.assertEqual(outputs, {NearDuplicateDetector().signature(text).hex()})
+
+
+class CollapsedKeywordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        banned = os.path.join(self.folder, "banned.txt")
+        with open(banned, "w", encoding="utf-8") as f:
+            f.write("加微信\n")
+        self.fetcher = liveMan.DouyinLiveWebFetcher("1", config_path=os.path.join(ROOT, "message_handlers.yml"),
+                                                    room_id="1", log_folder=self.folder)
+        self.addCleanup(self.fetcher.close)
+        self.fetcher.dedup = NearDuplicateDetector(storm_threshold=2, collapse=True)
+        self.fetcher.keywords = KeywordEngine({"banned": banned}, reload_interval=0)
+        self.fetcher.print_keyword_matches = False
+        self.matches = []
+        self.chats = []
+        self.fetcher.on("KeywordMatch", self.matches.append)
+        self.fetcher.on("WebcastChatMessage", self.chats.append)
+
+    def test_keywords_matched_when_collapsed(self):
+        for i in range(5):
+            payload = bytes(ChatMessage(user=User(id=i, nick_name="机器人"), content=f"加微信领福利{i}"))
+            message = self.fetcher._parseChatMsg(payload)
+            if message is not None:
+                self.fetcher.events.publish("WebcastChatMessage", message)
+        # 超过 storm_threshold 的弹幕被合并，但每一条都触发关键词提醒
+        self.assertEqual(len(self.chats), 2)
+        self.assertEqual(len(self.matches), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_room_manager.py
+# @Project:     douyinLiveWebFetcher
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.client import HTTPConnection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from room_manager import ControlServer, RoomManager
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class StubFetcher:
+    """
+    RoomManager 用到的 DouyinLiveWebFetcher 接口：start() 阻塞到 stop()
+    """
+
+    def __init__(self, live_id, config_path=None, room_id=None, decoder_pool=None):
+        self.live_id = live_id
+        self.room_id = room_id or f"room-{live_id}"
+        self.dispatch_map = {"WebcastChatMessage": None, "WebcastGiftMessage": None}
+        self.handler_overrides = {}
+        self.connected_at = None
+        self.first_message_at = None
+        self.retry_delay_seconds = 0
+        self.starts = 0
+        self.closed = False
+        self._stopped = threading.Event()
+
+    def update_handlers(self, overrides):
+        for msg_type, cfg in overrides.items():
+            self.handler_overrides.setdefault(msg_type, {}).update(cfg)
+            if cfg.get("enabled") is False:
+                self.dispatch_map.pop(msg_type, None)
+
+    def start(self):
+        self.starts += 1
+        self._stopped.clear()
+        self.connected_at = self.first_message_at = time.perf_counter()
+        self._stopped.wait()
+
+    def stop(self):
+        self._stopped.set()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def stats(self):
+        return {"latency": None, "starts": self.starts}
+
+
+class ControlApiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = RoomManager(os.path.join(ROOT, "message_handlers.yml"), fetcher_factory=StubFetcher)
+        self.addCleanup(self.manager.close)
+        self.server = ControlServer(self.manager, ("127.0.0.1", 0))
+        self.server.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _request(self, method, path, body=None):
+        conn = HTTPConnection(*self.server.server_address[:2], timeout=5)
+        try:
+            data = json.dumps(body).encode("utf-8") if body is not None else None
+            conn.request(method, path, body=data, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def _status(self, live_id):
+        return self._request("GET", f"/rooms/{live_id}")[1]["status"]
+
+    def test_room_lifecycle(self):
+        status, room = self._request("POST", "/rooms", {"live_id": "1"})
+        self.assertEqual(status, 201)
+        self.assertEqual(room["live_id"], "1")
+        self.assertTrue(wait_until(lambda: self._status("1") == "receiving"))
+        fetcher = self.manager.get("1").fetcher
+
+        status, room = self._request("POST", "/rooms/1/pause")
+        self.assertEqual((status, room["status"]), (200, "paused"))
+        self.assertFalse(self.manager.get("1").running)
+
+        status, room = self._request("POST", "/rooms/1/resume")
+        self.assertEqual(status, 200)
+        self.assertTrue(wait_until(lambda: fetcher.starts == 2))
+        self.assertTrue(wait_until(lambda: self._status("1") == "receiving"))
+
+        status, room = self._request("PATCH", "/rooms/1/config", {"WebcastGiftMessage": {"enabled": False}})
+        self.assertEqual(status, 200)
+        self.assertEqual(room["handlers"], ["WebcastChatMessage"])
+        self.assertEqual(room["overrides"], {"WebcastGiftMessage": {"enabled": False}})
+
+        status, room = self._request("GET", "/rooms/1")
+        self.assertEqual(status, 200)
+        self.assertEqual(room["stats"]["starts"], 2)
+        self.assertEqual(self._request("GET", "/rooms")[1][0]["live_id"], "1")
+
+        status, body = self._request("DELETE", "/rooms/1")
+        self.assertEqual((status, body), (200, {"removed": "1"}))
+        self.assertTrue(fetcher.closed)
+        self.assertEqual(self._request("GET", "/rooms/1")[0], 404)
+        self.assertEqual(self._request("DELETE", "/rooms/1")[0], 404)
+
+    def test_add_paused_with_config(self):
+        status, room = self._request("POST", "/rooms", {"live_id": "2", "paused": True, "room_id": "99",
+                                                        "config": {"WebcastChatMessage": {"enabled": False}}})
+        self.assertEqual(status, 201)
+        self.assertEqual((room["status"], room["room_id"]), ("paused", "99"))
+        self.assertEqual(room["handlers"], ["WebcastGiftMessage"])
+        self.assertEqual(self.manager.get("2").fetcher.starts, 0)
+
+    def test_bad_requests(self):
+        self.assertEqual(self._request("POST", "/rooms", {})[0], 400)
+        self.assertEqual(self._request("POST", "/rooms/404/pause")[0], 404)
+        self.assertEqual(self._request("GET", "/unknown")[0], 404)
+
+
+class AddOutsideLockTest(unittest.TestCase):
+
+    def test_slow_fetcher_does_not_block_other_rooms(self):
+        building = threading.Event()
+        release = threading.Event()
+
+        def factory(live_id, **kwargs):
+            if live_id == "slow":
+                building.set()
+                release.wait(5)
+            return StubFetcher(live_id, **kwargs)
+
+        manager = RoomManager(os.path.join(ROOT, "message_handlers.yml"), fetcher_factory=factory)
+        self.addCleanup(manager.close)
+        adding = threading.Thread(target=manager.add, args=("slow",), kwargs={"paused": True})
+        adding.start()
+        self.assertTrue(building.wait(2))
+        # 慢直播间创建期间，其它直播间的添加与查询不被阻塞
+        started = time.monotonic()
+        manager.add("fast", paused=True)
+        self.assertEqual([room["live_id"] for room in manager.list()], ["fast"])
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        adding.join(2)
+        self.assertEqual(sorted(manager.rooms), ["fast", "slow"])
+
+    def test_concurrent_add_keeps_one_fetcher(self):
+        created = []
+        barrier = threading.Barrier(2)
+
+        def factory(live_id, **kwargs):
+            fetcher = StubFetcher(live_id, **kwargs)
+            created.append(fetcher)
+            barrier.wait(2)
+            return fetcher
+
+        manager = RoomManager(os.path.join(ROOT, "message_handlers.yml"), fetcher_factory=factory)
+        self.addCleanup(manager.close)
+        threads = [threading.Thread(target=manager.add, args=("1",), kwargs={"paused": True}) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(len(created), 2)
+        kept = manager.get("1").fetcher
+        self.assertEqual([fetcher.closed for fetcher in created], [fetcher is not kept for fetcher in created])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_room_scheduler.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from liveMan import DouyinRoomClient
+from room_scheduler import ROOM_LIVE, LivenessScheduler, RoomState, TokenBucket
+
+
+class StubClient:
+    """
+    开播状态查询桩：每次查询先向预算取令牌，返回 status
+    """
+    status = 2
+
+    def __init__(self, live_id):
+        self.live_id = live_id
+        self.room_id = f"room-{live_id}"
+        self.request_budget = None
+        self.checks = 0
+        self.closed = False
+
+    def get_room_status(self):
+        if not self.request_budget():
+            return None
+        self.checks += 1
+        return self.status
+
+    def close(self):
+        self.closed = True
+
+
+class StubFetcher:
+
+    def __init__(self, live_id, room_id=None):
+        self.live_id = live_id
+        self.room_id = room_id
+        self.request_budget = None
+        self.started = threading.Event()
+        self.closed = False
+
+    def start(self):
+        self.started.set()
+
+    def close(self):
+        self.closed = True
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(600, burst=2)  # 每秒 10 个
+        started = time.monotonic()
+        self.assertTrue(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertTrue(bucket.acquire())
+        self.assertGreaterEqual(time.monotonic() - started, 0.08)
+
+    def test_default_burst(self):
+        self.assertEqual(TokenBucket(60).capacity, 10)
+        self.assertEqual(TokenBucket(3).capacity, 1)
+
+    def test_stop_event_interrupts_wait(self):
+        bucket = TokenBucket(1, burst=1)
+        self.assertTrue(bucket.acquire())
+        stopped = threading.Event()
+        threading.Timer(0.05, stopped.set).start()
+        started = time.monotonic()
+        self.assertFalse(bucket.acquire(stopped))
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class NextIntervalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = LivenessScheduler(min_interval=30, max_interval=1800, near_window_minutes=30,
+                                           dormant_step_hours=6, client_factory=StubClient,
+                                           fetcher_factory=StubFetcher)
+        self.now = datetime(2024, 1, 2, 20, 0).timestamp()
+        self.room = RoomState("1", StubClient("1"))
+
+    def test_near_start_time(self):
+        self.room.start_minutes.append(20 * 60 + 20)
+        self.room.last_live_at = self.now - 86400 * 30
+        self.assertEqual(self.scheduler.next_interval(self.room, self.now), 30)
+
+    def test_near_start_time_across_midnight(self):
+        now = datetime(2024, 1, 2, 23, 50).timestamp()
+        self.room.start_minutes.append(10)
+        self.assertEqual(self.scheduler.next_interval(self.room, now), 30)
+
+    def test_slows_down_with_dormancy(self):
+        self.room.start_minutes.append(8 * 60)
+        self.room.last_live_at = self.now - 6 * 3600
+        self.assertEqual(self.scheduler.next_interval(self.room, self.now), 60)
+        self.room.last_live_at = self.now - 3 * 86400
+        self.assertEqual(self.scheduler.next_interval(self.room, self.now), 30 * 13)
+
+    def test_no_history_and_cap(self):
+        self.assertEqual(self.scheduler.next_interval(self.room, self.now), 30 * 5)
+        self.room.last_live_at = self.now - 365 * 86400
+        self.assertEqual(self.scheduler.next_interval(self.room, self.now), 1800)
+
+
+class LazyFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = LivenessScheduler(["a", "b"], requests_per_minute=600,
+                                           client_factory=StubClient, fetcher_factory=StubFetcher)
+        self.scheduler.budget = TokenBucket(600, burst=3)
+
+    def test_fetcher_created_only_when_live(self):
+        rooms = self.scheduler.rooms
+        self.assertIsNone(rooms["a"].fetcher)
+        self.scheduler._check(rooms["a"])
+        self.assertIsNone(rooms["a"].fetcher)
+
+        rooms["b"].client.status = ROOM_LIVE
+        self.scheduler._check(rooms["b"])
+        fetcher = rooms["b"].fetcher
+        self.assertEqual(fetcher.room_id, "room-b")
+        self.assertTrue(fetcher.started.wait(1))
+        rooms["b"].thread.join(1)
+        # 断线后复查仍用同一个 fetcher
+        self.scheduler._check(rooms["b"])
+        self.assertIs(rooms["b"].fetcher, fetcher)
+
+    def test_requests_share_budget(self):
+        rooms = self.scheduler.rooms
+        rooms["b"].client.status = ROOM_LIVE
+        self.scheduler._check(rooms["b"])
+        # 客户端与 fetcher 的请求都从同一个令牌桶取令牌
+        self.assertTrue(rooms["b"].fetcher.request_budget())
+        self.assertTrue(rooms["a"].client.request_budget())
+        self.assertLess(self.scheduler.budget.tokens, 1)
+        self.scheduler.stop()
+        self.assertFalse(rooms["a"].client.request_budget())
+
+    def test_remove_closes_client_and_fetcher(self):
+        room = self.scheduler.rooms["b"]
+        room.client.status = ROOM_LIVE
+        self.scheduler._check(room)
+        self.scheduler.remove("b")
+        self.assertTrue(room.client.closed)
+        self.assertTrue(room.fetcher.closed)
+
+
+class RoomClientBudgetTest(unittest.TestCase):
+
+    def test_room_id_request_waits_for_budget(self):
+        client = DouyinRoomClient("1", config_path=os.path.join(ROOT, "message_handlers.yml"))
+        self.addCleanup(client.close)
+        acquired, sent = [], []
+        for identity in client.signer_pool.identities:
+            identity.ttwid = "ttwid"
+            identity.ac_nonce = "nonce"
+            self.addCleanup(setattr, identity.session, "get", identity.session.get)
+            identity.session.get = lambda *args, **kwargs: sent.append(args)
+        client.request_budget = lambda: acquired.append(1) and False
+        # 预算已停止时不发出请求
+        self.assertIsNone(client.room_id)
+        self.assertTrue(acquired)
+        self.assertEqual(sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_shm_ring.py
+# @Project:     douyinLiveWebFetcher
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import liveMan
+from protobuf.douyin import ChatMessage, Message, PushFrame, Response, User
+from shm_ring import DecoderPool
+
+
+def chat_frame(i):
+    payload = bytes(ChatMessage(user=User(id=i, nick_name=f"用户{i}"), content=f"弹幕{i}"))
+    response = Response(messages_list=[Message(method="WebcastChatMessage", payload=payload)])
+    return bytes(PushFrame(log_id=i, payload_encoding="gzip", payload_type="msg",
+                           payload=gzip.compress(bytes(response))))
+
+
+class DecoderStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        config_path = os.path.join(ROOT, "message_handlers.yml")
+        self.pool = DecoderPool(config_path, workers=1, ring_bytes=1024 * 1024, stats_interval=0.1)
+        self.pool.log_folder = self.folder
+        self.fetcher = liveMan.DouyinLiveWebFetcher("1", config_path=config_path, room_id="1",
+                                                    log_folder=self.folder, decoder_pool=self.pool)
+        self.addCleanup(self.fetcher.close)
+        self.addCleanup(self.pool.close)
+
+    def test_stats_reported_by_decoder_process(self):
+        stats = self.fetcher.stats()
+        # 尚未上报时处理统计为空，并说明来自解码进程
+        self.assertIsNone(stats["latency"])
+        self.assertEqual(stats["decoder"]["worker"], None)
+
+        self.pool.start()
+        for i in range(3):
+            self.pool.submit(1, chat_frame(i))
+        deadline = time.monotonic() + 30
+        report = None
+        while time.monotonic() < deadline:
+            report = self.pool.room_stats(1)
+            latency = report and report["stats"]["latency"]
+            if latency and latency.get("WebcastChatMessage", {}).get("processing", {}).get("count") == 3:
+                break
+            time.sleep(0.1)
+        self.assertIsNotNone(report)
+
+        stats = self.fetcher.stats()
+        self.assertEqual(stats["decoder"]["worker"], 0)
+        self.assertEqual(stats["latency"], report["stats"]["latency"])
+        self.assertEqual(stats["latency"]["WebcastChatMessage"]["processing"]["count"], 3)
+        self.assertIsNotNone(stats["signer_pool"])
+
+
+if __name__ == "__main__":
+    unittest.main()
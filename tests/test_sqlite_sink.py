@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_sqlite_sink.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite_sink
+from sqlite_sink import MIGRATIONS, SQLiteSink, migrate
+
+
+class SQLiteSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, "test.db")
+
+    def query(self, sql):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def test_failed_migration_rolls_back(self):
+        conn = sqlite3.connect(self.path)
+        migrate(conn)
+        broken = MIGRATIONS + ["CREATE TABLE zz (a); CREATE TABLE chat (b);"]
+        with mock.patch.object(sqlite_sink, "MIGRATIONS", broken):
+            with self.assertRaises(sqlite3.OperationalError):
+                migrate(conn)
+            self.assertFalse(conn.in_transaction)
+            # 失败的脚本整体回滚，修好之后可以再次升级
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], len(MIGRATIONS))
+            self.assertEqual(conn.execute("SELECT name FROM sqlite_master WHERE name = 'zz'").fetchall(), [])
+            broken[-1] = "CREATE TABLE zz (a);"
+            self.assertEqual(migrate(conn), len(MIGRATIONS) + 1)
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], len(MIGRATIONS) + 1)
+        conn.close()
+
+    def test_batched_writes(self):
+        sink = SQLiteSink(self.path, batch_size=100, flush_interval=10)
+        for i in range(250):
+            sink.write("chat_log", {"room_id": 1, "ts": i, "user_id": i, "user_name": "", "content": f"弹幕{i}"})
+        sink.write("viewer_log", {"room_id": 1, "ts": 0, "current": 10, "total": 20})
+        sink.flush()
+        self.assertEqual(sink.written, 251)
+        # 满 batch_size 的两批，flush 时剩余的一批
+        self.assertEqual(sink.batches, 3)
+        sink.close()
+        self.assertEqual(self.query("SELECT COUNT(*) FROM chat"), [(250,)])
+        self.assertEqual(self.query("SELECT user_name, content FROM chat WHERE user_id = 7"), [(None, "弹幕7")])
+        self.assertEqual(self.query("SELECT current, total FROM viewer_stats"), [(10, 20)])
+
+    def test_failed_batch_counted(self):
+        sink = SQLiteSink(self.path, batch_size=10, flush_interval=10)
+        with mock.patch.object(sqlite_sink, "RETRY_DELAY", 0):
+            conn = sqlite3.connect(self.path)
+            conn.execute("DROP VIEW gift_named")
+            conn.execute("DROP TABLE gift")
+            conn.commit()
+            conn.close()
+            sink.write("gift_log", {"room_id": 1, "ts": 0, "user_id": 1})
+            sink.flush()
+        self.assertEqual((sink.written, sink.failed), (0, 1))
+        self.assertIn("gift", sink.stats()["last_error"])
+        sink.close()
+
+    def test_flush_after_writer_exited(self):
+        sink = SQLiteSink(self.path)
+        sink.close()
+        sink.flush()  # 写入线程已退出，不会一直等待
+
+
+if __name__ == "__main__":
+    unittest.main()
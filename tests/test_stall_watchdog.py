@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    test_stall_watchdog.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import liveMan
+from stall_watchdog import StallWatchdog
+
+
+class StallWatchdogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stalls = []
+        self.watchdog = StallWatchdog(self.stalls.append, min_timeout=0.1, initial_timeout=0.2)
+
+    def test_detects_stall(self):
+        self.watchdog.observe()
+        self.assertIsNone(self.watchdog.check())
+        time.sleep(0.3)
+        self.assertIsNotNone(self.watchdog.check())
+        self.assertEqual(len(self.stalls), 1)
+        # 同一次停滞只触发一次
+        self.assertIsNone(self.watchdog.check())
+
+    def test_stall_reconnect_stall(self):
+        self.watchdog.observe()
+        time.sleep(0.3)
+        self.assertIsNotNone(self.watchdog.check())
+
+        # 重连后新连接同样没有数据
+        self.watchdog.reset()
+        self.assertIsNone(self.watchdog.check())
+        time.sleep(0.3)
+        self.assertIsNotNone(self.watchdog.check())
+        self.assertEqual(len(self.stalls), 2)
+        self.assertEqual(self.watchdog.stats()["stalls"], 2)
+        self.assertEqual(len(self.watchdog.durations), 1)
+
+    def test_recovery_after_reconnect(self):
+        self.watchdog.observe()
+        time.sleep(0.3)
+        self.watchdog.check()
+        self.watchdog.reset()
+        self.watchdog.observe()
+        self.assertIsNone(self.watchdog.check())
+        self.assertEqual(len(self.watchdog.durations), 1)
+
+
+class FakeWebSocketApp:
+    """
+    建立连接后服务端立即正常关闭
+    """
+    created = 0
+
+    def __init__(self, url, header=None, on_open=None, on_message=None, on_error=None, on_close=None):
+        FakeWebSocketApp.created += 1
+        self.on_open = on_open
+        self.on_close = on_close
+        self.sock = None
+        self.keep_running = True
+
+    def run_forever(self):
+        self.on_open(self)
+        self.on_close(self, 1000, "normal")
+
+    def send(self, data, opcode=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class NormalCloseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        patcher = mock.patch.object(liveMan.websocket, "WebSocketApp", FakeWebSocketApp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        FakeWebSocketApp.created = 0
+        self.fetcher = liveMan.DouyinLiveWebFetcher("1", config_path=os.path.join(ROOT, "message_handlers.yml"),
+                                                    room_id="1", log_folder=self.folder)
+        self.addCleanup(self.fetcher.close)
+        self.fetcher.signer_pool.sign = lambda *args: "signature"
+        self.fetcher.get_room_status = lambda: None
+        self.fetcher.watchdog = StallWatchdog(self.fetcher._onStall, min_timeout=0.1, initial_timeout=0.2,
+                                              check_interval=0.05)
+
+    def test_watchdog_stopped_after_normal_close(self):
+        self.fetcher._connectWebSocket()
+        self.assertEqual(FakeWebSocketApp.created, 1)
+        # 连接结束后停滞检测不再运行，不会误判停滞
+        time.sleep(0.4)
+        self.assertEqual(self.fetcher.watchdog.stats()["stalls"], 0)
+        self.assertFalse(self.fetcher._reconnecting)
+
+    def test_start_clears_reconnecting(self):
+        self.fetcher._reconnecting = True
+        self.fetcher.start()
+        # 上一次会话遗留的重连标记不会把这次的正常关闭变成重连
+        self.assertEqual(FakeWebSocketApp.created, 1)
+        self.fetcher.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
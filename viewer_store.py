@@ -0,0 +1,448 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    viewer_store.py
+# @Project:     douyinLiveWebFetcher
+
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from console import status_file
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+
+MAGIC = b"VTS1"
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _write_varint(buf, n):
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _decode_chunk(data):
+    """
+    解码一个数据块：首个点为 (时间戳, zigzag 值)，其后为 (时间差, zigzag 值差)
+    """
+    pos = 0
+    end = len(data)
+    ts, pos = _read_varint(data, pos)
+    value, pos = _read_varint(data, pos)
+    value = _unzigzag(value)
+    yield ts, value
+    while pos < end:
+        delta, pos = _read_varint(data, pos)
+        diff, pos = _read_varint(data, pos)
+        ts += delta
+        value += _unzigzag(diff)
+        yield ts, value
+
+
+class Aggregates:
+    """
+    固定粒度的聚合数据，每个桶记录 count / min / max / sum / last，按列存放在 array 中
+    """
+
+    def __init__(self, step):
+        self.step = step
+        self.buckets = array("q")
+        self.count = array("q")
+        self.min = array("q")
+        self.max = array("q")
+        self.sum = array("q")
+        self.last = array("q")
+
+    def add(self, bucket, count, vmin, vmax, vsum, last):
+        """
+        追加一个桶，与最后一个桶相同时合并
+        """
+        if self.buckets and self.buckets[-1] == bucket:
+            self.count[-1] += count
+            self.min[-1] = min(self.min[-1], vmin)
+            self.max[-1] = max(self.max[-1], vmax)
+            self.sum[-1] += vsum
+            self.last[-1] = last
+            return
+        self.buckets.append(bucket)
+        self.count.append(count)
+        self.min.append(vmin)
+        self.max.append(vmax)
+        self.sum.append(vsum)
+        self.last.append(last)
+
+    def trim(self, before):
+        index = bisect_left(self.buckets, before)
+        if index:
+            for column in (self.buckets, self.count, self.min, self.max, self.sum, self.last):
+                del column[:index]
+
+    def query(self, start, end):
+        lo = bisect_left(self.buckets, start - start % self.step)
+        hi = bisect_right(self.buckets, end)
+        return [
+            (self.buckets[i], self.count[i], self.min[i], self.max[i], self.sum[i] / self.count[i], self.last[i])
+            for i in range(lo, hi)
+        ]
+
+    def encode(self, buf):
+        _write_varint(buf, len(self.buckets))
+        previous = 0
+        for i in range(len(self.buckets)):
+            _write_varint(buf, (self.buckets[i] - previous) // self.step)
+            previous = self.buckets[i]
+            _write_varint(buf, self.count[i])
+            _write_varint(buf, _zigzag(self.min[i]))
+            _write_varint(buf, self.max[i] - self.min[i])
+            _write_varint(buf, _zigzag(self.sum[i]))
+            _write_varint(buf, _zigzag(self.last[i] - self.min[i]))
+
+    def decode(self, data, pos):
+        n, pos = _read_varint(data, pos)
+        bucket = 0
+        for _ in range(n):
+            delta, pos = _read_varint(data, pos)
+            bucket += delta * self.step
+            count, pos = _read_varint(data, pos)
+            vmin, pos = _read_varint(data, pos)
+            vmin = _unzigzag(vmin)
+            spread, pos = _read_varint(data, pos)
+            vsum, pos = _read_varint(data, pos)
+            last, pos = _read_varint(data, pos)
+            self.add(bucket, count, vmin, vmin + spread, _unzigzag(vsum), vmin + _unzigzag(last))
+        return pos
+
+    @property
+    def nbytes(self):
+        return len(self.buckets) * 6 * self.buckets.itemsize
+
+
+class Series:
+    """
+    单个直播间单个指标的时间序列。
+    原始数据按 chunk_size 个点分块做差分 + varint 编码，写入时顺带累加当前分钟的聚合。
+    """
+
+    def __init__(self, chunk_size=256):
+        self.chunk_size = chunk_size
+        self.chunks = []  # 已封存的块 bytes
+        self.chunk_starts = []
+        self.chunk_ends = []
+        self.open = bytearray()
+        self.open_start = 0
+        self.open_count = 0
+        self.last_ts = 0
+        self.last_value = 0
+        self.points = 0
+        self.minute = Aggregates(MINUTE_MS)
+        self.hour = Aggregates(HOUR_MS)
+        self._pending = None  # 当前分钟 [bucket, count, min, max, sum, last]
+
+    def append(self, ts, value):
+        # 时间戳只增不减，乱序的点按上一个点的时间记录
+        if ts < self.last_ts:
+            ts = self.last_ts
+        if not self.open_count:
+            self.open_start = ts
+            _write_varint(self.open, ts)
+            _write_varint(self.open, _zigzag(value))
+        else:
+            _write_varint(self.open, ts - self.last_ts)
+            _write_varint(self.open, _zigzag(value - self.last_value))
+        self.open_count += 1
+        self.points += 1
+        self.last_ts = ts
+        self.last_value = value
+        if self.open_count >= self.chunk_size:
+            self._seal()
+
+        bucket = ts - ts % MINUTE_MS
+        pending = self._pending
+        if pending is not None and pending[0] == bucket:
+            pending[1] += 1
+            if value < pending[2]:
+                pending[2] = value
+            if value > pending[3]:
+                pending[3] = value
+            pending[4] += value
+            pending[5] = value
+        else:
+            self._roll()
+            self._pending = [bucket, 1, value, value, value, value]
+
+    def _seal(self):
+        if not self.open_count:
+            return
+        self.chunks.append(bytes(self.open))
+        self.chunk_starts.append(self.open_start)
+        self.chunk_ends.append(self.last_ts)
+        self.open = bytearray()
+        self.open_count = 0
+
+    def _roll(self):
+        """
+        将当前分钟并入分钟聚合与小时聚合
+        """
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+        self.minute.add(*pending)
+        self.hour.add(pending[0] - pending[0] % HOUR_MS, *pending[1:])
+
+    def downsample(self, now_ms, raw_before, minute_before, hour_before):
+        if self._pending is not None and self._pending[0] + MINUTE_MS <= now_ms:
+            self._roll()
+        index = bisect_left(self.chunk_ends, raw_before)
+        if index:
+            del self.chunks[:index]
+            del self.chunk_starts[:index]
+            del self.chunk_ends[:index]
+        self.minute.trim(minute_before)
+        self.hour.trim(hour_before)
+
+    def raw(self, start, end):
+        result = []
+        for i in range(bisect_left(self.chunk_ends, start), bisect_right(self.chunk_starts, end)):
+            result.extend(p for p in _decode_chunk(self.chunks[i]) if start <= p[0] <= end)
+        if self.open_count and self.open_start <= end and self.last_ts >= start:
+            result.extend(p for p in _decode_chunk(self.open) if start <= p[0] <= end)
+        return result
+
+    @property
+    def raw_start(self):
+        if self.chunk_starts:
+            return self.chunk_starts[0]
+        return self.open_start if self.open_count else None
+
+    @property
+    def nbytes(self):
+        return sum(map(len, self.chunks)) + len(self.open) + self.minute.nbytes + self.hour.nbytes
+
+    def encode(self, buf):
+        self._roll()
+        chunks = self.chunks + ([bytes(self.open)] if self.open_count else [])
+        _write_varint(buf, len(chunks))
+        for chunk in chunks:
+            _write_varint(buf, len(chunk))
+            buf.extend(chunk)
+        self.minute.encode(buf)
+        self.hour.encode(buf)
+
+    def decode(self, data, pos):
+        n, pos = _read_varint(data, pos)
+        for _ in range(n):
+            size, pos = _read_varint(data, pos)
+            chunk = bytes(data[pos:pos + size])
+            pos += size
+            count = 0
+            for ts, value in _decode_chunk(chunk):
+                count += 1
+            self.chunks.append(chunk)
+            self.chunk_starts.append(_read_varint(chunk, 0)[0])
+            self.chunk_ends.append(ts)
+            self.points += count
+            self.last_ts = ts
+            self.last_value = value
+        pos = self.minute.decode(data, pos)
+        pos = self.hour.decode(data, pos)
+        return pos
+
+
+class ViewerStore:
+    """
+    直播间观众数据的时序存储，按 (room_id, 指标) 分序列：
+        - 原始数据保留 raw_retention 秒
+        - 1 分钟聚合保留 minute_retention 秒
+        - 1 小时聚合保留 hour_retention 秒
+    后台线程每 downsample_interval 秒执行一次降采样和过期清理，并保存到 path。
+    """
+
+    RESOLUTIONS = ("raw", "1m", "1h")
+
+    def __init__(self, path=None, chunk_size=256, raw_retention=6 * 3600, minute_retention=7 * 86400,
+                 hour_retention=365 * 86400, downsample_interval=60):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.raw_retention = raw_retention
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self.downsample_interval = downsample_interval
+        self.series = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if path and os.path.isfile(path):
+            try:
+                self.load(path)
+            except Exception as e:
+                print(f"【观众数据加载失败】{e}", file=status_file())
+
+    def record(self, room_id, metric, value, ts=None):
+        """
+        :param ts: 秒级时间戳，默认当前时间
+        """
+        ts_ms = int((time.time() if ts is None else ts) * 1000)
+        key = (str(room_id), metric)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = Series(self.chunk_size)
+            series.append(ts_ms, int(value))
+
+    def query(self, room_id, metric, start=None, end=None, resolution="auto"):
+        """
+        查询 [start, end] 秒内的数据
+        :param resolution: raw / 1m / 1h / auto（原始数据覆盖起点时用 raw，否则用分钟聚合，再不够用小时聚合）
+        :return: raw 为 [(ts, value)]；聚合为 [(ts, count, min, max, avg, last)]，ts 为秒
+        """
+        end_ms = int((time.time() if end is None else end) * 1000)
+        start_ms = int((0 if start is None else start) * 1000)
+        with self._lock:
+            series = self.series.get((str(room_id), metric))
+            if series is None:
+                return []
+            if resolution == "auto":
+                resolution = self._pick_resolution(series, start_ms)
+            if resolution == "raw":
+                return [(ts / 1000, value) for ts, value in series.raw(start_ms, end_ms)]
+            if resolution not in self.RESOLUTIONS:
+                raise ValueError(f"不支持的精度: {resolution}")
+            # 当前分钟也参与查询
+            if series._pending is not None and series._pending[0] <= end_ms:
+                series._roll()
+            aggregates = series.minute if resolution == "1m" else series.hour
+            return [(row[0] / 1000,) + row[1:] for row in aggregates.query(start_ms, end_ms)]
+
+    def _pick_resolution(self, series, start_ms):
+        raw_start = series.raw_start
+        if raw_start is not None and raw_start <= start_ms:
+            return "raw"
+        if series.minute.buckets and series.minute.buckets[0] <= start_ms:
+            return "1m"
+        if series.hour.buckets and series.hour.buckets[0] <= start_ms:
+            return "1h"
+        # 起点早于所有数据时选覆盖范围最长的精度
+        if series.hour.buckets and (raw_start is None or series.hour.buckets[0] < raw_start):
+            return "1h"
+        return "raw"
+
+    def latest(self, room_id, metric):
+        """
+        :return: (ts, value) 或 None
+        """
+        with self._lock:
+            series = self.series.get((str(room_id), metric))
+            if series is None or not series.points:
+                return None
+            return series.last_ts / 1000, series.last_value
+
+    def keys(self, room_id=None):
+        with self._lock:
+            return [key for key in self.series if room_id is None or key[0] == str(room_id)]
+
+    def downsample(self, now=None):
+        now_ms = int((time.time() if now is None else now) * 1000)
+        with self._lock:
+            for series in self.series.values():
+                series.downsample(
+                    now_ms,
+                    now_ms - self.raw_retention * 1000,
+                    now_ms - self.minute_retention * 1000,
+                    now_ms - self.hour_retention * 1000,
+                )
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        buf = bytearray(MAGIC)
+        with self._lock:
+            _write_varint(buf, len(self.series))
+            for (room_id, metric), series in self.series.items():
+                for text in (room_id, metric):
+                    raw = text.encode("utf-8")
+                    _write_varint(buf, len(raw))
+                    buf.extend(raw)
+                series.encode(buf)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"不是观众数据文件: {path}")
+        pos = 4
+        n, pos = _read_varint(data, pos)
+        with self._lock:
+            for _ in range(n):
+                texts = []
+                for _ in range(2):
+                    size, pos = _read_varint(data, pos)
+                    texts.append(data[pos:pos + size].decode("utf-8"))
+                    pos += size
+                series = Series(self.chunk_size)
+                pos = series.decode(data, pos)
+                self.series[tuple(texts)] = series
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="viewer-store", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.downsample()
+        self.save()
+
+    def stats(self):
+        with self._lock:
+            points = sum(s.points for s in self.series.values())
+            nbytes = sum(s.nbytes for s in self.series.values())
+            return {
+                "series": len(self.series),
+                "points": points,
+                "bytes": nbytes,
+                "minute_buckets": sum(len(s.minute.buckets) for s in self.series.values()),
+                "hour_buckets": sum(len(s.hour.buckets) for s in self.series.values()),
+            }
+
+    def _run(self):
+        while not self._stopped.wait(self.downsample_interval):
+            try:
+                self.downsample()
+                self.save()
+            except Exception as e:
+                print(f"【观众数据降采样失败】{e}", file=status_file())